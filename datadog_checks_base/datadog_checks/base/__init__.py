@@ -6,6 +6,7 @@ from .checks import AgentCheck
 from .checks.openmetrics import OpenMetricsBaseCheck
 from .config import is_affirmative
 from .errors import ConfigurationError
+from .utils.batch import MetricBatch
 from .utils.common import ensure_bytes, ensure_unicode
 
 # Windows-only
@@ -20,6 +21,7 @@ __all__ = [
     'OpenMetricsBaseCheck',
     'PDHBaseCheck',
     'ConfigurationError',
+    'MetricBatch',
     'ensure_bytes',
     'ensure_unicode',
     'is_affirmative',
@@ -29,8 +29,11 @@ except ImportError:
 
 from ..config import is_affirmative
 from ..utils.common import ensure_bytes
+from ..utils.executor import get_executor
 from ..utils.proxy import config_proxy_skip
 from ..utils.limiter import Limiter
+from ..utils.profiling import CheckProfiler, DEFAULT_DUMP_INTERVAL
+from ..utils.tags import TagSet, TagSetCache
 
 
 # Metric types for which it's only useful to submit once per set of tags
@@ -59,6 +62,13 @@ class AgentCheck(object):
     """
     DEFAULT_METRIC_LIMIT = 0
 
+    """
+    DEFAULT_TAG_CACHE_SIZE is the maximum number of interned sets of tags (see `intern_tags`) kept
+    by the check, the least recently used ones are evicted first. It can be overridden with the
+    `tag_cache_size` instance setting, 0 disables the cache.
+    """
+    DEFAULT_TAG_CACHE_SIZE = 10000
+
     def __init__(self, *args, **kwargs):
         """
         args: `name`, `init_config`, `agentConfig` (deprecated), `instances`
@@ -71,6 +81,7 @@ class AgentCheck(object):
         self.agentConfig = kwargs.get('agentConfig', {})
         self.warnings = []
         self.metric_limiter = None
+        self.profiler = None
 
         if len(args) > 0:
             self.name = args[0]
@@ -137,6 +148,26 @@ class AgentCheck(object):
         if metric_limit > 0:
             self.metric_limiter = Limiter(self.name, "metrics", metric_limit, self.warning)
 
+        # Setup the cache of interned tags
+        try:
+            tag_cache_size = int(self.instances[0].get("tag_cache_size", self.DEFAULT_TAG_CACHE_SIZE))
+        except Exception:
+            tag_cache_size = self.DEFAULT_TAG_CACHE_SIZE
+        self.tag_cache = TagSetCache(tag_cache_size)
+
+        # Setup the profiling of the runs, see `CheckProfiler`
+        try:
+            profiling = is_affirmative(self.instances[0].get('profiling', False))
+        except Exception:
+            profiling = False
+        if profiling:
+            instance = self.instances[0]
+            try:
+                dump_interval = int(instance.get('profiling_dump_interval', DEFAULT_DUMP_INTERVAL))
+            except (TypeError, ValueError):
+                dump_interval = DEFAULT_DUMP_INTERVAL
+            self.profiler = CheckProfiler(self, instance.get('profiling_dump_dir'), dump_interval)
+
     @property
     def in_developer_mode(self):
         self._log_deprecation('in_developer_mode')
@@ -160,24 +191,19 @@ class AgentCheck(object):
         return '{}-{}-{}-{}'.format(mtype, name, tags if tags is None else hash(frozenset(tags)), hostname)
 
     def _submit_metric(self, mtype, name, value, tags=None, hostname=None, device_name=None):
+        """
+        Submit a sample to the aggregator, return whether it was submitted
+        """
         if value is None:
             # ignore metric sample
-            return
+            return False
 
         tags = self._normalize_tags(tags, device_name)
         if hostname is None:
             hostname = b''
 
-        if self.metric_limiter:
-            if mtype in ONE_PER_CONTEXT_METRIC_TYPES:
-                # Fast path for gauges, rates, monotonic counters, assume one set of tags per call
-                if self.metric_limiter.is_reached():
-                    return
-            else:
-                # Other metric types have a legit use case for several calls per set of tags, track unique sets of tags
-                context = self._context_uid(mtype, name, tags, hostname)
-                if self.metric_limiter.is_reached(context):
-                    return
+        if self.metric_limiter and self._is_metric_limit_reached(mtype, name, tags, hostname):
+            return False
 
         try:
             value = float(value)
@@ -189,9 +215,65 @@ class AgentCheck(object):
             if using_stub_aggregator:
                 raise ValueError(err_msg)
             self.warning(err_msg)
-            return
+            return False
 
         aggregator.submit_metric(self, self.check_id, mtype, ensure_bytes(name), value, tags, hostname)
+        return True
+
+    def _is_metric_limit_reached(self, mtype, name, tags, hostname):
+        if mtype in ONE_PER_CONTEXT_METRIC_TYPES:
+            # Fast path for gauges, rates, monotonic counters, assume one set of tags per call
+            return self.metric_limiter.is_reached()
+        else:
+            # Other metric types have a legit use case for several calls per set of tags, track unique sets of tags
+            context = self._context_uid(mtype, name, tags, hostname)
+            return self.metric_limiter.is_reached(context)
+
+    def submit_batch(self, batch):
+        """
+        Flush all the samples buffered in a `MetricBatch` to the aggregator and clear the batch.
+
+        The samples are handed over in a single `aggregator.submit_metrics` call when the Agent
+        provides that bulk entry point, otherwise they are submitted one by one.
+        The metric limit applies to batched samples the same way it applies to `gauge`, `rate`, etc.
+        Return the number of samples submitted.
+        """
+        if not batch:
+            return 0
+
+        submit_metrics = getattr(aggregator, 'submit_metrics', None)
+        encoded_names = {}
+        submitted = 0
+        mtypes, names, values, tags_list, hostnames = [], [], [], [], []
+
+        for mtype, name, value, tags, hostname in batch:
+            tags = self._normalize_tags_type(tags)
+            if hostname is None:
+                hostname = b''
+
+            if self.metric_limiter and self._is_metric_limit_reached(mtype, name, tags, hostname):
+                continue
+
+            # Batches usually hold many samples of few metrics, only encode each name once
+            encoded_name = encoded_names.get(name)
+            if encoded_name is None:
+                encoded_name = encoded_names[name] = ensure_bytes(name)
+
+            submitted += 1
+            if submit_metrics is None:
+                aggregator.submit_metric(self, self.check_id, mtype, encoded_name, value, tags, hostname)
+            else:
+                mtypes.append(mtype)
+                names.append(encoded_name)
+                values.append(value)
+                tags_list.append(tags)
+                hostnames.append(hostname)
+
+        if submit_metrics is not None and values:
+            submit_metrics(self, self.check_id, mtypes, names, values, tags_list, hostnames)
+
+        batch.clear()
+        return submitted
 
     def gauge(self, name, value, tags=None, hostname=None, device_name=None):
         self._submit_metric(aggregator.GAUGE, name, value, tags=tags, hostname=hostname, device_name=device_name)
@@ -328,11 +410,25 @@ class AgentCheck(object):
 
         return normalized_tags
 
+    def intern_tags(self, tags):
+        """
+        Return the interned `TagSet` for the given tags. Submitting a `TagSet` instead of a list
+        skips the encoding of its tags after the first submission, which is worth it for sets
+        of tags submitted over and over again, e.g. the custom tags of an instance.
+        """
+        return self.tag_cache.intern(tags)
+
     def _normalize_tags_type(self, tags):
         """
         Normalize all the tags to bytes (type `bytes`) so that the go bindings can handle them easily
         Doesn't mutate the passed list, returns a new list
         """
+        if isinstance(tags, TagSet):
+            # The encoded tags are computed once per TagSet
+            if tags.encoded is None:
+                tags.encoded = tuple(self._normalize_tags_type(tags.tags))
+            return list(tags.encoded)
+
         normalized_tags = []
         if tags is not None:
             for tag in tags:
@@ -370,6 +466,9 @@ class AgentCheck(object):
         return warnings
 
     def run(self):
+        if self.profiler is not None:
+            self.profiler.start()
+
         try:
             self.check(copy.deepcopy(self.instances[0]))
             result = b''
@@ -383,9 +482,38 @@ class AgentCheck(object):
         finally:
             if self.metric_limiter:
                 self.metric_limiter.reset()
+            if self.profiler is not None:
+                self._submit_profiling_metrics(self.profiler.stop())
 
         return result
 
+    def _submit_profiling_metrics(self, metrics):
+        """
+        Submit the metrics measured by the profiler, they bypass the metric limit and aren't counted
+        as submissions of the check
+        """
+        tags = ['check_name:{}'.format(self.name)]
+        tags.extend(self.instances[0].get('tags') or [])
+        tags = self._normalize_tags_type(tags)
+
+        for name, value in metrics:
+            aggregator.submit_metric(self, self.check_id, aggregator.GAUGE, ensure_bytes(name), float(value), tags,
+                                     b'')
+
+    def submit_executor_stats(self, prefix, rejected, tags=None, executor=None):
+        """
+        Submit the utilization of an executor, the one shared by the checks by default, see
+        `datadog_checks.base.utils.executor`: the `<prefix>.executor.queued`, `.workers` and `.busy`
+        gauges, and as a `.rejected` count the number of tasks of the check that were rejected because
+        the queue was full, i.e. that raised an `ExecutorQueueFull` since the previous call. The `rejected`
+        counter of the executor isn't used as it's shared by all the checks.
+        """
+        stats = (executor or get_executor()).get_stats()
+        self.gauge('{}.executor.queued'.format(prefix), stats['queued'], tags=tags)
+        self.gauge('{}.executor.workers'.format(prefix), stats['workers'], tags=tags)
+        self.gauge('{}.executor.busy'.format(prefix), stats['busy'], tags=tags)
+        self.count('{}.executor.rejected'.format(prefix), rejected, tags=tags)
+
     def _get_requests_proxy(self):
         no_proxy_settings = {
             "http": None,
@@ -19,6 +19,9 @@
 #
 # The methods of a Pool object use all these concepts and expose
 # them to their caller in a very simple way.
+#
+# Deprecated: checks should use the executor shared by the checks of the
+# process instead, see datadog_checks.base.utils.executor
 
 # flake8: noqa
 
@@ -1,9 +1,16 @@
 # (C) Datadog, Inc. 2018
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import time
+
+import requests
+from six import iteritems, itervalues, string_types
+from six.moves import queue
+
 from .mixins import OpenMetricsScraperMixin
 from .. import AgentCheck
 from ...errors import CheckException
+from ...utils.executor import ExecutorQueueFull, TimeoutError, get_executor
 
 
 class OpenMetricsBaseCheck(OpenMetricsScraperMixin, AgentCheck):
@@ -19,8 +26,28 @@ class OpenMetricsBaseCheck(OpenMetricsScraperMixin, AgentCheck):
             metrics:
             - bar
             - foo
+
+    `prometheus_url` can also be a list of endpoints, which are then scraped concurrently by the executor
+    shared by the checks, see `datadog_checks.base.utils.executor`. Each endpoint must be done within
+    its `prometheus_timeout`.
+    Each entry is either a URL or a mapping holding a `prometheus_url` and the instance settings
+    to override for this endpoint, e.g. `prometheus_timeout`, `health_service_check` or `tags`
+    (added to the tags of the instance)::
+
+        instances:
+        - prometheus_url:
+            - http://example.com/endpoint
+            - prometheus_url: http://example.org/endpoint
+              prometheus_timeout: 5
+              tags:
+              - cluster:foo
+          namespace: "foobar"
+          metrics:
+          - bar
     """
     DEFAULT_METRIC_LIMIT = 2000
+    # Maximum number of metric families of an instance scraped ahead of their processing
+    RESULTS_QUEUE_SIZE = 100
 
     def __init__(self, name, init_config, agentConfig, instances=None, default_instances=None, default_namespace=None):
         super(OpenMetricsBaseCheck, self).__init__(name, init_config, agentConfig, instances=instances)
@@ -31,9 +58,16 @@ class OpenMetricsBaseCheck(OpenMetricsScraperMixin, AgentCheck):
         # pre-generate the scraper configurations
         if instances is not None:
             for instance in instances:
-                self.get_scraper_config(instance)
+                if isinstance(instance.get('prometheus_url'), list):
+                    self.get_scraper_configs(instance)
+                else:
+                    self.get_scraper_config(instance)
 
     def check(self, instance):
+        if isinstance(instance.get('prometheus_url'), list):
+            self.check_endpoints(instance)
+            return
+
         # Get the configuration for this specific instance
         scraper_config = self.get_scraper_config(instance)
 
@@ -44,6 +78,167 @@ class OpenMetricsBaseCheck(OpenMetricsScraperMixin, AgentCheck):
 
         self.process(scraper_config)
 
+    def check_endpoints(self, instance):
+        """
+        Scrape all the endpoints of an instance concurrently, the metric families are processed as they
+        are received so that the run takes as long as the slowest endpoint. An endpoint that isn't done
+        within its `prometheus_timeout` is given up on. The utilization of the executor is submitted
+        after the endpoints are done, see `AgentCheck.submit_executor_stats`.
+        """
+        scraper_configs = self.get_scraper_configs(instance)
+        for scraper_config in scraper_configs:
+            if not scraper_config['metrics_mapper']:
+                raise CheckException("You have to collect at least one metric from the endpoint: {}".format(
+                                     scraper_config['prometheus_url']))
+
+        executor = get_executor()
+        # Bounded, so that the endpoints aren't scraped faster than their metric families are processed
+        results = queue.Queue(self.RESULTS_QUEUE_SIZE)
+        # id of the scraper configuration -> (scraper configuration, deadline)
+        pending = {}
+        futures = []
+        # Endpoints to scrape from the thread of the check, when the executor is saturated
+        inline = []
+        for scraper_config in scraper_configs:
+            timeout = float(scraper_config['prometheus_timeout'])
+            deadline = time.time() + timeout
+            self._start_process(scraper_config)
+            self._start_scrape(scraper_config)
+            try:
+                futures.append(executor.submit_with_timeout(
+                    timeout, self._scrape_endpoint, scraper_config, results, deadline
+                ))
+            except ExecutorQueueFull:
+                self._drop_process(scraper_config)
+                inline.append(scraper_config)
+            else:
+                pending[id(scraper_config)] = scraper_config, deadline
+
+        errors = []
+        try:
+            while pending:
+                now = time.time()
+                for key, (scraper_config, deadline) in list(iteritems(pending)):
+                    if deadline <= now:
+                        del pending[key]
+                        error = TimeoutError('timed out after {}s'.format(scraper_config['prometheus_timeout']))
+                        self.log.error("Unable to scrape endpoint {}: {}".format(scraper_config['prometheus_url'],
+                                                                                 error))
+                        self._end_endpoint(scraper_config, error, errors)
+                if not pending:
+                    break
+
+                try:
+                    timeout = min(deadline for _, deadline in itervalues(pending)) - now
+                    scraper_config, metric, error = results.get(timeout=max(timeout, 0))
+                except queue.Empty:
+                    continue
+
+                if id(scraper_config) not in pending:
+                    # Left over by an endpoint that timed out
+                    continue
+                if metric is not None:
+                    self.process_metric(metric, scraper_config)
+                    continue
+
+                # The endpoint is done
+                del pending[id(scraper_config)]
+                self._end_endpoint(scraper_config, error, errors)
+        finally:
+            # Don't scrape the endpoints we stopped waiting for, and drop what was collected from them
+            for future in futures:
+                future.cancel()
+            for scraper_config, _ in itervalues(pending):
+                self._drop_process(scraper_config)
+
+        for scraper_config in inline:
+            try:
+                self.process(scraper_config)
+            except Exception as e:
+                self.log.exception("Unable to scrape endpoint {}".format(scraper_config['prometheus_url']))
+                errors.append('{}: {}'.format(scraper_config['prometheus_url'], e))
+
+        self.submit_executor_stats('{}.prometheus'.format(scraper_configs[0]['namespace']), len(inline),
+                                   instance.get('tags'))
+
+        if errors:
+            raise CheckException("Unable to scrape {} endpoint(s): {}".format(len(errors), ', '.join(errors)))
+
+    def _end_endpoint(self, scraper_config, error, errors):
+        """
+        Submit what was collected from an endpoint that is done, along with its health service check
+        """
+        self._submit_connection_stats(scraper_config)
+        # Like `poll`, the endpoint is unhealthy when it can't be reached in time, not when its payload
+        # is invalid, and invalid SSL settings aren't reported
+        if isinstance(error, requests.exceptions.SSLError):
+            pass
+        elif isinstance(error, (IOError, TimeoutError)):
+            self._submit_health_service_check(scraper_config, self.CRITICAL)
+        else:
+            self._submit_health_service_check(scraper_config, self.OK)
+
+        if error is None:
+            self._end_scrape(scraper_config)
+        else:
+            errors.append('{}: {}'.format(scraper_config['prometheus_url'], error))
+        self._end_process(scraper_config)
+
+    @staticmethod
+    def _drop_process(scraper_config):
+        scraper_config['_metric_batch'] = None
+        scraper_config['_family_filter'] = None
+
+    def _scrape_endpoint(self, scraper_config, results, deadline):
+        """
+        Poll an endpoint and push its metric families to the `results` queue, run by the executor's threads.
+        The end of the endpoint is signaled by a `None` metric family, along with the error if any.
+        Nothing is submitted from here: the check thread submits the metrics and service checks.
+        """
+        try:
+            response = self._poll(scraper_config)
+            try:
+                for metric in self.parse_metric_family(response, scraper_config):
+                    # The check stopped waiting for this endpoint
+                    if not self._put_result(results, (scraper_config, metric, None), deadline):
+                        return
+            finally:
+                response.close()
+        except Exception as e:
+            self.log.exception("Unable to scrape endpoint {}".format(scraper_config['prometheus_url']))
+            self._put_result(results, (scraper_config, None, e), deadline)
+        else:
+            self._put_result(results, (scraper_config, None, None), deadline)
+
+    @staticmethod
+    def _put_result(results, result, deadline):
+        """
+        Push a result to the queue, waiting at most until the deadline of the endpoint for some room,
+        return whether it was pushed
+        """
+        try:
+            results.put(result, timeout=max(deadline - time.time(), 0))
+        except queue.Full:
+            return False
+        return True
+
+    def get_scraper_configs(self, instance):
+        """
+        Return the scraper configurations of an instance defining a list of endpoints
+        """
+        scraper_configs = []
+        for entry in instance['prometheus_url']:
+            if isinstance(entry, string_types):
+                entry = {'prometheus_url': entry}
+
+            endpoint_instance = dict(instance)
+            endpoint_instance.update(entry)
+            endpoint_instance['prometheus_url'] = entry.get('prometheus_url')
+            endpoint_instance['tags'] = instance.get('tags', []) + entry.get('tags', [])
+            scraper_configs.append(self.get_scraper_config(endpoint_instance))
+
+        return scraper_configs
+
     def get_scraper_config(self, instance):
         endpoint = instance.get('prometheus_url')
 
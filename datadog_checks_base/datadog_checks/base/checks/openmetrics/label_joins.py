@@ -0,0 +1,162 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from six import iteritems
+
+
+class LabelJoinIndex(object):
+    """
+    LabelJoinIndex holds the labels to add to the samples of a payload, as configured by `label_joins`,
+    example of `label_joins`::
+
+        {
+            'kube_pod_info': {
+                'label_to_match': 'pod',
+                'labels_to_get': ['node', 'host_ip']
+            }
+        }
+
+    The labels are stored per watched label and per label value for O(1) lookups, e.g.
+    `{'pod': {'dd-agent-9s1l1': {'node': 'yolo', 'host_ip': 'yey'}}}`.
+
+    Each scrape starts a new generation of the index: the labels stored during the previous scrape
+    are dropped at once, so the values that disappeared from the payload are evicted without walking
+    the index. During a scrape, the metric families that carry a watched label whose join metrics
+    weren't found yet in the payload can be deferred, and processed once the whole payload was read.
+    Only the join metrics found in the previous payload are waited for: a join metric missing from the
+    payload doesn't hold the metric families until its end. All of them are waited for on the first scrape.
+    """
+    def __init__(self, label_joins):
+        self.label_joins = label_joins
+        self.generation = 0
+        self.scraping = False
+
+        # join metric name -> (label to match, set of labels to get)
+        self._joins = {}
+        # watched label -> set of join metrics matching on this label
+        self._join_metrics = {}
+        for metric_name, join in iteritems(label_joins):
+            label_to_match = join['label_to_match']
+            self._joins[metric_name] = (label_to_match, frozenset(join['labels_to_get']))
+            self._join_metrics.setdefault(label_to_match, set()).add(metric_name)
+
+        self.watched_labels = tuple(self._join_metrics)
+        self._mapping = {label: {} for label in self.watched_labels}
+
+        # Join metrics found during the previous scrape, `None` before the end of the first one
+        self._previous_metrics = None
+        # watched label -> join metrics to wait for during the current scrape
+        self._expected_metrics = dict(self._join_metrics)
+        # Watched labels whose join metrics were all found during the current scrape
+        self._complete_labels = set()
+        self._seen_metrics = set()
+        self._deferred = []
+
+    def __len__(self):
+        return sum(len(values) for values in self._mapping.values())
+
+    def start_scrape(self):
+        """
+        Start a new generation of the index, dropping the labels stored so far
+        """
+        self.generation += 1
+        self.scraping = True
+        self._mapping = {label: {} for label in self.watched_labels}
+        if self._previous_metrics is None:
+            self._expected_metrics = dict(self._join_metrics)
+        else:
+            self._expected_metrics = {
+                label: metrics & self._previous_metrics for label, metrics in iteritems(self._join_metrics)
+            }
+        self._complete_labels = {label for label, metrics in iteritems(self._expected_metrics) if not metrics}
+        self._seen_metrics = set()
+        self._deferred = []
+
+    def end_scrape(self):
+        """
+        Mark the end of the payload and return the deferred items, in the order they were deferred
+        """
+        self.scraping = False
+        self._previous_metrics = self._seen_metrics
+        deferred = self._deferred
+        self._deferred = []
+        return deferred
+
+    def get(self, label, value):
+        """
+        Return the labels stored for a watched label value, `None` if there is none
+        """
+        try:
+            return self._mapping[label].get(value)
+        except KeyError:
+            return None
+
+    def is_join_metric(self, metric_name):
+        return metric_name in self._joins
+
+    def store(self, metric):
+        """
+        Store the labels to get from the samples of a join metric
+        """
+        try:
+            label_to_match, labels_to_get = self._joins[metric.name]
+        except KeyError:
+            return
+
+        mapping = self._mapping[label_to_match]
+        for sample in metric.samples:
+            labels = sample[1]
+            # metadata-only metrics that are used for label joins are always equal to 1
+            # this is required for metrics where all combinations of a state are sent
+            # but only the active one is set to 1 (others are set to 0)
+            # example: kube_pod_status_phase in kube-state-metrics
+            if sample[2] != 1:
+                continue
+            matching_value = labels.get(label_to_match)
+            if matching_value is None:
+                continue
+
+            label_dict = {name: val for name, val in iteritems(labels) if name in labels_to_get}
+            stored = mapping.get(matching_value)
+            if stored is None:
+                mapping[matching_value] = label_dict
+            else:
+                stored.update(label_dict)
+
+        self._seen_metrics.add(metric.name)
+        if self._expected_metrics[label_to_match].issubset(self._seen_metrics):
+            self._complete_labels.add(label_to_match)
+
+    def join(self, metric):
+        """
+        Add the stored labels to the samples of a metric carrying watched labels
+        """
+        watched_labels = self.watched_labels
+        mapping = self._mapping
+        for sample in metric.samples:
+            labels = sample[1]
+            for label in watched_labels:
+                value = labels.get(label)
+                if value is None:
+                    continue
+                joined = mapping[label].get(value)
+                if joined:
+                    labels.update(joined)
+
+    def defer(self, metric, item):
+        """
+        Defer `item` to the end of the scrape if `metric` carries watched labels whose expected join metrics
+        weren't all found yet in the payload. Return whether the item was deferred.
+        """
+        if not self.scraping or len(self._complete_labels) == len(self.watched_labels):
+            return False
+
+        pending_labels = [label for label in self.watched_labels if label not in self._complete_labels]
+        for sample in metric.samples:
+            labels = sample[1]
+            for label in pending_labels:
+                if label in labels:
+                    self._deferred.append(item)
+                    return True
+
+        return False
@@ -3,16 +3,21 @@
 # Licensed under a 3-clause BSD style license (see LICENSE)
 
 from fnmatch import fnmatchcase
+import re
 from ...errors import CheckException
 import requests
 from urllib3 import disable_warnings
 from urllib3.exceptions import InsecureRequestWarning
 from math import isnan, isinf
-from prometheus_client.parser import text_fd_to_metric_families
 
-from six import PY3, iteritems, string_types
+from six import PY3, string_types
 
 from .. import AgentCheck
+from ...utils.batch import MetricBatch
+from ...utils.http import DEFAULT_POOL_SIZE, PersistentSession
+from ...utils.prometheus.parser import filter_metric_families, text_fd_to_metric_families
+from .label_joins import LabelJoinIndex
+from .submission import SubmissionPlanCache
 
 from datadog_checks.config import is_affirmative
 
@@ -105,28 +110,9 @@ class OpenMetricsScraperMixin(object):
         config['label_joins'] = default_instance.get('label_joins', {})
         config['label_joins'].update(instance.get('label_joins', {}))
 
-        # `_label_mapping` holds the additionals label info to add for a specific
-        # label value, example:
-        # self._label_mapping = {
-        #     'pod': {
-        #         'dd-agent-9s1l1': [("node","yolo"),("host_ip","yey")]
-        #     }
-        # }
-        config['_label_mapping'] = {}
-
-        # `_active_label_mapping` holds a dictionary of label values found during the run
-        # to cleanup the label_mapping of unused values, example:
-        # self._active_label_mapping = {
-        #     'pod': {
-        #         'dd-agent-9s1l1': True
-        #     }
-        # }
-        config['_active_label_mapping'] = {}
-
-        # `_watched_labels` holds the list of label to watch for enrichment
-        config['_watched_labels'] = set()
-
-        config['_dry_run'] = True
+        # `_label_join_index` is the `LabelJoinIndex` holding the labels to join, built from
+        # `label_joins` on first use
+        config['_label_join_index'] = None
 
         # Some metrics are ignored because they are duplicates or introduce a
         # very high cardinality. Metrics included in this list will be silently
@@ -204,17 +190,57 @@ class OpenMetricsScraperMixin(object):
         config['username'] = instance.get('username', default_instance.get('username', None))
         config['password'] = instance.get('password', default_instance.get('password', None))
 
+        # Keep the connections to the endpoint alive between the check runs
+        config['persist_connections'] = is_affirmative(instance.get('persist_connections',
+                                                       default_instance.get('persist_connections', False)))
+
+        # Maximum number of connections kept alive to the endpoint when `persist_connections` is enabled
+        config['connection_pool_size'] = int(instance.get('connection_pool_size',
+                                                          default_instance.get('connection_pool_size',
+                                                                               DEFAULT_POOL_SIZE)))
+
+        # Submit metrics about the scraper itself, e.g. the number of connections opened and reused
+        config['debug_metrics'] = is_affirmative(instance.get('debug_metrics',
+                                                 default_instance.get('debug_metrics', False)))
+
+        # `PersistentSession` used to poll the endpoint when `persist_connections` is enabled
+        config['_session'] = None
+
+        # Connection counters of the session at the last poll, see `_submit_connection_stats`
+        config['_connection_stats'] = (0, 0)
+
         # Custom tags that will be sent with each metric
         config['custom_tags'] = instance.get('tags', [])
 
         # Additional tags to be sent with each metric
         config['_metric_tags'] = []
 
+        # `SubmissionPlanCache` holding what's needed to submit the samples of each metric family,
+        # see `_get_submission_plan`
+        config['_submission_plans'] = SubmissionPlanCache()
+
         # List of strings to filter the input text payload on. If any line contains
         # one of these strings, it will be filtered out before being parsed.
         # INTERNAL FEATURE, might be removed in future versions
         config['_text_filter_blacklist'] = []
 
+        # `family_whitelist` and `family_blacklist` are lists of regular expressions matched against
+        # the metric family names found in the payload. The families that don't match the whitelist
+        # (if any) or that match the blacklist are dropped from the payload before being parsed,
+        # the blacklist takes precedence.
+        config['family_whitelist'] = default_instance.get('family_whitelist', []) + instance.get('family_whitelist', [])
+        config['family_blacklist'] = default_instance.get('family_blacklist', []) + instance.get('family_blacklist', [])
+        config['_family_prefilter'] = self._build_family_prefilter(config['family_whitelist'],
+                                                                   config['family_blacklist'])
+
+        # `MetricBatch` buffering the samples of the current `process` run, flushed
+        # to the aggregator at the end of the run
+        config['_metric_batch'] = None
+
+        # Function telling the parser which metric families can be handled during the current
+        # `process` run, see `_get_family_filter`
+        config['_family_filter'] = None
+
         return config
 
     def parse_metric_family(self, response, scraper_config):
@@ -225,10 +251,12 @@ class OpenMetricsScraperMixin(object):
         :return: core.Metric
         """
         input_gen = response.iter_lines(chunk_size=self.REQUESTS_CHUNK_SIZE, decode_unicode=True)
+        if scraper_config.get('_family_prefilter') is not None:
+            input_gen = filter_metric_families(input_gen, scraper_config['_family_prefilter'])
         if scraper_config['_text_filter_blacklist']:
             input_gen = self._text_filter_input(input_gen, scraper_config)
 
-        for metric in text_fd_to_metric_families(input_gen):
+        for metric in text_fd_to_metric_families(input_gen, family_filter=scraper_config.get('_family_filter')):
             metric.type = scraper_config['type_overrides'].get(metric.name, metric.type)
             if metric.type not in self.METRIC_TYPES:
                 continue
@@ -251,6 +279,37 @@ class OpenMetricsScraperMixin(object):
                 # No blacklist matches, passing the line through
                 yield line
 
+    @staticmethod
+    def _build_family_prefilter(whitelist, blacklist):
+        """
+        Compile the family white and black lists into a function telling whether a metric family
+        should be kept in the payload, or None if there is nothing to filter.
+        Each list is compiled into a single regular expression and the decision is cached per family name.
+        """
+        if not whitelist and not blacklist:
+            return None
+
+        try:
+            whitelist_re = re.compile('|'.join('(?:{})'.format(p) for p in whitelist)) if whitelist else None
+            blacklist_re = re.compile('|'.join('(?:{})'.format(p) for p in blacklist)) if blacklist else None
+        except re.error as e:
+            raise CheckException("Invalid family_whitelist or family_blacklist pattern: {}".format(e))
+
+        results = {}
+
+        def family_prefilter(name):
+            try:
+                return results[name]
+            except KeyError:
+                wanted = (
+                    (whitelist_re is None or whitelist_re.search(name) is not None) and
+                    (blacklist_re is None or blacklist_re.search(name) is None)
+                )
+                results[name] = wanted
+                return wanted
+
+        return family_prefilter
+
     def _remove_metric_prefix(self, metric, scraper_config):
         prometheus_metrics_prefix = scraper_config['prometheus_metrics_prefix']
         return metric[len(prometheus_metrics_prefix):] if metric.startswith(prometheus_metrics_prefix) else metric
@@ -261,28 +320,42 @@ class OpenMetricsScraperMixin(object):
         """
         response = self.poll(scraper_config)
         try:
-            # no dry run if no label joins
-            if not scraper_config['label_joins']:
-                scraper_config['_dry_run'] = False
-            elif not scraper_config['_watched_labels']:
-                # build the _watched_labels set
-                for metric, val in iteritems(scraper_config['label_joins']):
-                    scraper_config['_watched_labels'].add(val['label_to_match'])
+            self._start_scrape(scraper_config)
 
             for metric in self.parse_metric_family(response, scraper_config):
                 yield metric
 
-            # Set dry run off
-            scraper_config['_dry_run'] = False
-            # Garbage collect unused mapping and reset active labels
-            for metric, mapping in list(iteritems(scraper_config['_label_mapping'])):
-                for key, val in list(iteritems(mapping)):
-                    if key not in scraper_config['_active_label_mapping'][metric]:
-                        del scraper_config['_label_mapping'][metric][key]
-            scraper_config['_active_label_mapping'] = {}
+            self._end_scrape(scraper_config)
         finally:
             response.close()
 
+    def _start_scrape(self, scraper_config):
+        """
+        Start a new generation of the label joins before the metric families of a payload are processed
+        """
+        if scraper_config['label_joins']:
+            self._get_label_join_index(scraper_config).start_scrape()
+
+    def _end_scrape(self, scraper_config):
+        """
+        Process the metric families whose label joins were deferred, once all the metric families
+        of a payload have been processed
+        """
+        label_join_index = scraper_config['_label_join_index']
+        if label_join_index is None:
+            return
+
+        for metric, metric_transformers in label_join_index.end_scrape():
+            label_join_index.join(metric)
+            self._handle_metric(metric, scraper_config, metric_transformers)
+
+    def _get_label_join_index(self, scraper_config):
+        label_join_index = scraper_config['_label_join_index']
+        # `label_joins` may be replaced after the creation of the configuration
+        if label_join_index is None or label_join_index.label_joins is not scraper_config['label_joins']:
+            label_join_index = scraper_config['_label_join_index'] = LabelJoinIndex(scraper_config['label_joins'])
+        return label_join_index
+
     def process(self, scraper_config, metric_transformers=None):
         """
         Polls the data from prometheus and pushes them as gauges
@@ -291,55 +364,80 @@ class OpenMetricsScraperMixin(object):
         Note that if the instance has a 'tags' attribute, it will be pushed
         automatically as additional custom tags and added to the metrics
         """
-        for metric in self.scrape_metrics(scraper_config):
-            self.process_metric(metric, scraper_config, metric_transformers=metric_transformers)
+        self._start_process(scraper_config, metric_transformers)
+        try:
+            for metric in self.scrape_metrics(scraper_config):
+                self.process_metric(metric, scraper_config, metric_transformers=metric_transformers)
+        finally:
+            self._end_process(scraper_config)
+
+    def _start_process(self, scraper_config, metric_transformers=None):
+        """
+        Set up the batch, the family filter and the submission plans of a `process` run
+        """
+        scraper_config['_submission_plans'].refresh(scraper_config)
+        scraper_config['_metric_batch'] = MetricBatch()
+        scraper_config['_family_filter'] = self._get_family_filter(scraper_config, metric_transformers)
+
+    def _end_process(self, scraper_config):
+        """
+        Flush the batch of a `process` run to the aggregator
+        """
+        batch = scraper_config['_metric_batch']
+        scraper_config['_metric_batch'] = None
+        scraper_config['_family_filter'] = None
+        if batch is not None:
+            self.submit_batch(batch)
+
+    def _get_family_filter(self, scraper_config, metric_transformers=None):
+        """
+        Build the function telling whether `process_metric` would do anything with a metric family,
+        given its name as found in the payload. It lets the parser skip the samples of the families
+        we would drop anyway without parsing their labels.
+        """
+        metrics_mapper = scraper_config['metrics_mapper']
+        label_joins = scraper_config['label_joins']
+        ignore_metrics = scraper_config['ignore_metrics']
+        if metric_transformers is None:
+            # Wildcards are only considered when there are no transformers, see `process_metric`
+            transformers = {}
+            wildcards = [x for x in metrics_mapper if '*' in x]
+        else:
+            transformers = metric_transformers
+            wildcards = []
+
+        results = {}
+
+        def family_filter(name):
+            try:
+                return results[name]
+            except KeyError:
+                pass
+
+            metric_name = self._remove_metric_prefix(name, scraper_config)
+            if metric_name in label_joins:
+                wanted = True
+            elif metric_name in ignore_metrics:
+                wanted = False
+            elif metric_name in metrics_mapper or metric_name in transformers:
+                wanted = True
+            else:
+                wanted = any(fnmatchcase(metric_name, wildcard) for wildcard in wildcards)
+
+            results[name] = wanted
+            return wanted
+
+        return family_filter
 
     def _store_labels(self, metric, scraper_config):
         # If targeted metric, store labels
-        if metric.name in scraper_config['label_joins']:
-            matching_label = scraper_config['label_joins'][metric.name]['label_to_match']
-            for sample in metric.samples:
-                # metadata-only metrics that are used for label joins are always equal to 1
-                # this is required for metrics where all combinations of a state are sent
-                # but only the active one is set to 1 (others are set to 0)
-                # example: kube_pod_status_phase in kube-state-metrics
-                if sample[self.SAMPLE_VALUE] != 1:
-                    continue
-                label_dict = dict()
-                matching_value = None
-                for label_name, label_value in iteritems(sample[self.SAMPLE_LABELS]):
-                    if label_name == matching_label:
-                        matching_value = label_value
-                    elif label_name in scraper_config['label_joins'][metric.name]['labels_to_get']:
-                        label_dict[label_name] = label_value
-                try:
-                    if scraper_config['_label_mapping'][matching_label].get(matching_value):
-                        scraper_config['_label_mapping'][matching_label][matching_value].update(label_dict)
-                    else:
-                        scraper_config['_label_mapping'][matching_label][matching_value] = label_dict
-                except KeyError:
-                    if matching_value is not None:
-                        scraper_config['_label_mapping'][matching_label] = {matching_value: label_dict}
+        if scraper_config['label_joins']:
+            self._get_label_join_index(scraper_config).store(metric)
 
     def _join_labels(self, metric, scraper_config):
         # Filter metric to see if we can enrich with joined labels
         if scraper_config['label_joins']:
-            for sample in metric.samples:
-                watched_labels = scraper_config['_watched_labels'].intersection(set(sample[self.SAMPLE_LABELS].keys()))
-                for label_name in watched_labels:
-                    # Set this label value as active
-                    if label_name not in scraper_config['_active_label_mapping']:
-                        scraper_config['_active_label_mapping'][label_name] = {}
-                    scraper_config['_active_label_mapping'][label_name][sample[self.SAMPLE_LABELS][label_name]] = True
-                    # If mapping found add corresponding labels
-                    try:
-                        for name, val in (
-                            iteritems(scraper_config['_label_mapping'][label_name][sample[self.SAMPLE_LABELS]
-                                                                                   [label_name]])
-                        ):
-                            sample[self.SAMPLE_LABELS][name] = val
-                    except KeyError:
-                        pass
+            self._get_label_join_index(scraper_config).join(metric)
 
     def process_metric(self, metric, scraper_config, metric_transformers=None):
         """
@@ -356,12 +454,20 @@ class OpenMetricsScraperMixin(object):
         if metric.name in scraper_config['ignore_metrics']:
             return  # Ignore the metric
 
+        if scraper_config['label_joins']:
+            # Wait for the end of the payload if the labels to join with this metric weren't all found yet
+            if self._get_label_join_index(scraper_config).defer(metric, (metric, metric_transformers)):
+                return
+
         # Filter metric to see if we can enrich with joined labels
         self._join_labels(metric, scraper_config)
 
-        if scraper_config['_dry_run']:
-            return
+        self._handle_metric(metric, scraper_config, metric_transformers)
 
+    def _handle_metric(self, metric, scraper_config, metric_transformers=None):
+        """
+        Submit a metric family according to `metrics_mapper`, or hand it to its transformer
+        """
         try:
             self._submit(scraper_config['metrics_mapper'][metric.name], metric, scraper_config)
         except KeyError:
@@ -399,45 +505,48 @@ class OpenMetricsScraperMixin(object):
         :param headers: extra headers
         :return: requests.Response
         """
-        endpoint = scraper_config.get('prometheus_url')
+        try:
+            response = self._poll(scraper_config, headers)
+        except requests.exceptions.SSLError:
+            raise
+        except IOError:
+            self._submit_health_service_check(scraper_config, AgentCheck.CRITICAL)
+            raise
+        finally:
+            self._submit_connection_stats(scraper_config)
 
-        # Should we send a service check for when we make a request
-        health_service_check = scraper_config['health_service_check']
-        service_check_name = '{}{}'.format(scraper_config['namespace'], '.prometheus.health')
-        service_check_tags = ['endpoint:{}'.format(endpoint)]
-        service_check_tags.extend(scraper_config['custom_tags'])
+        self._submit_health_service_check(scraper_config, AgentCheck.OK)
+        return response
 
+    def _poll(self, scraper_config, headers=None):
+        """
+        Send the request of `poll` without submitting anything, so that it can be called from any thread
+        """
+        endpoint = scraper_config.get('prometheus_url')
         try:
             response = self.send_request(endpoint, scraper_config, headers)
         except requests.exceptions.SSLError:
             self.log.error("Invalid SSL settings for requesting {} endpoint".format(endpoint))
             raise
-        except IOError:
-            if health_service_check:
-                self.service_check(
-                    service_check_name,
-                    AgentCheck.CRITICAL,
-                    tags=service_check_tags
-                )
-            raise
+
         try:
             response.raise_for_status()
-            if health_service_check:
-                self.service_check(
-                    service_check_name,
-                    AgentCheck.OK,
-                    tags=service_check_tags
-                )
-            return response
         except requests.HTTPError:
             response.close()
-            if health_service_check:
-                self.service_check(
-                    service_check_name,
-                    AgentCheck.CRITICAL,
-                    tags=service_check_tags
-                )
             raise
+        return response
+
+    def _submit_health_service_check(self, scraper_config, status):
+        """
+        Submit the health service check of an endpoint, if enabled
+        """
+        if not scraper_config['health_service_check']:
+            return
+
+        service_check_tags = ['endpoint:{}'.format(scraper_config.get('prometheus_url'))]
+        service_check_tags.extend(scraper_config['custom_tags'])
+        self.service_check('{}{}'.format(scraper_config['namespace'], '.prometheus.health'), status,
+                           tags=service_check_tags)
 
     def send_request(self, endpoint, scraper_config, headers=None):
         # Determine the headers
@@ -470,8 +579,45 @@ class OpenMetricsScraperMixin(object):
         password = scraper_config['password']
         auth = (username, password) if username is not None and password is not None else None
 
-        return requests.get(endpoint, headers=headers, stream=True, timeout=scraper_config['prometheus_timeout'],
-                            cert=cert, verify=verify, auth=auth)
+        if not scraper_config['persist_connections']:
+            return requests.get(endpoint, headers=headers, stream=True, timeout=scraper_config['prometheus_timeout'],
+                                cert=cert, verify=verify, auth=auth)
+
+        session = scraper_config['_session']
+        if session is None:
+            session = scraper_config['_session'] = PersistentSession(scraper_config['connection_pool_size'])
+
+        return session.get(endpoint, headers=headers, stream=True, timeout=scraper_config['prometheus_timeout'],
+                           cert=cert, verify=verify, auth=auth)
+
+    def _submit_connection_stats(self, scraper_config):
+        """
+        Submit the number of connections opened and reused by the persistent session since the last poll
+        """
+        if not scraper_config['debug_metrics'] or scraper_config['_session'] is None:
+            return
+
+        endpoint = scraper_config.get('prometheus_url')
+        opened, sent = scraper_config['_session'].get_connection_stats()
+        last_opened, last_sent = scraper_config['_connection_stats']
+        scraper_config['_connection_stats'] = (opened, sent)
+
+        new_connections = opened - last_opened
+        reused_connections = (sent - last_sent) - new_connections
+        tags = ['endpoint:{}'.format(endpoint)]
+        tags.extend(scraper_config['custom_tags'])
+
+        namespace = scraper_config['namespace']
+        self.count('{}.prometheus.connections.opened'.format(namespace), new_connections, tags=tags)
+        self.count('{}.prometheus.connections.reused'.format(namespace), reused_connections, tags=tags)
+
+    def _get_submitter(self, scraper_config):
+        """
+        Return the object the samples are submitted to: the batch of the current run
+        if any, the check itself otherwise (e.g. when called outside of `process`)
+        """
+        batch = scraper_config.get('_metric_batch')
+        return self if batch is None else batch
 
     def get_hostname_for_sample(self, sample, scraper_config):
         """
@@ -493,7 +639,8 @@ class OpenMetricsScraperMixin(object):
         metric when sending the gauge to Datadog.
         """
         if metric.type in ["gauge", "counter", "rate"]:
-            metric_name_with_namespace = '{}.{}'.format(scraper_config['namespace'], metric_name)
+            plan = self._get_submission_plan(metric_name, metric, scraper_config)
+            submit = getattr(self._get_submitter(scraper_config), plan.method)
             for sample in metric.samples:
                 val = sample[self.SAMPLE_VALUE]
                 if not self._is_value_valid(val):
@@ -501,13 +648,8 @@ class OpenMetricsScraperMixin(object):
                     continue
                 custom_hostname = self._get_hostname(hostname, sample, scraper_config)
                 # Determine the tags to send
-                tags = self._metric_tags(metric_name, val, sample, scraper_config, hostname=custom_hostname)
-                if metric.type == "counter" and scraper_config['send_monotonic_counter']:
-                    self.monotonic_count(metric_name_with_namespace, val, tags=tags, hostname=custom_hostname)
-                elif metric.type == "rate":
-                    self.rate(metric_name_with_namespace, val, tags=tags, hostname=custom_hostname)
-                else:
-                    self.gauge(metric_name_with_namespace, val, tags=tags, hostname=custom_hostname)
+                tags = self._plan_tags(plan, val, sample, scraper_config, hostname=custom_hostname)
+                submit(plan.name, val, tags=tags, hostname=custom_hostname)
         elif metric.type == "histogram":
             self._submit_gauges_from_histogram(metric_name, metric, scraper_config)
         elif metric.type == "summary":
@@ -515,6 +657,19 @@ class OpenMetricsScraperMixin(object):
         else:
             self.log.error("Metric type {} unsupported for metric {}.".format(metric.type, metric_name))
 
+    def _get_submission_plan(self, metric_name, metric, scraper_config):
+        """
+        Return the `SubmissionPlan` of a metric family, compiled on first use
+        """
+        return self._get_plan(metric_name, metric.type, scraper_config)
+
+    def _get_plan(self, metric_name, metric_type, scraper_config):
+        plans = scraper_config['_submission_plans']
+        # During `process`, the settings the plans depend on are only checked once, see `_start_process`
+        if scraper_config.get('_metric_batch') is None:
+            plans.refresh(scraper_config)
+        return plans.get(metric_name, metric_type, scraper_config)
+
     def _get_hostname(self, hostname, sample, scraper_config):
         """
         If hostname is None, look at label_to_hostname setting
@@ -532,6 +687,8 @@ class OpenMetricsScraperMixin(object):
         """
         Extracts metrics from a prometheus summary metric and sends them as gauges
         """
+        plan = self._get_submission_plan(metric_name, metric, scraper_config)
+        gauge = self._get_submitter(scraper_config).gauge
         for sample in metric.samples:
             val = sample[self.SAMPLE_VALUE]
             if not self._is_value_valid(val):
@@ -539,23 +696,22 @@ class OpenMetricsScraperMixin(object):
                 continue
             custom_hostname = self._get_hostname(hostname, sample, scraper_config)
             if sample[self.SAMPLE_NAME].endswith("_sum"):
-                tags = self._metric_tags(metric_name, val, sample, scraper_config, hostname=custom_hostname)
-                self.gauge("{}.{}.sum".format(scraper_config['namespace'], metric_name), val, tags=tags,
-                           hostname=custom_hostname)
+                tags = self._plan_tags(plan, val, sample, scraper_config, hostname=custom_hostname)
+                gauge(plan.sum_name, val, tags=tags, hostname=custom_hostname)
             elif sample[self.SAMPLE_NAME].endswith("_count"):
-                tags = self._metric_tags(metric_name, val, sample, scraper_config, hostname=custom_hostname)
-                self.gauge("{}.{}.count".format(scraper_config['namespace'], metric_name), val, tags=tags,
-                           hostname=custom_hostname)
+                tags = self._plan_tags(plan, val, sample, scraper_config, hostname=custom_hostname)
+                gauge(plan.count_name, val, tags=tags, hostname=custom_hostname)
             else:
-                sample[self.SAMPLE_LABELS]["quantile"] = float(sample[self.SAMPLE_LABELS]["quantile"])
-                tags = self._metric_tags(metric_name, val, sample, scraper_config, hostname=custom_hostname)
-                self.gauge("{}.{}.quantile".format(scraper_config['namespace'], metric_name), val, tags=tags,
-                           hostname=custom_hostname)
+                sample[self.SAMPLE_LABELS]["quantile"] = plan.bound(sample[self.SAMPLE_LABELS]["quantile"])
+                tags = self._plan_tags(plan, val, sample, scraper_config, hostname=custom_hostname)
+                gauge(plan.quantile_name, val, tags=tags, hostname=custom_hostname)
 
     def _submit_gauges_from_histogram(self, metric_name, metric, scraper_config, hostname=None):
         """
         Extracts metrics from a prometheus histogram and sends them as gauges
         """
+        plan = self._get_submission_plan(metric_name, metric, scraper_config)
+        gauge = self._get_submitter(scraper_config).gauge
         for sample in metric.samples:
             val = sample[self.SAMPLE_VALUE]
             if not self._is_value_valid(val):
@@ -563,30 +719,29 @@ class OpenMetricsScraperMixin(object):
                 continue
             custom_hostname = self._get_hostname(hostname, sample, scraper_config)
             if sample[self.SAMPLE_NAME].endswith("_sum"):
-                tags = self._metric_tags(metric_name, val, sample, scraper_config, hostname)
-                self.gauge("{}.{}.sum".format(scraper_config['namespace'], metric_name), val, tags=tags,
-                           hostname=custom_hostname)
+                tags = self._plan_tags(plan, val, sample, scraper_config, hostname)
+                gauge(plan.sum_name, val, tags=tags, hostname=custom_hostname)
             elif sample[self.SAMPLE_NAME].endswith("_count"):
-                tags = self._metric_tags(metric_name, val, sample, scraper_config, hostname)
-                self.gauge("{}.{}.count".format(scraper_config['namespace'], metric_name), val, tags=tags,
-                           hostname=custom_hostname)
-            elif (scraper_config['send_histograms_buckets'] and sample[self.SAMPLE_NAME].endswith("_bucket") and
+                tags = self._plan_tags(plan, val, sample, scraper_config, hostname)
+                gauge(plan.count_name, val, tags=tags, hostname=custom_hostname)
+            elif (plan.send_buckets and sample[self.SAMPLE_NAME].endswith("_bucket") and
                     "Inf" not in sample[self.SAMPLE_LABELS]["le"]):
-                sample[self.SAMPLE_LABELS]["le"] = float(sample[self.SAMPLE_LABELS]["le"])
-                tags = self._metric_tags(metric_name, val, sample, scraper_config, hostname)
-                self.gauge("{}.{}.count".format(scraper_config['namespace'], metric_name), val, tags=tags,
-                           hostname=custom_hostname)
+                sample[self.SAMPLE_LABELS]["le"] = plan.bound(sample[self.SAMPLE_LABELS]["le"])
+                tags = self._plan_tags(plan, val, sample, scraper_config, hostname)
+                gauge(plan.count_name, val, tags=tags, hostname=custom_hostname)
 
     def _metric_tags(self, metric_name, val, sample, scraper_config, hostname=None):
-        custom_tags = scraper_config['custom_tags']
-        _tags = list(custom_tags)
-        _tags.extend(scraper_config['_metric_tags'])
-        for label_name, label_value in iteritems(sample[self.SAMPLE_LABELS]):
-            if label_name not in scraper_config['exclude_labels']:
-                tag_name = scraper_config['labels_mapper'].get(label_name, label_name)
-                _tags.append('{}:{}'.format(tag_name, label_value))
-        return self._finalize_tags_to_submit(_tags, metric_name, val, sample, custom_tags=custom_tags,
-                                             hostname=hostname)
+        plan = self._get_plan(metric_name, None, scraper_config)
+        return self._plan_tags(plan, val, sample, scraper_config, hostname=hostname)
+
+    def _plan_tags(self, plan, val, sample, scraper_config, hostname=None):
+        tags = self._finalize_tags_to_submit(plan.tags(sample[self.SAMPLE_LABELS]), plan.metric_name, val, sample,
+                                             custom_tags=scraper_config['custom_tags'], hostname=hostname)
+        # Only intern the tags shared by all the samples of the family: the tags built from the labels
+        # of each sample can be high cardinality (pods, containers...) and would just churn the cache
+        if len(tags) == len(plan.base_tags) and tuple(tags) == plan.base_tags:
+            return self.intern_tags(tags)
+        return tags
 
     def _is_value_valid(self, val):
         return not (isnan(val) or isinf(val))
@@ -0,0 +1,130 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import OrderedDict
+
+from six import iteritems
+
+# Maximum number of submission plans kept per scraper configuration
+DEFAULT_PLAN_CACHE_SIZE = 2000
+
+
+class SubmissionPlan(object):
+    """
+    SubmissionPlan holds everything needed to submit the samples of a metric family that only depends
+    on the metric name and the scraper configuration: the final metric names, the submission method and
+    the `tag_name:` prefix of each label, so that submitting a sample only formats its `tag:value` pairs.
+    """
+    __slots__ = (
+        'metric_name', 'name', 'sum_name', 'count_name', 'quantile_name', 'method', 'base_tags',
+        'send_buckets', '_labels_mapper', '_exclude_labels', '_tag_prefixes', '_bounds',
+    )
+
+    def __init__(self, metric_name, metric_type, scraper_config):
+        namespace = scraper_config['namespace']
+        self.metric_name = metric_name
+        self.name = '{}.{}'.format(namespace, metric_name)
+        self.sum_name = '{}.sum'.format(self.name)
+        self.count_name = '{}.count'.format(self.name)
+        self.quantile_name = '{}.quantile'.format(self.name)
+
+        if metric_type == 'counter' and scraper_config['send_monotonic_counter']:
+            self.method = 'monotonic_count'
+        elif metric_type == 'rate':
+            self.method = 'rate'
+        else:
+            self.method = 'gauge'
+
+        self.base_tags = tuple(scraper_config['custom_tags']) + tuple(scraper_config['_metric_tags'])
+        self.send_buckets = scraper_config['send_histograms_buckets']
+        self._labels_mapper = scraper_config['labels_mapper']
+        self._exclude_labels = frozenset(scraper_config['exclude_labels'])
+
+        # label name -> `tag_name:` prefix, or `None` for the excluded labels
+        self._tag_prefixes = {}
+        # `le` and `quantile` raw values -> normalized values
+        self._bounds = {}
+
+    def tags(self, labels):
+        """
+        Build the list of tags of a sample from its labels
+        """
+        tags = list(self.base_tags)
+        tag_prefixes = self._tag_prefixes
+        for label_name, label_value in iteritems(labels):
+            try:
+                prefix = tag_prefixes[label_name]
+            except KeyError:
+                prefix = tag_prefixes[label_name] = self._tag_prefix(label_name)
+            if prefix is None:
+                continue
+            try:
+                tags.append(prefix + label_value)
+            except TypeError:
+                # Not a string, e.g. set by a custom handler
+                tags.append('{}{}'.format(prefix, label_value))
+        return tags
+
+    def bound(self, value):
+        """
+        Normalize the value of a `le` or `quantile` label to its float representation, e.g. `1` to `1.0`
+        """
+        try:
+            return self._bounds[value]
+        except KeyError:
+            bound = self._bounds[value] = '{}'.format(float(value))
+            return bound
+
+    def _tag_prefix(self, label_name):
+        if label_name in self._exclude_labels:
+            return None
+        return '{}:'.format(self._labels_mapper.get(label_name, label_name))
+
+
+class SubmissionPlanCache(object):
+    """
+    SubmissionPlanCache keeps the submission plans of a scraper configuration, the least recently used
+    ones are evicted once `max_size` is reached. All the plans are dropped when `refresh` finds that
+    the settings they depend on changed.
+    """
+    def __init__(self, max_size=DEFAULT_PLAN_CACHE_SIZE):
+        self.max_size = max_size
+        self._plans = OrderedDict()
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self._plans)
+
+    def refresh(self, scraper_config):
+        """
+        Drop the plans if the settings they depend on changed since the previous call
+        """
+        fingerprint = self._get_fingerprint(scraper_config)
+        if fingerprint != self._fingerprint:
+            self._plans.clear()
+            self._fingerprint = fingerprint
+
+    def get(self, metric_name, metric_type, scraper_config):
+        key = (metric_name, metric_type)
+        plans = self._plans
+        plan = plans.pop(key, None)
+        if plan is None:
+            plan = SubmissionPlan(metric_name, metric_type, scraper_config)
+            if len(plans) >= self.max_size:
+                plans.popitem(last=False)
+
+        # (Re-)insert the plan as the most recently used one
+        plans[key] = plan
+        return plan
+
+    @staticmethod
+    def _get_fingerprint(scraper_config):
+        return (
+            scraper_config['namespace'],
+            tuple(scraper_config['custom_tags']),
+            tuple(scraper_config['_metric_tags']),
+            tuple(scraper_config['exclude_labels']),
+            tuple(sorted(scraper_config['labels_mapper'].items())),
+            scraper_config['send_monotonic_counter'],
+            scraper_config['send_histograms_buckets'],
+        )
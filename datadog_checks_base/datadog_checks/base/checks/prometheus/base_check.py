@@ -3,7 +3,9 @@
 # Licensed under a 3-clause BSD style license (see LICENSE)
 from .mixins import PrometheusScraperMixin
 from .. import AgentCheck
+from ...config import is_affirmative
 from ...errors import CheckException
+from ...utils.http import DEFAULT_POOL_SIZE
 
 from six import string_types
 
@@ -27,7 +29,8 @@ class PrometheusScraper(PrometheusScraperMixin):
         metric when sending the rate to Datadog.
         """
         _tags = self._metric_tags(metric_name, val, metric, custom_tags, hostname)
-        self.check.rate('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
+        submitter = self.check if self._metric_batch is None else self._metric_batch
+        submitter.rate('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
 
     def _submit_gauge(self, metric_name, val, metric, custom_tags=None, hostname=None):
         """
@@ -38,7 +41,8 @@ class PrometheusScraper(PrometheusScraperMixin):
         metric when sending the gauge to Datadog.
         """
         _tags = self._metric_tags(metric_name, val, metric, custom_tags, hostname)
-        self.check.gauge('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
+        submitter = self.check if self._metric_batch is None else self._metric_batch
+        submitter.gauge('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
 
     def _submit_monotonic_count(self, metric_name, val, metric, custom_tags=None, hostname=None):
         """
@@ -50,7 +54,8 @@ class PrometheusScraper(PrometheusScraperMixin):
         """
 
         _tags = self._metric_tags(metric_name, val, metric, custom_tags, hostname)
-        self.check.monotonic_count('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
+        submitter = self.check if self._metric_batch is None else self._metric_batch
+        submitter.monotonic_count('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
 
     def _metric_tags(self, metric_name, val, metric, custom_tags=None, hostname=None):
         _tags = []
@@ -69,6 +74,9 @@ class PrometheusScraper(PrometheusScraperMixin):
     def _submit_service_check(self, *args, **kwargs):
         self.check.service_check(*args, **kwargs)
 
+    def _submit_batch(self, batch):
+        self.check.submit_batch(batch)
+
 
 class GenericPrometheusCheck(AgentCheck):
     """
@@ -168,6 +176,13 @@ class GenericPrometheusCheck(AgentCheck):
         scraper.ssl_cert = instance.get("ssl_cert", default_instance.get("ssl_cert", None))
         scraper.ssl_private_key = instance.get("ssl_private_key", default_instance.get("ssl_private_key", None))
         scraper.ssl_ca_cert = instance.get("ssl_ca_cert", default_instance.get("ssl_ca_cert", None))
+        scraper.persist_connections = is_affirmative(instance.get("persist_connections",
+                                                                  default_instance.get("persist_connections", False)))
+        scraper.protobuf_streaming = is_affirmative(instance.get("protobuf_streaming",
+                                                                 default_instance.get("protobuf_streaming", False)))
+        scraper.connection_pool_size = int(instance.get("connection_pool_size",
+                                                        default_instance.get("connection_pool_size",
+                                                                             DEFAULT_POOL_SIZE)))
 
         scraper.set_prometheus_timeout(instance, default_instance.get("prometheus_timeout", 10))
 
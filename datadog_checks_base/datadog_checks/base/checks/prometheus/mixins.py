@@ -8,14 +8,16 @@ import requests
 from urllib3 import disable_warnings
 from urllib3.exceptions import InsecureRequestWarning
 from collections import defaultdict
-from google.protobuf.internal.decoder import _DecodeVarint32  # pylint: disable=E0611,E0401
 from ...utils.prometheus import metrics_pb2
+from ...utils.prometheus.functions import parse_metric_family, parse_metric_family_stream
+from ...utils.prometheus.parser import text_fd_to_metric_families
 from math import isnan, isinf
-from prometheus_client.parser import text_fd_to_metric_families
 
-from six import PY3, iteritems, string_types
+from six import PY3, get_unbound_function, iteritems, string_types
 
 from .. import AgentCheck
+from ...utils.batch import MetricBatch
+from ...utils.http import DEFAULT_POOL_SIZE, PersistentSession
 
 if PY3:
     long = int
@@ -158,11 +160,32 @@ class PrometheusScraperMixin(object):
         # Timeout used during the network request
         self.prometheus_timeout = 10
 
+        # Keep the connections to the endpoints alive between the check runs
+        self.persist_connections = False
+
+        # Maximum number of connections kept alive per endpoint when `persist_connections` is enabled
+        self.connection_pool_size = DEFAULT_POOL_SIZE
+
+        # `PersistentSession` used to poll the endpoints when `persist_connections` is enabled
+        self._session = None
+
         # List of strings to filter the input text payload on. If any line contains
         # one of these strings, it will be filtered out before being parsed.
         # INTERNAL FEATURE, might be removed in future versions
         self._text_filter_blacklist = []
 
+        # `MetricBatch` buffering the samples of the current `process` run, flushed
+        # to the aggregator at the end of the run
+        self._metric_batch = None
+
+        # Decode the protobuf payloads incrementally as they are received instead of
+        # loading the whole response in memory first
+        self.protobuf_streaming = False
+
+        # Function telling the parser which metric families can be handled during the current
+        # `process` run, see `_get_family_filter`
+        self._family_filter = None
+
     def parse_metric_family(self, response):
         """
         Parse the MetricFamily from a valid requests.Response object to provide a MetricFamily object (see [0])
@@ -179,16 +202,14 @@ class PrometheusScraperMixin(object):
         :return: metrics_pb2.MetricFamily()
         """
         if 'application/vnd.google.protobuf' in response.headers['Content-Type']:
-            n = 0
-            buf = response.content
-            while n < len(buf):
-                msg_len, new_pos = _DecodeVarint32(buf, n)
-                n = new_pos
-                msg_buf = buf[n:n + msg_len]
-                n += msg_len
-
-                message = metrics_pb2.MetricFamily()
-                message.ParseFromString(msg_buf)
+            if self.protobuf_streaming:
+                messages = parse_metric_family_stream(
+                    response.iter_content(chunk_size=self.REQUESTS_CHUNK_SIZE), family_filter=self._family_filter
+                )
+            else:
+                messages = parse_metric_family(response.content, family_filter=self._family_filter)
+
+            for message in messages:
                 message.name = self.remove_metric_prefix(message.name)
 
                 # Lookup type overrides:
@@ -210,7 +231,7 @@ class PrometheusScraperMixin(object):
 
             obj_map = {}  # map of the types of each metrics
             obj_help = {}  # help for the metrics
-            for metric in text_fd_to_metric_families(input_gen):
+            for metric in text_fd_to_metric_families(input_gen, family_filter=self._family_filter):
                 metric.name = self.remove_metric_prefix(metric.name)
                 metric_name = "%s_bucket" % metric.name if metric.type == "histogram" else metric.name
                 metric_type = self.type_overrides.get(metric_name, metric.type)
@@ -391,8 +412,53 @@ class PrometheusScraperMixin(object):
         if instance:
             kwargs['custom_tags'] = instance.get('tags', [])
 
-        for metric in self.scrape_metrics(endpoint):
-            self.process_metric(metric, **kwargs)
+        batch = self._metric_batch = MetricBatch()
+        self._family_filter = self._get_family_filter()
+        try:
+            for metric in self.scrape_metrics(endpoint):
+                self.process_metric(metric, **kwargs)
+        finally:
+            self._metric_batch = None
+            self._family_filter = None
+            self._submit_batch(batch)
+
+    def _get_family_filter(self):
+        """
+        Build the function telling whether `process_metric` would do anything with a metric family,
+        given its name as found in the payload, so that the parser skips the families we would drop
+        anyway without decoding them. Returns `None` when `process_metric` is overridden.
+        """
+        process_metric = get_unbound_function(PrometheusScraperMixin.process_metric)
+        if getattr(self.process_metric, '__func__', None) is not process_metric:
+            return None
+
+        metrics_mapper = self.metrics_mapper
+        label_joins = self.label_joins
+        ignore_metrics = self.ignore_metrics
+        wildcards = [x for x in metrics_mapper if '*' in x]
+        results = {}
+
+        def family_filter(name):
+            try:
+                return results[name]
+            except KeyError:
+                pass
+
+            metric_name = self.remove_metric_prefix(name)
+            if metric_name in label_joins:
+                wanted = True
+            elif metric_name in ignore_metrics:
+                wanted = False
+            elif metric_name in metrics_mapper or hasattr(self, metric_name):
+                # Mapped metric or metric with a handler method
+                wanted = True
+            else:
+                wanted = any(fnmatchcase(metric_name, wildcard) for wildcard in wildcards)
+
+            results[name] = wanted
+            return wanted
+
+        return family_filter
 
     def store_labels(self, message):
         # If targeted metric, store labels
@@ -519,8 +585,15 @@ class PrometheusScraperMixin(object):
             disable_warnings(InsecureRequestWarning)
             verify = False
         try:
-            response = requests.get(endpoint, headers=headers, stream=False, timeout=self.prometheus_timeout, cert=cert,
-                                    verify=verify)
+            stream = self.protobuf_streaming and pFormat == PrometheusFormat.PROTOBUF
+            if self.persist_connections:
+                if self._session is None:
+                    self._session = PersistentSession(self.connection_pool_size)
+                response = self._session.get(endpoint, headers=headers, stream=stream, timeout=self.prometheus_timeout,
+                                             cert=cert, verify=verify)
+            else:
+                response = requests.get(endpoint, headers=headers, stream=stream, timeout=self.prometheus_timeout,
+                                        cert=cert, verify=verify)
         except requests.exceptions.SSLError:
             self.log.error("Invalid SSL settings for requesting {} endpoint".format(endpoint))
             raise
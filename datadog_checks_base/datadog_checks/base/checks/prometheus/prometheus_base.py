@@ -44,7 +44,8 @@ class PrometheusCheck(PrometheusScraperMixin, AgentCheck):
         metric when sending the rate to Datadog.
         """
         _tags = self._metric_tags(metric_name, val, metric, custom_tags, hostname)
-        self.rate('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
+        submitter = self if self._metric_batch is None else self._metric_batch
+        submitter.rate('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
 
     def _submit_monotonic_count(self, metric_name, val, metric, custom_tags=None, hostname=None):
         """
@@ -56,7 +57,8 @@ class PrometheusCheck(PrometheusScraperMixin, AgentCheck):
         """
 
         _tags = self._metric_tags(metric_name, val, metric, custom_tags, hostname)
-        self.monotonic_count('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
+        submitter = self if self._metric_batch is None else self._metric_batch
+        submitter.monotonic_count('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
 
     def _submit_gauge(self, metric_name, val, metric, custom_tags=None, hostname=None):
         """
@@ -67,7 +69,8 @@ class PrometheusCheck(PrometheusScraperMixin, AgentCheck):
         metric when sending the gauge to Datadog.
         """
         _tags = self._metric_tags(metric_name, val, metric, custom_tags, hostname)
-        self.gauge('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
+        submitter = self if self._metric_batch is None else self._metric_batch
+        submitter.gauge('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
 
     def _metric_tags(self, metric_name, val, metric, custom_tags=None, hostname=None):
         _tags = []
@@ -84,3 +87,6 @@ class PrometheusCheck(PrometheusScraperMixin, AgentCheck):
 
     def _submit_service_check(self, *args, **kwargs):
         self.service_check(*args, **kwargs)
+
+    def _submit_batch(self, batch):
+        self.submit_batch(batch)
@@ -0,0 +1,86 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from array import array
+
+from six.moves import range
+
+try:
+    import aggregator
+except ImportError:
+    from ..stubs import aggregator
+
+
+class MetricBatch(object):
+    """
+    MetricBatch buffers metric samples in compact columns (metric type, name, value, tags, hostname)
+    so that a check can hand all of them to the aggregator in one call with `AgentCheck.submit_batch`,
+    instead of paying the full submission cost once per sample.
+
+    Types and values are stored in typed arrays, names, tags and hostnames are kept as references
+    to the objects passed in, the normalization happens once at flush time.
+    """
+    def __init__(self):
+        self.types = array('b')
+        self.values = array('d')
+        self.names = []
+        self.tags = []
+        self.hostnames = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        types, names, values, tags, hostnames = self.types, self.names, self.values, self.tags, self.hostnames
+        for i in range(len(values)):
+            yield types[i], names[i], values[i], tags[i], hostnames[i]
+
+    def add(self, mtype, name, value, tags=None, hostname=None):
+        """
+        Buffer a sample. `None` values are ignored like they are by `AgentCheck`,
+        values that can't be converted to float raise a `ValueError`.
+        """
+        if value is None:
+            return
+
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(
+                "Metric: {} has non float value: {}. "
+                "Only float values can be submitted as metrics.".format(repr(name), repr(value))
+            )
+
+        self.types.append(mtype)
+        self.values.append(value)
+        self.names.append(name)
+        self.tags.append(tags)
+        self.hostnames.append(hostname)
+
+    def gauge(self, name, value, tags=None, hostname=None):
+        self.add(aggregator.GAUGE, name, value, tags=tags, hostname=hostname)
+
+    def count(self, name, value, tags=None, hostname=None):
+        self.add(aggregator.COUNT, name, value, tags=tags, hostname=hostname)
+
+    def monotonic_count(self, name, value, tags=None, hostname=None):
+        self.add(aggregator.MONOTONIC_COUNT, name, value, tags=tags, hostname=hostname)
+
+    def rate(self, name, value, tags=None, hostname=None):
+        self.add(aggregator.RATE, name, value, tags=tags, hostname=hostname)
+
+    def histogram(self, name, value, tags=None, hostname=None):
+        self.add(aggregator.HISTOGRAM, name, value, tags=tags, hostname=hostname)
+
+    def historate(self, name, value, tags=None, hostname=None):
+        self.add(aggregator.HISTORATE, name, value, tags=tags, hostname=hostname)
+
+    def clear(self):
+        """
+        Drop all the buffered samples, to be called once the batch has been flushed
+        """
+        self.types = array('b')
+        self.values = array('d')
+        self.names = []
+        self.tags = []
+        self.hostnames = []
@@ -0,0 +1,383 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from itertools import count
+import logging
+import threading
+import time
+
+from six.moves import queue
+
+log = logging.getLogger(__name__)
+
+# Size of the executor shared by the checks of the process, see `get_executor`
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_MAX_QUEUE_SIZE = 1000
+# Number of seconds after which a worker without work exits
+DEFAULT_IDLE_TIMEOUT = 60
+
+PENDING = 'pending'
+RUNNING = 'running'
+FINISHED = 'finished'
+CANCELLED = 'cancelled'
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+
+class ExecutorError(Exception):
+    pass
+
+
+class ExecutorQueueFull(ExecutorError):
+    """
+    Raised when submitting a task to an executor whose queue is full.
+    """
+    pass
+
+
+class ExecutorShutdown(ExecutorError):
+    """
+    Raised when submitting a task to an executor that was shut down.
+    """
+    pass
+
+
+class CancelledError(ExecutorError):
+    """
+    Raised when getting the result of a cancelled task.
+    """
+    pass
+
+
+class TimeoutError(ExecutorError):
+    """
+    Raised when the result of a task isn't available in time, either because the timeout given
+    to `Future.result` elapsed or because the task itself timed out.
+    """
+    pass
+
+
+class Future(object):
+    """
+    The result of a task submitted to an `Executor`, modeled after `concurrent.futures.Future`.
+
+    A task with a timeout fails with a `TimeoutError` once the timeout elapsed: it's dropped if it
+    didn't start yet, otherwise its thread runs it to completion but its result is discarded.
+    """
+    def __init__(self, timeout=None):
+        self.deadline = None if timeout is None else time.time() + timeout
+        self._state = PENDING
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        self._condition = threading.Condition()
+
+    def cancel(self):
+        """
+        Cancel the task if it didn't start yet, return whether it's cancelled.
+        """
+        with self._condition:
+            if self._state == PENDING:
+                self._state = CANCELLED
+                self._condition.notify_all()
+            elif self._state != CANCELLED:
+                return False
+        self._run_callbacks()
+        return True
+
+    def cancelled(self):
+        return self._state == CANCELLED
+
+    def running(self):
+        return self._state == RUNNING and not self._expire()
+
+    def done(self):
+        return self._state in (FINISHED, CANCELLED) or self._expire()
+
+    def timed_out(self):
+        """
+        Return whether the task failed because its timeout elapsed.
+        """
+        return self.done() and isinstance(self._exception, TimeoutError)
+
+    def result(self, timeout=None):
+        """
+        Return the value returned by the task, waiting at most `timeout` seconds for it to complete.
+        Raise what the task raised, a `CancelledError` if it was cancelled or a `TimeoutError`.
+        """
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Return what the task raised, `None` if it succeeded, waiting at most `timeout` seconds for it to complete.
+        Raise a `CancelledError` if the task was cancelled or a `TimeoutError` if it didn't complete in time.
+        """
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """
+        Call `fn(future)` once the task is done, right away if it's already done.
+        """
+        with self._condition:
+            if self._state not in (FINISHED, CANCELLED):
+                self._callbacks.append(fn)
+                return
+        self._call(fn)
+
+    def _wait(self, timeout):
+        end = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while not self.done():
+                # Wake up at the deadline of the task if it comes first
+                deadlines = [d for d in (end, self.deadline) if d is not None]
+                remaining = min(deadlines) - time.time() if deadlines else None
+                if end is not None and remaining <= 0:
+                    raise TimeoutError()
+                self._condition.wait(remaining)
+
+            if self._state == CANCELLED:
+                raise CancelledError()
+
+    def _expire(self):
+        """
+        Fail the task if its deadline passed, return whether it did.
+        """
+        if self.deadline is None or time.time() < self.deadline:
+            return False
+        return self._set_done(exception=TimeoutError('Task timed out'))
+
+    def _start(self):
+        """
+        Mark the task as running, return False if it must be dropped instead.
+        """
+        if self._expire():
+            return False
+        with self._condition:
+            if self._state != PENDING:
+                return False
+            self._state = RUNNING
+            return True
+
+    def _set_done(self, result=None, exception=None):
+        """
+        Store the outcome of the task, return False if it's already done.
+        """
+        with self._condition:
+            if self._state in (FINISHED, CANCELLED):
+                return False
+            self._state = FINISHED
+            self._result = result
+            self._exception = exception
+            self._condition.notify_all()
+        self._run_callbacks()
+        return True
+
+    def _run_callbacks(self):
+        with self._condition:
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            self._call(fn)
+
+    def _call(self, fn):
+        try:
+            fn(self)
+        except Exception:
+            log.exception('Uncaught exception in a callback of a future')
+
+
+class Executor(object):
+    """
+    Executor runs tasks in a pool of threads, with a `concurrent.futures`-style API:
+
+        future = executor.submit(requests.get, url, timeout=10)
+        response = future.result()
+
+    Its queue is bounded: `submit` raises an `ExecutorQueueFull` rather than letting the backlog grow.
+    Workers are started as tasks are submitted, up to `max_workers`, and exit after `idle_timeout`
+    seconds without work, so an idle executor doesn't hold any thread.
+
+    Checks are meant to share the executor of the process, see `get_executor`, rather than each
+    starting its own threads.
+    """
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, name='Executor'):
+        self.max_workers = max(max_workers, 1)
+        self.idle_timeout = idle_timeout
+        self.name = name
+        self._queue = queue.Queue(max(max_queue_size, 0))
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._worker_ids = count()
+        self._idle = 0
+        self._shutdown = False
+
+        # Statistics, see `get_stats`
+        self._busy = 0
+        self._busy_time = 0.0
+        self._counters = dict.fromkeys(('submitted', 'completed', 'failed', 'cancelled', 'timed_out', 'rejected'), 0)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule `fn(*args, **kwargs)` and return its `Future`.
+        Raise an `ExecutorQueueFull` if the queue is full.
+        """
+        return self.submit_with_timeout(None, fn, *args, **kwargs)
+
+    def submit_with_timeout(self, timeout, fn, *args, **kwargs):
+        """
+        Schedule `fn(*args, **kwargs)` and return its `Future`, which fails with a `TimeoutError`
+        if the task doesn't complete within `timeout` seconds.
+        Raise an `ExecutorQueueFull` if the queue is full.
+        """
+        future = Future(timeout)
+        with self._lock:
+            if self._shutdown:
+                raise ExecutorShutdown('Executor {} was shut down'.format(self.name))
+            try:
+                self._queue.put_nowait((future, fn, args, kwargs))
+            except queue.Full:
+                self._counters['rejected'] += 1
+                raise ExecutorQueueFull('The queue of executor {} is full'.format(self.name))
+            self._counters['submitted'] += 1
+
+            # Tasks are queued faster than the idle workers pick them up
+            start_worker = self._idle < self._queue.qsize() and len(self._workers) < self.max_workers
+            if start_worker:
+                self._idle += 1
+                worker = threading.Thread(target=self._work, name='{}-{}'.format(self.name, next(self._worker_ids)))
+                worker.daemon = True
+                self._workers.add(worker)
+        if start_worker:
+            worker.start()
+        return future
+
+    def map(self, fn, *iterables, **kwargs):
+        """
+        Like the builtin `map`, but the calls are run concurrently. Results are yielded in order,
+        waiting at most `timeout` seconds for all the calls to complete.
+        """
+        timeout = kwargs.pop('timeout', None)
+        if kwargs:
+            raise TypeError('Unexpected arguments: {}'.format(', '.join(kwargs)))
+
+        end = None if timeout is None else time.time() + timeout
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+
+        def results():
+            try:
+                for future in futures:
+                    yield future.result(None if end is None else max(end - time.time(), 0))
+            finally:
+                for future in futures:
+                    future.cancel()
+        return results()
+
+    def get_stats(self):
+        """
+        Return the utilization of the executor:
+
+        - `workers`, `busy` and `queued`: the number of threads, how many are running a task and how many
+          tasks are waiting for a thread
+        - `busy_time`: the total time the threads spent running tasks, in seconds
+        - `submitted`, `completed`, `failed`, `cancelled`, `timed_out` and `rejected`: the number of
+          tasks by outcome, `rejected` being the ones submitted while the queue was full
+
+        All but `workers`, `busy` and `queued` are counters since the creation of the executor, as it can be
+        shared: submit them as monotonic counts.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['workers'] = len(self._workers)
+            stats['busy'] = self._busy
+            stats['busy_time'] = self._busy_time
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """
+        Stop accepting tasks, the workers exit once the queue is empty.
+        The queued tasks are cancelled if `cancel_futures` is set, and the workers are joined if `wait` is set.
+        """
+        with self._lock:
+            self._shutdown = True
+            workers = list(self._workers)
+
+        if cancel_futures:
+            while True:
+                try:
+                    future, _, _, _ = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if future.cancel():
+                    self._count('cancelled')
+
+        # Wake up the idle workers, blocking since the queue may still be full
+        for _ in workers:
+            self._queue.put(None)
+
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _work(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    # A task may have been queued since, counting on this worker
+                    if not self._shutdown and self._queue.qsize():
+                        continue
+                    item = None
+
+            with self._lock:
+                self._idle -= 1
+                if item is None:
+                    self._workers.discard(threading.current_thread())
+                    return
+
+            future, fn, args, kwargs = item
+            if not future._start():
+                self._count('timed_out' if future.timed_out() else 'cancelled')
+                with self._lock:
+                    self._idle += 1
+                continue
+
+            with self._lock:
+                self._busy += 1
+            start = time.time()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                result, exception, outcome = None, e, 'failed'
+            else:
+                exception, outcome = None, 'completed'
+            # The result of a task completing after its timeout is discarded
+            if future._expire() or not future._set_done(result, exception):
+                outcome = 'timed_out'
+
+            with self._lock:
+                self._busy -= 1
+                self._busy_time += time.time() - start
+                self._counters[outcome] += 1
+                self._idle += 1
+
+
+def get_executor():
+    """
+    Return the executor shared by all the checks of the process, started on first use.
+    """
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = Executor(name='ChecksExecutor')
+        return _shared_executor
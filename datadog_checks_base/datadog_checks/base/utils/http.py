@@ -0,0 +1,81 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+
+
+class PersistentSession(object):
+    """
+    PersistentSession wraps a `requests.Session` so that the connections to an endpoint are kept
+    alive and reused across check runs. The underlying session is only rebuilt when the SSL or
+    authentication settings it was created with change.
+    """
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE):
+        """
+        :param pool_size: maximum number of connections kept alive per host
+        """
+        self.pool_size = pool_size
+        self.session = None
+        self.settings = None
+
+        # Counters of the sessions closed so far, so that the stats keep increasing across rebuilds
+        self._closed_stats = (0, 0)
+
+    def get(self, url, cert=None, verify=True, auth=None, **kwargs):
+        """
+        Send a GET request through the persistent session, accepts the same arguments as `requests.get`
+        """
+        settings = (cert, verify, auth)
+        if self.session is None or settings != self.settings:
+            self.close()
+            self.session = self._new_session(cert, verify, auth)
+            self.settings = settings
+
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        if self.session is None:
+            return
+
+        opened, sent = self.get_connection_stats()
+        self._closed_stats = (opened, sent)
+        self.session.close()
+        self.session = None
+        self.settings = None
+
+    def get_connection_stats(self):
+        """
+        Returns the number of connections opened and of requests sent since the creation of the object,
+        the difference between both being the number of requests that reused a kept-alive connection
+        """
+        opened, sent = self._closed_stats
+        if self.session is None:
+            return opened, sent
+
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                try:
+                    pool = pools[key]
+                except KeyError:
+                    # The pool was evicted meanwhile
+                    continue
+                opened += pool.num_connections
+                sent += pool.num_requests
+
+        return opened, sent
+
+    def _new_session(self, cert, verify, auth):
+        session = requests.Session()
+        session.cert = cert
+        session.verify = verify
+        session.auth = auth
+
+        adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
@@ -0,0 +1,194 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from timeit import default_timer as timer
+import cProfile
+import logging
+import os
+import re
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+try:
+    # Python 3.7+, only counts the CPU time of the current thread
+    from time import thread_time as cpu_timer
+except ImportError:
+    def cpu_timer():
+        times = os.times()
+        return times[0] + times[1]
+
+from .platform import Platform
+
+log = logging.getLogger(__name__)
+
+# Number of runs between two dumps of the stats of `cProfile`
+DEFAULT_DUMP_INTERVAL = 10
+
+METRIC_PREFIX = 'datadog.agent.check.'
+
+FILENAME_UNSAFE_CHARS = re.compile(r'[^\w.-]+')
+
+
+def get_peak_rss():
+    """
+    Return the peak resident set size of the process in bytes, `None` if it can't be retrieved
+    """
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, kilobytes elsewhere
+    if Platform.is_darwin():
+        return peak_rss
+    return peak_rss * 1024
+
+
+class CheckProfiler(object):
+    """
+    CheckProfiler measures the cost of the runs of a check: wall time, CPU time, growth of the peak RSS
+    of the process, number of submissions and time spent submitting them as opposed to running the logic
+    of the check. The submission methods of the check are wrapped on the instance, so that checks
+    that don't enable profiling aren't slowed down at all.
+
+    Every `dump_interval` runs, the run can also be profiled with `cProfile`, the stats being dumped
+    to `dump_dir`, see https://docs.python.org/3/library/profile.html#pstats.Stats to load them.
+    """
+    def __init__(self, check, dump_dir=None, dump_interval=DEFAULT_DUMP_INTERVAL):
+        """
+        :param check: the `AgentCheck` to profile
+        :param dump_dir: (optional) directory where the `cProfile` stats are dumped
+        :param dump_interval: number of runs between two dumps
+        """
+        self.dump_dir = dump_dir
+        self.dump_interval = max(int(dump_interval), 1)
+        self.runs = 0
+        self.check = check
+
+        self._cprofile = None
+        self._start_time = None
+        self._start_cpu_time = None
+        self._start_peak_rss = None
+        self.reset()
+
+        self._instrument(check)
+
+    def reset(self):
+        self.metric_count = 0
+        self.service_check_count = 0
+        self.event_count = 0
+        self.submit_time = 0.0
+
+    def start(self):
+        """
+        To be called right before the run of the check
+        """
+        self.reset()
+        self.runs += 1
+
+        if self.dump_dir and self.runs % self.dump_interval == 0:
+            self._cprofile = cProfile.Profile()
+            try:
+                self._cprofile.enable()
+            except ValueError as e:
+                # Another profiler is already active
+                log.warning('Unable to profile the run of the check: %s', e)
+                self._cprofile = None
+
+        self._start_peak_rss = get_peak_rss()
+        self._start_cpu_time = cpu_timer()
+        self._start_time = timer()
+
+    def stop(self):
+        """
+        To be called right after the run of the check, returns the list of `(metric name, value)`
+        measured for the run
+        """
+        wall_time = timer() - self._start_time
+        cpu_time = cpu_timer() - self._start_cpu_time
+        peak_rss = get_peak_rss()
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._dump_stats(self._cprofile)
+            self._cprofile = None
+
+        metrics = [
+            ('run.wall_time', wall_time),
+            ('run.cpu_time', cpu_time),
+            ('run.submit_time', self.submit_time),
+            ('run.check_time', max(wall_time - self.submit_time, 0.0)),
+            ('run.metrics', self.metric_count),
+            ('run.service_checks', self.service_check_count),
+            ('run.events', self.event_count),
+        ]
+        if peak_rss is not None and self._start_peak_rss is not None:
+            metrics.append(('run.peak_rss_delta', peak_rss - self._start_peak_rss))
+
+        return [(METRIC_PREFIX + name, value) for name, value in metrics]
+
+    def _dump_stats(self, profile):
+        # The check ID is only set by the Agent once the check is loaded
+        check_id = self.check.check_id
+        if isinstance(check_id, bytes):
+            check_id = check_id.decode('utf-8', 'replace')
+        prefix = FILENAME_UNSAFE_CHARS.sub('_', check_id or self.check.name or 'check')
+
+        path = os.path.join(self.dump_dir, '{}-{}.prof'.format(prefix, self.runs))
+        try:
+            profile.dump_stats(path)
+        except (IOError, OSError) as e:
+            log.warning('Unable to dump the profile of the check to %s: %s', path, e)
+
+    def _instrument(self, check):
+        submit_metric = check._submit_metric
+        submit_batch = check.submit_batch
+        service_check = check.service_check
+        event = check.event
+
+        # Only the samples that reach the aggregator are counted, not the ones dropped by the metric limit
+        # or ignored because their value is `None`
+        def _submit_metric(*args, **kwargs):
+            start = timer()
+            submitted = False
+            try:
+                submitted = submit_metric(*args, **kwargs)
+                return submitted
+            finally:
+                self.submit_time += timer() - start
+                if submitted:
+                    self.metric_count += 1
+
+        def _submit_batch(batch):
+            start = timer()
+            submitted = 0
+            try:
+                submitted = submit_batch(batch)
+                return submitted
+            finally:
+                self.submit_time += timer() - start
+                self.metric_count += submitted or 0
+
+        def _service_check(*args, **kwargs):
+            start = timer()
+            try:
+                return service_check(*args, **kwargs)
+            finally:
+                self.submit_time += timer() - start
+                self.service_check_count += 1
+
+        def _event(*args, **kwargs):
+            start = timer()
+            try:
+                return event(*args, **kwargs)
+            finally:
+                self.submit_time += timer() - start
+                self.event_count += 1
+
+        check._submit_metric = _submit_metric
+        check.submit_batch = _submit_batch
+        check.service_check = _service_check
+        check.event = _event
@@ -3,26 +3,149 @@
 # Licensed under Simplified BSD License (see LICENSE)
 
 from google.protobuf.internal.decoder import _DecodeVarint32  # pylint: disable=E0611,E0401
+from google.protobuf.message import DecodeError  # pylint: disable=E0611,E0401
 
 from . import metrics_pb2
 
+# Protobuf wire types
+WIRETYPE_VARINT = 0
+WIRETYPE_FIXED64 = 1
+WIRETYPE_LENGTH_DELIMITED = 2
+WIRETYPE_FIXED32 = 5
+
+# Tag of the `name` field of the MetricFamily message: field 1, length delimited
+METRIC_FAMILY_NAME_TAG = (1 << 3) | WIRETYPE_LENGTH_DELIMITED
+
 
 # Deprecated, please use the PrometheusCheck class
-def parse_metric_family(buf):
+def parse_metric_family(buf, family_filter=None):
     """
     Parse the binary buffer in input, searching for Prometheus messages
     of type MetricFamily [0] delimited by a varint32 [1].
 
     [0] https://github.com/prometheus/client_model/blob/086fe7ca28bde6cec2acd5223423c1475a362858/metrics.proto#L76-%20%20L81  # noqa: E501
     [1] https://developers.google.com/protocol-buffers/docs/reference/java/com/google/protobuf/AbstractMessageLite#writeDelimitedTo(java.io.OutputStream)  # noqa: E501
+
+    The messages are decoded from `buf` in place, see `parse_metric_family_stream` to decode
+    a payload as it is downloaded.
+
+    :param buf: bytes
+    :param family_filter: optional function called with each metric family name, returning False
+        if the family should be skipped. The skipped messages are not decoded.
     """
     n = 0
-    while n < len(buf):
-        msg_len, new_pos = _DecodeVarint32(buf, n)
-        n = new_pos
-        msg_buf = buf[n:n + msg_len]
-        n += msg_len
+    buf_len = len(buf)
+    while n < buf_len:
+        msg_len, n = _DecodeVarint32(buf, n)
+        msg_start, n = n, n + msg_len
+        if n > buf_len:
+            raise ValueError('Truncated MetricFamily message at the end of the payload')
+
+        if family_filter is not None:
+            name = _get_metric_family_name(buf, msg_start, n, decode_varint=_DecodeVarint32)
+            if name is not None and not family_filter(name):
+                continue
 
         message = metrics_pb2.MetricFamily()
-        message.ParseFromString(msg_buf)
+        message.ParseFromString(buf[msg_start:n])
         yield message
+
+
+def parse_metric_family_stream(chunks, family_filter=None):
+    """
+    Parse delimited MetricFamily messages incrementally from an iterable of binary chunks, e.g.
+    `requests.Response.iter_content()`, so that the whole payload never needs to be held in memory.
+
+    The chunks are appended to a single buffer reused for the whole stream, the messages being
+    decoded from a memoryview over it as soon as they are complete.
+
+    :param chunks: iterable of bytes
+    :param family_filter: optional function called with each metric family name, returning False
+        if the family should be skipped. The skipped messages are not decoded.
+    """
+    buf = bytearray()
+    start = 0
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+
+        # Drop what was already decoded, the buffer can't be resized while a memoryview exists
+        if start:
+            del buf[:start]
+            start = 0
+        buf += chunk
+
+        view = memoryview(buf)
+        buf_len = len(buf)
+        while start < buf_len:
+            try:
+                msg_len, msg_start = _decode_varint(buf, start)
+            except IndexError:
+                # The length of the message is split across chunks
+                break
+
+            msg_end = msg_start + msg_len
+            if msg_end > buf_len:
+                break
+            start = msg_end
+
+            if family_filter is not None:
+                name = _get_metric_family_name(buf, msg_start, msg_end)
+                if name is not None and not family_filter(name):
+                    continue
+
+            message = metrics_pb2.MetricFamily()
+            message.ParseFromString(view[msg_start:msg_end].tobytes())
+            yield message
+
+        del view
+
+    if start < len(buf):
+        raise ValueError('Truncated MetricFamily message at the end of the payload')
+
+
+def _decode_varint(buf, pos):
+    """
+    Decode the varint starting at `pos` in a bytearray, return its value and the position following it
+    """
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise ValueError('Too many bytes when decoding varint')
+
+
+def _get_metric_family_name(buf, pos, end, decode_varint=_decode_varint):
+    """
+    Return the name of the serialized MetricFamily between `pos` and `end` without decoding the message,
+    `None` if it can't be found. `decode_varint` must support the type of `buf`: `_decode_varint` for
+    a bytearray, protobuf's `_DecodeVarint32` for bytes.
+    """
+    try:
+        while pos < end:
+            tag, pos = decode_varint(buf, pos)
+            wire_type = tag & 0x7
+            if wire_type == WIRETYPE_VARINT:
+                _, pos = decode_varint(buf, pos)
+            elif wire_type == WIRETYPE_FIXED64:
+                pos += 8
+            elif wire_type == WIRETYPE_LENGTH_DELIMITED:
+                length, pos = decode_varint(buf, pos)
+                if tag == METRIC_FAMILY_NAME_TAG:
+                    return bytes(buf[pos:pos + length]).decode('utf-8')
+                pos += length
+            elif wire_type == WIRETYPE_FIXED32:
+                pos += 4
+            else:
+                return None
+    except (DecodeError, IndexError, UnicodeDecodeError, ValueError):
+        pass
+
+    return None
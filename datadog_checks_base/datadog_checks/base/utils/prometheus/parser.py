@@ -0,0 +1,189 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import re
+
+from prometheus_client.core import Metric
+
+# `name="value"` pairs, values can contain escaped quotes
+LABEL_PATTERN = re.compile(r'([^=,\s]+)\s*=\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+
+# Name of a sample, before its labels or value
+SAMPLE_NAME_PATTERN = re.compile(r'[^\s{]+')
+
+# Sample name suffixes allowed for each metric type
+TYPE_SUFFIXES = {
+    'counter': ('',),
+    'gauge': ('',),
+    'summary': ('_count', '_sum', ''),
+    'histogram': ('_count', '_sum', '_bucket'),
+}
+
+
+def _replace_help_escaping(s):
+    return s.replace('\\n', '\n').replace('\\\\', '\\')
+
+
+def _replace_escaping(s):
+    return s.replace('\\n', '\n').replace('\\\\', '\\').replace('\\"', '"')
+
+
+def _sample_name(line):
+    label_start = line.find('{')
+    if label_start == -1:
+        return line.split(None, 1)[0]
+    return line[:label_start].strip()
+
+
+def _parse_sample(line):
+    """
+    Parse a sample line into a `(name, labels, value)` tuple, timestamps are ignored
+    """
+    try:
+        label_start = line.find('{')
+        if label_start == -1:
+            name, value = line.split(None, 2)[:2]
+            return name, {}, float(value)
+
+        label_end = line.rindex('}')
+        name = line[:label_start].strip()
+        label_string = line[label_start + 1:label_end]
+        if '\\' in label_string:
+            labels = {n: _replace_escaping(v).strip() for n, v in LABEL_PATTERN.findall(label_string)}
+        else:
+            labels = {n: v.strip() for n, v in LABEL_PATTERN.findall(label_string)}
+        return name, labels, float(line[label_end + 1:].split(None, 1)[0])
+    except (IndexError, ValueError):
+        raise ValueError('Invalid sample: {}'.format(line))
+
+
+def _build_metric(name, documentation, typ, samples):
+    metric = Metric(name, documentation, typ)
+    metric.samples = samples
+    return metric
+
+
+def text_fd_to_metric_families(fd, family_filter=None):
+    """
+    Parse the Prometheus text format line by line from an iterable of lines and yield
+    `prometheus_client.core.Metric` objects whose samples are plain `(name, labels, value)` tuples.
+
+    This is a drop-in replacement for `prometheus_client.parser.text_fd_to_metric_families`,
+    yielding the same metric families, but relying on precompiled patterns.
+
+    :param fd: iterable of unicode lines
+    :param family_filter: optional function called with each metric family name, returning False
+        if the family should be skipped. The samples of skipped families are not parsed at all.
+    """
+    name = ''
+    documentation = ''
+    typ = 'untyped'
+    samples = []
+    allowed_names = ()
+    keep = True
+
+    for line in fd:
+        line = line.strip()
+
+        if not line:
+            continue
+
+        if line[0] == '#':
+            parts = line.split(None, 3)
+            if len(parts) < 3:
+                continue
+            if parts[1] == 'HELP':
+                if parts[2] != name:
+                    if name and keep:
+                        yield _build_metric(name, documentation, typ, samples)
+                    # New metric
+                    name = parts[2]
+                    typ = 'untyped'
+                    samples = []
+                    allowed_names = (name,)
+                    keep = family_filter is None or family_filter(name)
+                if len(parts) == 4:
+                    documentation = _replace_help_escaping(parts[3])
+                else:
+                    documentation = ''
+            elif parts[1] == 'TYPE':
+                if parts[2] != name:
+                    if name and keep:
+                        yield _build_metric(name, documentation, typ, samples)
+                    # New metric
+                    name = parts[2]
+                    documentation = ''
+                    samples = []
+                    keep = family_filter is None or family_filter(name)
+                typ = parts[3] if len(parts) == 4 else 'untyped'
+                allowed_names = tuple(name + suffix for suffix in TYPE_SUFFIXES.get(typ, ('',)))
+            # Ignore other comment tokens
+            continue
+
+        if keep:
+            sample = _parse_sample(line)
+            sample_name = sample[0]
+        else:
+            # The current family is skipped, only look at the name to find where it ends
+            sample = None
+            sample_name = _sample_name(line)
+
+        if sample_name in allowed_names:
+            if keep:
+                samples.append(sample)
+            continue
+
+        if name and keep:
+            yield _build_metric(name, documentation, typ, samples)
+
+        # New metric, yield immediately as untyped singleton
+        name = ''
+        documentation = ''
+        typ = 'untyped'
+        samples = []
+        allowed_names = ()
+        keep = True
+
+        if family_filter is None or family_filter(sample_name):
+            if sample is None:
+                sample = _parse_sample(line)
+            yield _build_metric(sample_name, documentation, typ, [sample])
+
+    if name and keep:
+        yield _build_metric(name, documentation, typ, samples)
+
+
+def filter_metric_families(lines, family_filter):
+    """
+    Drop all the lines (HELP and TYPE comments, samples) of the metric families rejected
+    by `family_filter` from an iterable of lines, before they are handed to the parser.
+
+    :param lines: iterable of unicode lines
+    :param family_filter: function called once per metric family with its name, returning False
+        if the family should be dropped
+    """
+    family = None
+    family_names = ()
+    keep = True
+
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        if stripped[0] == '#':
+            parts = stripped.split(None, 3)
+            if len(parts) >= 3 and parts[1] in ('HELP', 'TYPE') and parts[2] != family:
+                family = parts[2]
+                family_names = (family, family + '_bucket', family + '_sum', family + '_count')
+                keep = family_filter(family)
+        else:
+            name = SAMPLE_NAME_PATTERN.match(stripped).group()
+            if name not in family_names:
+                # Sample outside of the current family, e.g. a metric without metadata
+                family = name
+                family_names = (name,)
+                keep = family_filter(name)
+
+        if keep:
+            yield line
@@ -0,0 +1,95 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import OrderedDict
+
+
+class TagSet(object):
+    """
+    TagSet is an immutable, hashable sequence of tags. The encoded form of the tags sent
+    to the aggregator is computed on first submission and cached on the object, so that
+    submitting the same TagSet again doesn't encode every tag again.
+    """
+    __slots__ = ('tags', 'encoded', '_hash')
+
+    def __init__(self, tags=None):
+        self.tags = tuple(tags) if tags is not None else ()
+        self.encoded = None
+        self._hash = hash(self.tags)
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __contains__(self, tag):
+        return tag in self.tags
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, TagSet):
+            return self.tags == other.tags
+        return NotImplemented
+
+    def __ne__(self, other):
+        if isinstance(other, TagSet):
+            return self.tags != other.tags
+        return NotImplemented
+
+    def __repr__(self):
+        return 'TagSet({!r})'.format(list(self.tags))
+
+
+class TagSetCache(object):
+    """
+    TagSetCache interns sets of tags: equal sets of tags are resolved to the same TagSet object,
+    and thus to the same cached encoded form. The least recently used entries are evicted
+    once `max_size` is reached so high cardinality tags can't grow the memory without bound.
+    """
+    def __init__(self, max_size):
+        """
+        :param max_size: maximum number of TagSet to keep, 0 disables interning
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def intern(self, tags):
+        """
+        Return the TagSet corresponding to `tags`, creating it if it isn't cached yet
+        """
+        if isinstance(tags, TagSet):
+            return tags
+
+        key = tuple(tags) if tags is not None else ()
+        cache = self._cache
+        tag_set = cache.pop(key, None)
+        if tag_set is None:
+            self.misses += 1
+            tag_set = TagSet(key)
+            if not self.max_size:
+                return tag_set
+            if len(cache) >= self.max_size:
+                cache.popitem(last=False)
+        else:
+            self.hits += 1
+
+        # (Re-)insert the entry as the most recently used one
+        cache[key] = tag_set
+        return tag_set
+
+    def clear(self):
+        self._cache.clear()
+
+    def get_status(self):
+        """
+        Returns the hit/miss counters and the current size of the cache
+        """
+        return (self.hits, self.misses, len(self._cache))
@@ -1,9 +1,12 @@
 # (C) Datadog, Inc. 2018
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import mock
 import pytest
 
 from datadog_checks.checks import AgentCheck
+from datadog_checks.base import MetricBatch
+from datadog_checks.base.utils.executor import Executor
 
 
 @pytest.fixture
@@ -28,6 +31,67 @@ class TestMetrics:
             check.gauge(metric_name, '85k')
         aggregator.assert_metric(metric_name, count=0)
 
+    def test_submit_executor_stats(self, aggregator):
+        check = AgentCheck()
+        executor = Executor(max_workers=1, max_queue_size=0)
+        executor.submit(lambda: None).result(1)
+        check.submit_executor_stats('test', 2, tags=['foo:bar'], executor=executor)
+        executor.shutdown()
+
+        aggregator.assert_metric('test.executor.queued', value=0, tags=['foo:bar'], count=1)
+        aggregator.assert_metric('test.executor.workers', value=1, tags=['foo:bar'], count=1)
+        aggregator.assert_metric('test.executor.busy', value=0, tags=['foo:bar'], count=1)
+        aggregator.assert_metric('test.executor.rejected', value=2, tags=['foo:bar'], count=1)
+
+
+class TestBatch:
+    def test_submit_batch(self, aggregator):
+        check = AgentCheck()
+        batch = MetricBatch()
+        batch.gauge('test.gauge', 1, tags=['foo:bar'])
+        batch.monotonic_count('test.count', 2, hostname='host')
+        batch.rate('test.rate', None)
+        assert len(batch) == 2
+
+        check.submit_batch(batch)
+
+        aggregator.assert_metric('test.gauge', value=1, tags=['foo:bar'], count=1, metric_type=aggregator.GAUGE)
+        aggregator.assert_metric('test.count', value=2, hostname='host', count=1,
+                                 metric_type=aggregator.MONOTONIC_COUNT)
+        aggregator.assert_metric('test.rate', count=0)
+        assert len(batch) == 0
+
+    def test_non_float_value(self):
+        batch = MetricBatch()
+        with pytest.raises(ValueError):
+            batch.gauge('test.gauge', '85k')
+        assert len(batch) == 0
+
+    def test_bulk_entry_point(self, aggregator):
+        check = AgentCheck()
+        batch = MetricBatch()
+        batch.gauge('test.gauge', 1, tags=[u'foo:bar'])
+        batch.gauge('test.gauge', 2)
+
+        with mock.patch.object(aggregator, 'submit_metrics', create=True) as submit_metrics:
+            check.submit_batch(batch)
+
+        submit_metrics.assert_called_once_with(
+            check, b'', [aggregator.GAUGE, aggregator.GAUGE], [b'test.gauge', b'test.gauge'], [1.0, 2.0],
+            [[b'foo:bar'], []], [b'', b'']
+        )
+        aggregator.assert_metric('test.gauge', count=0)
+
+    def test_metric_limit(self, aggregator):
+        check = LimitedCheck()
+        batch = MetricBatch()
+        for i in range(0, 20):
+            batch.gauge('metric', i)
+
+        check.submit_batch(batch)
+        assert len(check.get_warnings()) == 1
+        assert len(aggregator.metrics('metric')) == 10
+
 
 class TestEvents:
     def test_valid_event(self, aggregator):
@@ -94,6 +158,90 @@ class TestTags:
         assert normalized_tags is not tags
         assert normalized_tag == tag.encode('utf-8')
 
+    def test_tag_set(self, aggregator):
+        check = AgentCheck()
+        tag_set = check.intern_tags([u'unicode:string', b'bytes:string'])
+
+        assert check.intern_tags([u'unicode:string', b'bytes:string']) is tag_set
+        assert check._normalize_tags(tag_set, None) == [b'unicode:string', b'bytes:string']
+        assert tag_set.encoded == (b'unicode:string', b'bytes:string')
+
+        check.gauge('test.gauge', 1, tags=tag_set)
+        check.service_check('test.sc', AgentCheck.OK, tags=tag_set)
+        aggregator.assert_metric('test.gauge', tags=['unicode:string', 'bytes:string'], count=1)
+        aggregator.assert_service_check('test.sc', tags=['unicode:string', 'bytes:string'], count=1)
+
+    def test_tag_cache_size(self):
+        check = AgentCheck('test', {}, [{'tag_cache_size': 1}])
+        check.intern_tags(['foo:bar'])
+        check.intern_tags(['bar:baz'])
+
+        assert check.tag_cache.get_status() == (0, 2, 1)
+
+
+class ProfiledCheck(AgentCheck):
+    def check(self, instance):
+        self.gauge('test.gauge', 1)
+        batch = MetricBatch()
+        batch.gauge('test.batch', 1)
+        batch.gauge('test.batch', 2)
+        self.submit_batch(batch)
+        self.service_check('test.sc', AgentCheck.OK)
+        self.event({'msg_text': 'test event'})
+
+
+class TestProfiling:
+    def test_disabled(self, aggregator):
+        check = ProfiledCheck('test', {}, [{}])
+        assert check.profiler is None
+        assert '_submit_metric' not in check.__dict__
+
+        check.run()
+        assert not [name for name in aggregator.metric_names if name.startswith('datadog.agent.check.')]
+
+    def test_run_metrics(self, aggregator):
+        check = ProfiledCheck('test', {}, [{'profiling': True, 'tags': ['foo:bar']}])
+        assert check.run() == b''
+
+        tags = ['check_name:test', 'foo:bar']
+        for name in ('wall_time', 'cpu_time', 'submit_time', 'check_time'):
+            aggregator.assert_metric('datadog.agent.check.run.{}'.format(name), tags=tags, count=1)
+        aggregator.assert_metric('datadog.agent.check.run.metrics', value=3, tags=tags, count=1)
+        aggregator.assert_metric('datadog.agent.check.run.service_checks', value=1, tags=tags, count=1)
+        aggregator.assert_metric('datadog.agent.check.run.events', value=1, tags=tags, count=1)
+
+        # The counters are reset between runs
+        aggregator.reset()
+        check.run()
+        aggregator.assert_metric('datadog.agent.check.run.metrics', value=3, tags=tags, count=1)
+
+    def test_metric_limit(self, aggregator):
+        check = ProfiledCheck('test', {}, [{'profiling': True, 'max_returned_metrics': 1}])
+        check.run()
+
+        aggregator.assert_metric('test.gauge', count=1)
+        aggregator.assert_metric('test.batch', count=0)
+        # Only the submissions that reach the aggregator are counted
+        aggregator.assert_metric('datadog.agent.check.run.metrics', value=1, count=1)
+
+    def test_ignored_values(self, aggregator):
+        check = ProfiledCheck('test', {}, [{'profiling': True}])
+        check.check = lambda instance: check.gauge('test.gauge', None)
+        check.run()
+
+        aggregator.assert_metric('datadog.agent.check.run.metrics', value=0, count=1)
+
+    def test_dump(self, aggregator, tmpdir):
+        instance = {'profiling': True, 'profiling_dump_dir': str(tmpdir), 'profiling_dump_interval': 2}
+        check = ProfiledCheck('test', {}, [instance])
+        check.check_id = b'test:123'
+
+        check.run()
+        assert tmpdir.listdir() == []
+
+        check.run()
+        assert [path.basename for path in tmpdir.listdir()] == ['test_123-2.prof']
+
 
 class LimitedCheck(AgentCheck):
     DEFAULT_METRIC_LIMIT = 10
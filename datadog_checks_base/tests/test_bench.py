@@ -0,0 +1,50 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import os
+
+import mock
+from prometheus_client import parser
+
+from datadog_checks.checks.openmetrics import OpenMetricsBaseCheck
+from datadog_checks.base.utils.prometheus.parser import text_fd_to_metric_families
+
+# Make the kube-state-metrics payload big enough for the parsing to dominate
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', 'ksm.txt'), 'r') as f:
+    KSM_LINES = f.read().split('\n') * 50
+
+
+def parse(parse_function, *args):
+    for _ in parse_function(KSM_LINES, *args):
+        pass
+
+
+def test_text_parser_prometheus_client(benchmark):
+    benchmark(parse, parser.text_fd_to_metric_families)
+
+
+def test_text_parser(benchmark):
+    benchmark(parse, text_fd_to_metric_families)
+
+
+def test_text_parser_family_filter(benchmark):
+    benchmark(parse, text_fd_to_metric_families, lambda name: name.startswith('kube_pod_'))
+
+
+def test_openmetrics_process(benchmark):
+    instance = {
+        'prometheus_url': 'http://localhost:8080/metrics',
+        'namespace': 'ksm',
+        'metrics': ['kube_*'],
+        'labels_mapper': {'namespace': 'kube_namespace'},
+        'exclude_labels': ['uid'],
+        'tags': ['cluster:foo'],
+    }
+    check = OpenMetricsBaseCheck('openmetrics', {}, {}, [instance])
+    scraper_config = check.get_scraper_config(instance)
+    response = mock.MagicMock(
+        status_code=200, iter_lines=lambda **kwargs: KSM_LINES, headers={'Content-Type': 'text/plain'}
+    )
+
+    with mock.patch('requests.get', return_value=response):
+        benchmark(check.process, scraper_config)
@@ -0,0 +1,172 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import threading
+import time
+
+import pytest
+
+from datadog_checks.base.utils.executor import (
+    CancelledError, Executor, ExecutorQueueFull, ExecutorShutdown, TimeoutError, get_executor
+)
+
+
+@pytest.fixture
+def executor():
+    executor = Executor(max_workers=2, max_queue_size=4, name='test')
+    yield executor
+    executor.shutdown(cancel_futures=True)
+
+
+def _block(executor, count):
+    """
+    Keep `count` workers of the executor busy until the returned event is set
+    """
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def wait():
+        started.release()
+        # Don't block the teardown if the test failed
+        release.wait(5)
+
+    futures = [executor.submit(wait) for _ in range(count)]
+    for _ in futures:
+        started.acquire()
+    return release, futures
+
+
+def test_submit(executor):
+    future = executor.submit(lambda x, y=0: x + y, 1, y=2)
+    assert future.result(1) == 3
+    assert future.done() and not future.running() and future.exception() is None
+
+    def fail():
+        raise ValueError('foo')
+
+    future = executor.submit(fail)
+    with pytest.raises(ValueError):
+        future.result(1)
+    assert isinstance(future.exception(), ValueError)
+
+
+def test_result_timeout(executor):
+    release, futures = _block(executor, 1)
+    with pytest.raises(TimeoutError):
+        futures[0].result(0.01)
+    assert futures[0].running()
+    release.set()
+    assert futures[0].result(1) is None
+
+
+def test_map(executor):
+    assert list(executor.map(lambda x, y: x * y, range(5), range(5), timeout=1)) == [0, 1, 4, 9, 16]
+    with pytest.raises(TypeError):
+        executor.map(abs, [], foo=None)
+
+
+def test_cancel(executor):
+    release, running = _block(executor, 2)
+    future = executor.submit(lambda: None)
+    done = []
+    future.add_done_callback(done.append)
+
+    assert future.cancel() is True
+    assert future.cancelled() and future.done()
+    assert done == [future]
+    with pytest.raises(CancelledError):
+        future.result()
+    # A running task can't be cancelled
+    assert running[0].cancel() is False
+
+    release.set()
+    for future in running:
+        future.result(1)
+    assert executor.get_stats()['cancelled'] == 1
+
+
+def test_task_timeout(executor):
+    release, running = _block(executor, 2)
+    queued = executor.submit_with_timeout(0.01, lambda: 'queued')
+    time.sleep(0.02)
+    assert queued.timed_out()
+    with pytest.raises(TimeoutError):
+        queued.result()
+
+    release.set()
+    for future in running:
+        future.result(1)
+
+    release = threading.Event()
+    running = executor.submit_with_timeout(0.01, release.wait, 5)
+    with pytest.raises(TimeoutError):
+        running.result(1)
+    assert isinstance(running.exception(), TimeoutError)
+    release.set()
+
+    # The result of a task completing after its timeout is discarded
+    for _ in range(100):
+        if executor.get_stats()['timed_out'] == 2:
+            break
+        time.sleep(0.01)
+    assert executor.get_stats()['timed_out'] == 2
+    with pytest.raises(TimeoutError):
+        running.result()
+
+
+def test_bounded_queue(executor):
+    release, _ = _block(executor, 2)
+    for _ in range(4):
+        executor.submit(lambda: None)
+    with pytest.raises(ExecutorQueueFull):
+        executor.submit(lambda: None)
+
+    stats = executor.get_stats()
+    assert stats['rejected'] == 1
+    assert stats['queued'] == 4
+    assert stats['workers'] == stats['busy'] == 2
+    release.set()
+
+
+def test_stats(executor):
+    for future in [executor.submit(time.sleep, 0.01) for _ in range(3)]:
+        future.result(1)
+    executor.submit(int, 'foo').exception(1)
+
+    stats = executor.get_stats()
+    assert stats['submitted'] == 4
+    assert stats['completed'] == 3
+    assert stats['failed'] == 1
+    assert stats['busy'] == stats['queued'] == 0
+    assert stats['busy_time'] >= 0.03
+
+
+def test_idle_workers_exit():
+    executor = Executor(max_workers=2, idle_timeout=0.01)
+    assert executor.get_stats()['workers'] == 0
+    executor.submit(lambda: None).result(1)
+    for _ in range(100):
+        if executor.get_stats()['workers'] == 0:
+            break
+        time.sleep(0.01)
+    assert executor.get_stats()['workers'] == 0
+
+    # Workers are started again on demand
+    assert executor.submit(lambda: 1).result(1) == 1
+
+
+def test_shutdown():
+    executor = Executor(max_workers=1)
+    release, _ = _block(executor, 1)
+    queued = executor.submit(lambda: None)
+    release.set()
+    executor.shutdown(cancel_futures=True)
+
+    assert queued.cancelled()
+    assert executor.get_stats()['workers'] == 0
+    with pytest.raises(ExecutorShutdown):
+        executor.submit(lambda: None)
+
+
+def test_get_executor():
+    assert get_executor() is get_executor()
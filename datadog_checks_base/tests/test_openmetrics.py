@@ -5,14 +5,21 @@ import logging
 import os
 
 import math
+import re
+import threading
+
 import mock
 import pytest
 import requests
 
 from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily, SummaryMetricFamily, HistogramMetricFamily
-from six import iteritems
+from six.moves import BaseHTTPServer
 
 from datadog_checks.checks.openmetrics import OpenMetricsBaseCheck
+from datadog_checks.base.checks.openmetrics.label_joins import LabelJoinIndex
+from datadog_checks.base.checks.openmetrics.submission import SubmissionPlanCache
+from datadog_checks.base.utils.executor import ExecutorQueueFull
+from datadog_checks.errors import CheckException
 
 
 text_content_type = 'text/plain; version=0.0.4'
@@ -116,10 +123,189 @@ def test_process(text_data, mocked_prometheus_check, mocked_prometheus_scraper_c
     check.process_metric.assert_called_with(ref_gauge, mocked_prometheus_scraper_config, metric_transformers=None)
 
 
+def test_process_skips_unhandled_families(text_data, mocked_prometheus_check, mocked_prometheus_scraper_config):
+    check = mocked_prometheus_check
+    check.poll = mock.MagicMock(return_value=MockResponse(text_data, text_content_type))
+    check.process_metric = mock.MagicMock()
+    check.process(mocked_prometheus_scraper_config, metric_transformers={'go_memstats_alloc_bytes': mock.MagicMock()})
+
+    processed = [c[0][0].name for c in check.process_metric.call_args_list]
+    assert processed == ['go_memstats_alloc_bytes', 'process_virtual_memory_bytes']
+    assert mocked_prometheus_scraper_config['_family_filter'] is None
+
+    # Families are all parsed outside of `process`
+    families = list(check.parse_metric_family(MockResponse(text_data, text_content_type),
+                                              mocked_prometheus_scraper_config))
+    assert len(families) > len(processed)
+
+
+def test_family_prefilter(text_data, mocked_prometheus_check):
+    check = mocked_prometheus_check
+    instance = dict(PROMETHEUS_CHECK_INSTANCE)
+    instance['family_whitelist'] = ['^go_', '^process_']
+    instance['family_blacklist'] = ['^go_memstats_', 'gc_duration']
+    scraper_config = check.create_scraper_configuration(instance)
+
+    families = [m.name for m in check.parse_metric_family(MockResponse(text_data, text_content_type), scraper_config)]
+
+    assert 'process_virtual_memory_bytes' in families
+    assert 'go_goroutines' not in families  # untyped
+    assert all(name.startswith(('go_', 'process_')) for name in families)
+    assert not any(name.startswith('go_memstats_') or 'gc_duration' in name for name in families)
+
+
+def test_family_prefilter_invalid(mocked_prometheus_check):
+    instance = dict(PROMETHEUS_CHECK_INSTANCE, family_blacklist=['[invalid'])
+    with pytest.raises(CheckException):
+        mocked_prometheus_check.create_scraper_configuration(instance)
+
+
+@pytest.fixture
+def metrics_server(text_data):
+    """Serve the text payload on localhost with HTTP keep-alive"""
+    payload = text_data.encode('utf-8')
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', text_content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = BaseHTTPServer.HTTPServer(('localhost', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://localhost:{}/metrics'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_persist_connections(aggregator, mocked_prometheus_check, metrics_server):
+    check = mocked_prometheus_check
+    instance = dict(PROMETHEUS_CHECK_INSTANCE, prometheus_url=metrics_server, persist_connections=True,
+                    connection_pool_size=2, debug_metrics=True)
+    scraper_config = check.create_scraper_configuration(instance)
+    tags = ['endpoint:{}'.format(metrics_server)]
+
+    check.process(scraper_config)
+    aggregator.assert_metric('prometheus.process.vm.bytes', count=1)
+    aggregator.assert_metric('prometheus.prometheus.connections.opened', value=1, tags=tags, count=1)
+    aggregator.assert_metric('prometheus.prometheus.connections.reused', value=0, tags=tags, count=1)
+
+    aggregator.reset()
+    check.process(scraper_config)
+    check.process(scraper_config)
+    aggregator.assert_metric('prometheus.process.vm.bytes', count=2)
+    aggregator.assert_metric('prometheus.prometheus.connections.opened', value=0, tags=tags, count=2)
+    aggregator.assert_metric('prometheus.prometheus.connections.reused', value=1, tags=tags, count=2)
+    assert scraper_config['_session'].get_connection_stats() == (1, 3)
+
+
+def test_check_endpoints(aggregator, metrics_server):
+    other_endpoint = metrics_server.replace('/metrics', '/other')
+    instance = dict(PROMETHEUS_CHECK_INSTANCE, tags=['instance:foo'])
+    instance['prometheus_url'] = [metrics_server, {'prometheus_url': other_endpoint, 'tags': ['source:other']}]
+    check = OpenMetricsBaseCheck('prometheus_check', {}, {}, [instance])
+    check.check(instance)
+
+    aggregator.assert_metric('prometheus.process.vm.bytes', tags=['instance:foo'], count=1)
+    aggregator.assert_metric('prometheus.process.vm.bytes', tags=['instance:foo', 'source:other'], count=1)
+    aggregator.assert_service_check('prometheus.prometheus.health', status=OpenMetricsBaseCheck.OK,
+                                    tags=['endpoint:{}'.format(metrics_server), 'instance:foo'], count=1)
+    aggregator.assert_service_check('prometheus.prometheus.health', status=OpenMetricsBaseCheck.OK,
+                                    tags=['endpoint:{}'.format(other_endpoint), 'instance:foo', 'source:other'],
+                                    count=1)
+    for name in ('queued', 'workers', 'busy'):
+        aggregator.assert_metric('prometheus.prometheus.executor.{}'.format(name), tags=['instance:foo'], count=1)
+    aggregator.assert_metric('prometheus.prometheus.executor.rejected', value=0, tags=['instance:foo'], count=1)
+
+
+def test_check_endpoints_failure(aggregator, metrics_server):
+    unreachable_endpoint = 'http://localhost:1/metrics'
+    instance = dict(PROMETHEUS_CHECK_INSTANCE, prometheus_url=[metrics_server, unreachable_endpoint])
+    check = OpenMetricsBaseCheck('prometheus_check', {}, {}, [instance])
+    with pytest.raises(CheckException, match=unreachable_endpoint):
+        check.check(instance)
+
+    # The other endpoint is still collected
+    aggregator.assert_metric('prometheus.process.vm.bytes', count=1)
+    aggregator.assert_service_check('prometheus.prometheus.health', status=OpenMetricsBaseCheck.CRITICAL,
+                                    tags=['endpoint:{}'.format(unreachable_endpoint)], count=1)
+    assert check.config_map[unreachable_endpoint]['_metric_batch'] is None
+
+
+def test_check_endpoints_timeout(aggregator, metrics_server):
+    slow_endpoint = metrics_server.replace('/metrics', '/slow')
+    instance = dict(PROMETHEUS_CHECK_INSTANCE)
+    instance['prometheus_url'] = [metrics_server, {'prometheus_url': slow_endpoint, 'prometheus_timeout': 0.1}]
+    check = OpenMetricsBaseCheck('prometheus_check', {}, {}, [instance])
+    release = threading.Event()
+    poll = check._poll
+    service_check_threads = set()
+
+    def slow_poll(scraper_config, headers=None):
+        if scraper_config['prometheus_url'] == slow_endpoint:
+            release.wait(5)
+        return poll(scraper_config, headers)
+
+    def service_check(*args, **kwargs):
+        service_check_threads.add(threading.current_thread())
+        OpenMetricsBaseCheck.service_check(check, *args, **kwargs)
+
+    with mock.patch.object(check, '_poll', side_effect=slow_poll), \
+            mock.patch.object(check, 'service_check', side_effect=service_check):
+        try:
+            with pytest.raises(CheckException, match='timed out'):
+                check.check(instance)
+        finally:
+            release.set()
+
+    aggregator.assert_metric('prometheus.process.vm.bytes', count=1)
+    aggregator.assert_service_check('prometheus.prometheus.health', status=OpenMetricsBaseCheck.OK,
+                                    tags=['endpoint:{}'.format(metrics_server)], count=1)
+    aggregator.assert_service_check('prometheus.prometheus.health', status=OpenMetricsBaseCheck.CRITICAL,
+                                    tags=['endpoint:{}'.format(slow_endpoint)], count=1)
+    # Service checks are only submitted from the thread of the check
+    assert service_check_threads == {threading.current_thread()}
+
+
+def test_check_endpoints_executor_full(aggregator, metrics_server):
+    instance = dict(PROMETHEUS_CHECK_INSTANCE, prometheus_url=[metrics_server])
+    check = OpenMetricsBaseCheck('prometheus_check', {}, {}, [instance])
+    executor = mock.MagicMock()
+    executor.submit_with_timeout.side_effect = ExecutorQueueFull()
+
+    with mock.patch('datadog_checks.base.checks.openmetrics.base_check.get_executor', return_value=executor):
+        check.check(instance)
+
+    # Scraped from the thread of the check instead
+    aggregator.assert_metric('prometheus.process.vm.bytes', count=1)
+    aggregator.assert_service_check('prometheus.prometheus.health', status=OpenMetricsBaseCheck.OK, count=1)
+    aggregator.assert_metric('prometheus.prometheus.executor.rejected', value=1, count=1)
+
+
+def test_persist_connections_disabled(mocked_prometheus_check, mocked_prometheus_scraper_config, text_data):
+    check = mocked_prometheus_check
+    mock_response = mock.MagicMock(
+        status_code=200, iter_lines=lambda **kwargs: text_data.split("\n"), headers={'Content-Type': text_content_type}
+    )
+    with mock.patch('requests.get', return_value=mock_response, __name__="get") as get:
+        check.poll(mocked_prometheus_scraper_config)
+
+    assert get.call_count == 1
+    assert mocked_prometheus_scraper_config['_session'] is None
+
+
 def test_process_metric_gauge(aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config, ref_gauge):
     """ Gauge ref submission """
     check = mocked_prometheus_check
-    mocked_prometheus_scraper_config['_dry_run'] = False
     check.process_metric(ref_gauge, mocked_prometheus_scraper_config)
 
     aggregator.assert_metric('prometheus.process.vm.bytes', 54927360.0, tags=[], count=1)
@@ -131,7 +317,6 @@ def test_process_metric_filtered(aggregator, mocked_prometheus_check, mocked_pro
         'process_start_time_seconds', 'Start time of the process since unix epoch in seconds.'
     )
     filtered_gauge.add_metric([], 123456789.0)
-    mocked_prometheus_scraper_config['_dry_run'] = False
 
     check = mocked_prometheus_check
     check.process_metric(filtered_gauge, mocked_prometheus_scraper_config, metric_transformers={})
@@ -273,6 +458,24 @@ def test_submit_gauge_with_custom_tags(
     )
 
 
+def test_submit_gauge_tag_interning(aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config):
+    """ Only the tags shared by all the samples are interned, not the ones built from their labels """
+    check = mocked_prometheus_check
+    mocked_prometheus_scraper_config['custom_tags'] = ['env:dev']
+    metric = GaugeMetricFamily('process_virtual_memory_bytes', 'Virtual memory size in bytes.', labels=['pod'])
+    for i in range(10):
+        metric.add_metric(['pod-{}'.format(i)], float(i))
+    check._submit('process.vm.bytes', metric, mocked_prometheus_scraper_config)
+    assert len(check.tag_cache) == 0
+    aggregator.assert_metric('prometheus.process.vm.bytes', tags=['env:dev', 'pod:pod-3'], value=3.0, count=1)
+
+    unlabeled = GaugeMetricFamily('process_virtual_memory_bytes', 'Virtual memory size in bytes.', value=1.0)
+    check._submit('process.vm.bytes', unlabeled, mocked_prometheus_scraper_config)
+    check._submit('process.vm.bytes', unlabeled, mocked_prometheus_scraper_config)
+    assert check.tag_cache.get_status() == (1, 1, 1)
+    aggregator.assert_metric('prometheus.process.vm.bytes', tags=['env:dev'], value=1.0, count=2)
+
+
 def test_submit_gauge_with_labels_mapper(aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config):
     """
     Submitting metrics that contain labels mappers should result in tags
@@ -332,6 +535,47 @@ def test_submit_gauge_with_exclude_labels(aggregator, mocked_prometheus_check, m
     )
 
 
+def test_submission_plan_invalidation(aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config):
+    """ Submission plans are compiled once per metric and recompiled when the configuration changes """
+    ref_gauge = GaugeMetricFamily('process_virtual_memory_bytes', 'Virtual memory size in bytes.', labels=['label'])
+    ref_gauge.add_metric(['value'], 54927360.0)
+
+    check = mocked_prometheus_check
+    metric = mocked_prometheus_scraper_config['metrics_mapper'][ref_gauge.name]
+    check._submit(metric, ref_gauge, mocked_prometheus_scraper_config)
+    plan = check._get_submission_plan(metric, ref_gauge, mocked_prometheus_scraper_config)
+    check._submit(metric, ref_gauge, mocked_prometheus_scraper_config)
+    assert check._get_submission_plan(metric, ref_gauge, mocked_prometheus_scraper_config) is plan
+    aggregator.assert_metric('prometheus.process.vm.bytes', tags=['label:value'], count=2)
+
+    aggregator.reset()
+    mocked_prometheus_scraper_config['_metric_tags'][:] = ['foo:bar']
+    mocked_prometheus_scraper_config['labels_mapper']['label'] = 'renamed'
+    check._submit(metric, ref_gauge, mocked_prometheus_scraper_config)
+    assert check._get_submission_plan(metric, ref_gauge, mocked_prometheus_scraper_config) is not plan
+    aggregator.assert_metric('prometheus.process.vm.bytes', tags=['foo:bar', 'renamed:value'], count=1)
+
+
+def test_submission_plan_refreshed_once_per_process(aggregator, mocked_prometheus_check,
+                                                    mocked_prometheus_scraper_config, mock_get):
+    """ The settings the submission plans depend on are checked once per `process`, not per sample """
+    check = mocked_prometheus_check
+    mocked_prometheus_scraper_config['namespace'] = 'ksm'
+    mocked_prometheus_scraper_config['metrics_mapper'] = {'kube_pod_status_ready': 'pod.ready'}
+
+    def transformer(metric, scraper_config):
+        for sample in metric.samples:
+            check.gauge('ksm.pod.phase', sample[2],
+                        tags=check._metric_tags('pod.phase', sample[2], sample, scraper_config))
+
+    with mock.patch.object(SubmissionPlanCache, '_get_fingerprint', wraps=SubmissionPlanCache._get_fingerprint) \
+            as get_fingerprint:
+        check.process(mocked_prometheus_scraper_config, metric_transformers={'kube_pod_status_phase': transformer})
+
+    assert get_fingerprint.call_count == 1
+    aggregator.assert_metric('ksm.pod.phase')
+
+
 def test_submit_counter(aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config):
     _counter = CounterMetricFamily('my_counter', 'Random counter')
     _counter.add_metric([], 42)
@@ -997,10 +1241,6 @@ def test_label_joins(aggregator, mocked_prometheus_check, mocked_prometheus_scra
         'kube_deployment_status_replicas': 'deploy.replicas.available',
     }
 
-    # dry run to build mapping
-    check.process(mocked_prometheus_scraper_config)
-
-    # run with submit
     check.process(mocked_prometheus_scraper_config)
 
     # check a bunch of metrics
@@ -1275,9 +1515,6 @@ def test_label_joins_gc(aggregator, mocked_prometheus_check, mocked_prometheus_s
         'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node', 'pod_ip']}
     }
     mocked_prometheus_scraper_config['metrics_mapper'] = {'kube_pod_status_ready': 'pod.ready'}
-    # dry run to build mapping
-    check.process(mocked_prometheus_scraper_config)
-    # run with submit
     check.process(mocked_prometheus_scraper_config)
 
     # check a bunch of metrics
@@ -1306,16 +1543,17 @@ def test_label_joins_gc(aggregator, mocked_prometheus_check, mocked_prometheus_s
         count=1,
     )
 
-    assert 15 == len(mocked_prometheus_scraper_config['_label_mapping']['pod'])
+    label_join_index = mocked_prometheus_scraper_config['_label_join_index']
+    assert 15 == len(label_join_index)
     text_data = mock_get.replace('dd-agent-62bgh', 'dd-agent-1337')
     mock_response = mock.MagicMock(
         status_code=200, iter_lines=lambda **kwargs: text_data.split("\n"), headers={'Content-Type': text_content_type}
     )
     with mock.patch('requests.get', return_value=mock_response, __name__="get"):
         check.process(mocked_prometheus_scraper_config)
-        assert 'dd-agent-1337' in mocked_prometheus_scraper_config['_label_mapping']['pod']
-        assert 'dd-agent-62bgh' not in mocked_prometheus_scraper_config['_label_mapping']['pod']
-        assert 15 == len(mocked_prometheus_scraper_config['_label_mapping']['pod'])
+        assert label_join_index.get('pod', 'dd-agent-1337') is not None
+        assert label_join_index.get('pod', 'dd-agent-62bgh') is None
+        assert 15 == len(label_join_index)
 
 
 def test_label_joins_missconfigured(aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config, mock_get):
@@ -1327,9 +1565,6 @@ def test_label_joins_missconfigured(aggregator, mocked_prometheus_check, mocked_
     }
     mocked_prometheus_scraper_config['metrics_mapper'] = {'kube_pod_status_ready': 'pod.ready'}
 
-    # dry run to build mapping
-    check.process(mocked_prometheus_scraper_config)
-    # run with submit
     check.process(mocked_prometheus_scraper_config)
 
     # check a bunch of metrics
@@ -1365,9 +1600,6 @@ def test_label_join_not_existing(aggregator, mocked_prometheus_check, mocked_pro
         'kube_pod_info': {'label_to_match': 'not_existing', 'labels_to_get': ['node', 'pod_ip']}
     }
     mocked_prometheus_scraper_config['metrics_mapper'] = {'kube_pod_status_ready': 'pod.ready'}
-    # dry run to build mapping
-    check.process(mocked_prometheus_scraper_config)
-    # run with submit
     check.process(mocked_prometheus_scraper_config)
     # check a bunch of metrics
     aggregator.assert_metric(
@@ -1388,9 +1620,6 @@ def test_label_join_metric_not_existing(
         'not_existing': {'label_to_match': 'pod', 'labels_to_get': ['node', 'pod_ip']}
     }
     mocked_prometheus_scraper_config['metrics_mapper'] = {'kube_pod_status_ready': 'pod.ready'}
-    # dry run to build mapping
-    check.process(mocked_prometheus_scraper_config)
-    # run with submit
     check.process(mocked_prometheus_scraper_config)
     # check a bunch of metrics
     aggregator.assert_metric(
@@ -1401,6 +1630,37 @@ def test_label_join_metric_not_existing(
     )
 
 
+def test_label_join_missing_metric_not_deferred():
+    """ Metric families are only deferred while waiting for the join metrics found in the previous payload """
+    index = LabelJoinIndex({
+        'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node']},
+        'not_existing': {'label_to_match': 'pod', 'labels_to_get': ['pod_ip']},
+    })
+    info = GaugeMetricFamily('kube_pod_info', 'Pod info', labels=['pod', 'node'])
+    info.add_metric(['foo', 'bar'], 1.0)
+    ready = GaugeMetricFamily('kube_pod_status_ready', 'Pod ready', labels=['pod'])
+    ready.add_metric(['foo'], 1.0)
+
+    # First scrape: the join metrics found in the payload aren't known yet
+    index.start_scrape()
+    assert index.defer(ready, 'ready') is True
+    index.store(info)
+    assert index.end_scrape() == ['ready']
+
+    # `not_existing` wasn't in the previous payload, only wait for `kube_pod_info`
+    index.start_scrape()
+    assert index.defer(ready, 'ready') is True
+    index.store(info)
+    assert index.defer(ready, 'ready') is False
+    assert index.end_scrape() == ['ready']
+
+    # The join metric that was found isn't there anymore either
+    index.start_scrape()
+    index.end_scrape()
+    index.start_scrape()
+    assert index.defer(ready, 'ready') is False
+
+
 def test_label_join_with_hostname(aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config, mock_get):
     """ Tests label join and hostname override on a metric """
     check = mocked_prometheus_check
@@ -1410,9 +1670,6 @@ def test_label_join_with_hostname(aggregator, mocked_prometheus_check, mocked_pr
     }
     mocked_prometheus_scraper_config['label_to_hostname'] = 'node'
     mocked_prometheus_scraper_config['metrics_mapper'] = {'kube_pod_status_ready': 'pod.ready'}
-    # dry run to build mapping
-    check.process(mocked_prometheus_scraper_config)
-    # run with submit
     check.process(mocked_prometheus_scraper_config)
     # check a bunch of metrics
     aggregator.assert_metric(
@@ -1459,15 +1716,13 @@ def test_label_join_state_change(aggregator, mocked_prometheus_check, mocked_pro
         }
     }
     mocked_prometheus_scraper_config['metrics_mapper'] = {'kube_pod_status_ready': 'pod.ready'}
-    # dry run to build mapping
-    check.process(mocked_prometheus_scraper_config)
-    # run with submit
     check.process(mocked_prometheus_scraper_config)
 
     # check that 15 pods are in phase:Running
-    assert 15 == len(mocked_prometheus_scraper_config['_label_mapping']['pod'])
-    for _, tags in iteritems(mocked_prometheus_scraper_config['_label_mapping']['pod']):
-        assert tags.get('phase') == 'Running'
+    label_join_index = mocked_prometheus_scraper_config['_label_join_index']
+    assert 15 == len(label_join_index)
+    for pod in re.findall(r'kube_pod_status_phase{.*pod="(.+?)"} 1', mock_get):
+        assert label_join_index.get('pod', pod)['phase'] == 'Running'
 
     text_data = mock_get.replace(
         'kube_pod_status_phase{namespace="default",phase="Running",pod="dd-agent-62bgh"} 1',
@@ -1479,8 +1734,40 @@ def test_label_join_state_change(aggregator, mocked_prometheus_check, mocked_pro
     )
     with mock.patch('requests.get', return_value=mock_response, __name__="get"):
         check.process(mocked_prometheus_scraper_config)
-        assert 15 == len(mocked_prometheus_scraper_config['_label_mapping']['pod'])
-        assert mocked_prometheus_scraper_config['_label_mapping']['pod']['dd-agent-62bgh']['phase'] == 'Test'
+        assert 15 == len(label_join_index)
+        assert label_join_index.get('pod', 'dd-agent-62bgh')['phase'] == 'Test'
+
+
+def test_label_join_defined_later(aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config):
+    """ Tests label join when the join metric comes after the metric to enrich in the payload """
+    check = mocked_prometheus_check
+    mocked_prometheus_scraper_config['namespace'] = 'ksm'
+    mocked_prometheus_scraper_config['label_joins'] = {
+        'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node']}
+    }
+    mocked_prometheus_scraper_config['metrics_mapper'] = {
+        'kube_pod_container_status_ready': 'container.ready',
+        'kube_node_status_ready': 'node.ready',
+    }
+    text_data = (
+        '# TYPE kube_node_status_ready gauge\n'
+        'kube_node_status_ready{node="node-1"} 1\n'
+        '# TYPE kube_pod_container_status_ready gauge\n'
+        'kube_pod_container_status_ready{container="foo",pod="pod-1"} 1\n'
+        '# TYPE kube_pod_info gauge\n'
+        'kube_pod_info{node="node-1",pod="pod-1"} 1\n'
+    )
+    mock_response = mock.MagicMock(
+        status_code=200, iter_lines=lambda **kwargs: text_data.split("\n"), headers={'Content-Type': text_content_type}
+    )
+    with mock.patch('requests.get', return_value=mock_response, __name__="get"):
+        check.process(mocked_prometheus_scraper_config)
+
+    aggregator.assert_metric('ksm.node.ready', 1.0, tags=['node:node-1'], count=1)
+    aggregator.assert_metric(
+        'ksm.container.ready', 1.0, tags=['container:foo', 'pod:pod-1', 'node:node-1'], count=1
+    )
+    aggregator.assert_all_metrics_covered()
 
 
 def test_health_service_check_ok(mock_get, aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config):
@@ -12,6 +12,8 @@ from six.moves import range
 
 from datadog_checks.checks.prometheus import PrometheusCheck, UnknownFormatError
 from datadog_checks.utils.prometheus import parse_metric_family, metrics_pb2
+from datadog_checks.base.utils.prometheus.functions import parse_metric_family_stream
+from datadog_checks.base.utils.batch import MetricBatch
 
 
 protobuf_content_type = 'application/vnd.google.protobuf; proto=io.prometheus.client.MetricFamily; encoding=delimited'
@@ -62,6 +64,13 @@ def mocked_prometheus_check():
     return check
 
 
+@pytest.fixture
+def batched_gauge():
+    # Samples submitted during `process` are buffered in a `MetricBatch`
+    with mock.patch.object(MetricBatch, 'gauge') as gauge:
+        yield gauge
+
+
 @pytest.fixture
 def p_check():
     return PrometheusCheck('prometheus_check', {}, {}, {})
@@ -115,6 +124,37 @@ def test_parse_metric_family():
         assert messages[-1].name == 'process_virtual_memory_bytes'
 
 
+def test_parse_metric_family_stream(bin_data):
+    expected = list(parse_metric_family(bin_data))
+    # Chunks splitting both the length prefixes and the messages
+    chunks = [bin_data[i:i + 7] for i in range(0, len(bin_data), 7)]
+    messages = list(parse_metric_family_stream(chunks))
+    assert messages == expected
+
+
+def test_parse_metric_family_stream_family_filter(bin_data):
+    chunks = [bin_data[i:i + 1024] for i in range(0, len(bin_data), 1024)]
+    family_filter = mock.MagicMock(side_effect=lambda name: name.startswith('go_'))
+    messages = list(parse_metric_family_stream(chunks, family_filter=family_filter))
+    assert messages
+    assert all(m.name.startswith('go_') for m in messages)
+    assert family_filter.call_count == 61
+
+
+def test_parse_metric_family_family_filter(bin_data):
+    family_filter = mock.MagicMock(side_effect=lambda name: name.startswith('go_'))
+    messages = list(parse_metric_family(bin_data, family_filter=family_filter))
+    chunks = [bin_data[i:i + 1024] for i in range(0, len(bin_data), 1024)]
+    assert messages == list(parse_metric_family_stream(chunks, family_filter=lambda name: name.startswith('go_')))
+    assert messages
+    assert family_filter.call_count == 61
+
+
+def test_parse_metric_family_stream_truncated(bin_data):
+    with pytest.raises(ValueError):
+        list(parse_metric_family_stream([bin_data[:-1]]))
+
+
 def test_check(mocked_prometheus_check):
     """ Should not be implemented as it is the mother class """
     with pytest.raises(NotImplementedError):
@@ -266,6 +306,21 @@ def test_process(bin_data, mocked_prometheus_check, ref_gauge):
     check.process_metric.assert_called_with(ref_gauge, instance=None)
 
 
+def test_process_protobuf_streaming(bin_data, mocked_prometheus_check, batched_gauge):
+    """ Streamed protobuf payloads only decode the families that can be handled """
+    endpoint = "http://fake.endpoint:10055/metrics"
+    check = mocked_prometheus_check
+    check.protobuf_streaming = True
+    response = MockResponse(bin_data, protobuf_content_type)
+    response.iter_content = lambda chunk_size: (bin_data[i:i + chunk_size] for i in range(0, len(bin_data), chunk_size))
+    check.poll = mock.MagicMock(return_value=response)
+    with mock.patch.object(metrics_pb2, 'MetricFamily', side_effect=metrics_pb2.MetricFamily) as metric_family:
+        check.process(endpoint, instance=None)
+
+    assert metric_family.call_count == 1
+    batched_gauge.assert_called_with('prometheus.process.vm.bytes', 39211008.0, [], hostname=None)
+
+
 def test_process_send_histograms_buckets(bin_data, mocked_prometheus_check, ref_gauge):
     """ Checks that the send_histograms_buckets parameter is passed along """
     endpoint = "http://fake.endpoint:10055/metrics"
@@ -353,6 +408,22 @@ def test_poll_text_plain(mocked_prometheus_check, text_data):
         assert messages[-1].name == 'skydns_skydns_dns_response_size_bytes'
 
 
+def test_poll_persist_connections(mocked_prometheus_check, bin_data):
+    """Tests poll through a persistent session"""
+    check = mocked_prometheus_check
+    check.persist_connections = True
+    check.connection_pool_size = 2
+    mock_response = mock.MagicMock(status_code=200, content=bin_data, headers={'Content-Type': protobuf_content_type})
+    with mock.patch('requests.Session.get', return_value=mock_response) as get:
+        check.poll("http://fake.endpoint:10055/metrics")
+        session = check._session.session
+        check.poll("http://fake.endpoint:10055/metrics")
+
+    assert get.call_count == 2
+    assert check._session.session is session
+    assert session.adapters['http://']._pool_maxsize == 2
+
+
 def test_submit_gauge_with_labels(mocked_prometheus_check, ref_gauge):
     """ submitting metrics that contain labels should result in tags on the gauge call """
     _l1 = ref_gauge.metric[0].label.add()
@@ -1258,7 +1329,7 @@ def test_parse_one_summary_with_none_values(p_check):
     assert expected_etcd_metric.__repr__() == current_metric.__repr__()
 
 
-def test_label_joins(sorted_tags_check):
+def test_label_joins(sorted_tags_check, batched_gauge):
     """ Tests label join on text format """
     text_data = None
     f_name = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', 'ksm.txt')
@@ -1288,14 +1359,13 @@ def test_label_joins(sorted_tags_check):
             'kube_deployment_status_replicas': 'deploy.replicas.available',
         }
 
-        check.gauge = mock.MagicMock()
         # dry run to build mapping
         check.process("http://fake.endpoint:10055/metrics")
         # run with submit
         check.process("http://fake.endpoint:10055/metrics")
 
         # check a bunch of metrics
-        check.gauge.assert_has_calls(
+        batched_gauge.assert_has_calls(
             [
                 mock.call(
                     'ksm.pod.ready',
@@ -1608,7 +1678,7 @@ def test_label_joins(sorted_tags_check):
         )
 
 
-def test_label_joins_gc(sorted_tags_check):
+def test_label_joins_gc(sorted_tags_check, batched_gauge):
     """ Tests label join GC on text format """
     text_data = None
     f_name = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', 'ksm.txt')
@@ -1622,13 +1692,12 @@ def test_label_joins_gc(sorted_tags_check):
         check.NAMESPACE = 'ksm'
         check.label_joins = {'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node', 'pod_ip']}}
         check.metrics_mapper = {'kube_pod_status_ready': 'pod.ready'}
-        check.gauge = mock.MagicMock()
         # dry run to build mapping
         check.process("http://fake.endpoint:10055/metrics")
         # run with submit
         check.process("http://fake.endpoint:10055/metrics")
         # check a bunch of metrics
-        check.gauge.assert_has_calls(
+        batched_gauge.assert_has_calls(
             [
                 mock.call(
                     'ksm.pod.ready',
@@ -1674,7 +1743,7 @@ def test_label_joins_gc(sorted_tags_check):
         assert 15 == len(check._label_mapping['pod'])
 
 
-def test_label_joins_missconfigured(sorted_tags_check):
+def test_label_joins_missconfigured(sorted_tags_check, batched_gauge):
     """ Tests label join missconfigured label is ignored """
     text_data = None
     f_name = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', 'ksm.txt')
@@ -1688,13 +1757,12 @@ def test_label_joins_missconfigured(sorted_tags_check):
         check.NAMESPACE = 'ksm'
         check.label_joins = {'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node', 'not_existing']}}
         check.metrics_mapper = {'kube_pod_status_ready': 'pod.ready'}
-        check.gauge = mock.MagicMock()
         # dry run to build mapping
         check.process("http://fake.endpoint:10055/metrics")
         # run with submit
         check.process("http://fake.endpoint:10055/metrics")
         # check a bunch of metrics
-        check.gauge.assert_has_calls(
+        batched_gauge.assert_has_calls(
             [
                 mock.call(
                     'ksm.pod.ready',
@@ -1727,7 +1795,7 @@ def test_label_joins_missconfigured(sorted_tags_check):
         )
 
 
-def test_label_join_not_existing(sorted_tags_check):
+def test_label_join_not_existing(sorted_tags_check, batched_gauge):
     """ Tests label join on non existing matching label is ignored """
     text_data = None
     f_name = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', 'ksm.txt')
@@ -1741,13 +1809,12 @@ def test_label_join_not_existing(sorted_tags_check):
         check.NAMESPACE = 'ksm'
         check.label_joins = {'kube_pod_info': {'label_to_match': 'not_existing', 'labels_to_get': ['node', 'pod_ip']}}
         check.metrics_mapper = {'kube_pod_status_ready': 'pod.ready'}
-        check.gauge = mock.MagicMock()
         # dry run to build mapping
         check.process("http://fake.endpoint:10055/metrics")
         # run with submit
         check.process("http://fake.endpoint:10055/metrics")
         # check a bunch of metrics
-        check.gauge.assert_has_calls(
+        batched_gauge.assert_has_calls(
             [
                 mock.call(
                     'ksm.pod.ready',
@@ -1766,7 +1833,7 @@ def test_label_join_not_existing(sorted_tags_check):
         )
 
 
-def test_label_join_metric_not_existing(sorted_tags_check):
+def test_label_join_metric_not_existing(sorted_tags_check, batched_gauge):
     """ Tests label join on non existing metric is ignored """
     text_data = None
     f_name = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', 'ksm.txt')
@@ -1780,13 +1847,12 @@ def test_label_join_metric_not_existing(sorted_tags_check):
         check.NAMESPACE = 'ksm'
         check.label_joins = {'not_existing': {'label_to_match': 'pod', 'labels_to_get': ['node', 'pod_ip']}}
         check.metrics_mapper = {'kube_pod_status_ready': 'pod.ready'}
-        check.gauge = mock.MagicMock()
         # dry run to build mapping
         check.process("http://fake.endpoint:10055/metrics")
         # run with submit
         check.process("http://fake.endpoint:10055/metrics")
         # check a bunch of metrics
-        check.gauge.assert_has_calls(
+        batched_gauge.assert_has_calls(
             [
                 mock.call(
                     'ksm.pod.ready',
@@ -1805,7 +1871,7 @@ def test_label_join_metric_not_existing(sorted_tags_check):
         )
 
 
-def test_label_join_with_hostname(sorted_tags_check):
+def test_label_join_with_hostname(sorted_tags_check, batched_gauge):
     """ Tests label join and hostname override on a metric """
     text_data = None
     f_name = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', 'ksm.txt')
@@ -1820,13 +1886,12 @@ def test_label_join_with_hostname(sorted_tags_check):
         check.label_joins = {'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node']}}
         check.label_to_hostname = 'node'
         check.metrics_mapper = {'kube_pod_status_ready': 'pod.ready'}
-        check.gauge = mock.MagicMock()
         # dry run to build mapping
         check.process("http://fake.endpoint:10055/metrics")
         # run with submit
         check.process("http://fake.endpoint:10055/metrics")
         # check a bunch of metrics
-        check.gauge.assert_has_calls(
+        batched_gauge.assert_has_calls(
             [
                 mock.call(
                     'ksm.pod.ready',
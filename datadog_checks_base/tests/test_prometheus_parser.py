@@ -0,0 +1,95 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import os
+
+import pytest
+from prometheus_client import parser
+
+from datadog_checks.base.utils.prometheus.parser import filter_metric_families, text_fd_to_metric_families
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus')
+
+
+def read_lines(file_name):
+    with open(os.path.join(FIXTURES, file_name), 'r') as f:
+        return f.read().split('\n')
+
+
+@pytest.mark.parametrize('file_name', ['metrics.txt', 'ksm.txt'])
+def test_same_output_as_prometheus_client(file_name):
+    lines = read_lines(file_name)
+
+    expected = list(parser.text_fd_to_metric_families(lines))
+    # NaN values are not equal to themselves, compare the representations
+    assert repr(list(text_fd_to_metric_families(lines))) == repr(expected)
+
+
+def test_labels():
+    lines = [
+        '# TYPE foo gauge',
+        'foo{a="b",c = "d e" , f="g\\"h\\\\i\\nj"} 42 1542376800',
+        'foo 43',
+        'untyped_metric{a="b"} +Inf',
+    ]
+
+    expected = list(parser.text_fd_to_metric_families(lines))
+    families = list(text_fd_to_metric_families(lines))
+
+    assert families == expected
+    assert families[0].samples == [
+        ('foo', {'a': 'b', 'c': 'd e', 'f': 'g"h\\i\nj'}, 42.0),
+        ('foo', {}, 43.0),
+    ]
+    assert families[1].type == 'untyped'
+
+
+def test_label_values_whitespace():
+    text = '# TYPE foo gauge\nfoo{a=" b ",c="\\"d\\" "} 1\n'
+    families = list(text_fd_to_metric_families(text.split('\n')))
+
+    # Like the pinned prometheus_client, label values are stripped
+    assert families[0].samples[0][1] == {'a': 'b', 'c': '"d"'}
+
+
+def test_family_filter():
+    lines = read_lines('ksm.txt')
+    wanted = {'kube_pod_info', 'kube_node_info'}
+    seen = []
+
+    def family_filter(name):
+        seen.append(name)
+        return name in wanted
+
+    families = list(text_fd_to_metric_families(lines, family_filter=family_filter))
+    expected = [m for m in parser.text_fd_to_metric_families(lines) if m.name in wanted]
+
+    assert families == expected
+    assert len(seen) == len(set(seen)) > len(wanted)
+
+
+def test_filter_metric_families():
+    lines = [
+        '# HELP foo_seconds A histogram.',
+        '# TYPE foo_seconds histogram',
+        'foo_seconds_bucket{le="1"} 1',
+        'foo_seconds_bucket{le="+Inf"} 2',
+        'foo_seconds_sum 3',
+        'foo_seconds_count 2',
+        '# TYPE bar gauge',
+        'bar{a="b"} 1',
+        'foo_seconds_untyped 4',
+        '',
+    ]
+
+    assert list(filter_metric_families(lines, lambda name: name != 'foo_seconds')) == [
+        '# TYPE bar gauge',
+        'bar{a="b"} 1',
+        'foo_seconds_untyped 4',
+    ]
+    assert list(filter_metric_families(lines, lambda name: name == 'foo_seconds')) == lines[:6]
+
+
+def test_invalid_sample():
+    with pytest.raises(ValueError):
+        list(text_fd_to_metric_families(['foo{a="b"}']))
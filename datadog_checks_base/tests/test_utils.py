@@ -2,8 +2,12 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 
+import mock
+
 from datadog_checks.utils.common import pattern_filter
 from datadog_checks.utils.limiter import Limiter
+from datadog_checks.base.utils.http import PersistentSession
+from datadog_checks.base.utils.tags import TagSet, TagSetCache
 
 
 class Item:
@@ -105,3 +109,69 @@ class TestLimiter():
         assert limiter.get_status() == (0, 10, False)
         assert limiter.is_reached("dummy1") is False
         assert limiter.get_status() == (1, 10, False)
+
+
+class TestTagSetCache():
+    def test_intern(self):
+        cache = TagSetCache(10)
+        tag_set = cache.intern(['foo:bar', 'bar:baz'])
+
+        assert isinstance(tag_set, TagSet)
+        assert list(tag_set) == ['foo:bar', 'bar:baz']
+        assert cache.intern(['foo:bar', 'bar:baz']) is tag_set
+        assert cache.intern(tag_set) is tag_set
+        assert cache.get_status() == (1, 1, 1)
+
+    def test_lru_eviction(self):
+        cache = TagSetCache(2)
+        first = cache.intern(['tag:1'])
+        cache.intern(['tag:2'])
+        # Use the first set again so that the second one is the least recently used
+        cache.intern(['tag:1'])
+        cache.intern(['tag:3'])
+
+        assert len(cache) == 2
+        assert cache.intern(['tag:1']) is first
+        hits, misses, _ = cache.get_status()
+        cache.intern(['tag:2'])
+        assert cache.get_status() == (hits, misses + 1, 2)
+
+    def test_disabled(self):
+        cache = TagSetCache(0)
+        tag_set = cache.intern(['foo:bar'])
+
+        assert cache.intern(['foo:bar']) == tag_set
+        assert len(cache) == 0
+
+
+class TestPersistentSession():
+    def test_session_reused(self):
+        persistent = PersistentSession(pool_size=2)
+        with mock.patch('requests.Session.get') as get:
+            persistent.get('http://localhost/metrics', verify=False, timeout=5)
+            session = persistent.session
+            persistent.get('http://localhost/metrics', verify=False, timeout=5)
+
+        assert persistent.session is session
+        assert session.verify is False
+        assert session.adapters['http://']._pool_maxsize == 2
+        get.assert_called_with('http://localhost/metrics', timeout=5)
+
+    def test_session_rebuilt_on_settings_change(self):
+        persistent = PersistentSession()
+        with mock.patch('requests.Session.get'):
+            persistent.get('http://localhost/metrics', auth=('user', 'pass'))
+            session = persistent.session
+            persistent.get('http://localhost/metrics', auth=('user', 'other'))
+
+        assert persistent.session is not session
+        assert persistent.session.auth == ('user', 'other')
+
+    def test_close(self):
+        persistent = PersistentSession()
+        with mock.patch('requests.Session.get'):
+            persistent.get('http://localhost/metrics')
+
+        persistent.close()
+        assert persistent.session is None
+        assert persistent.get_connection_stats() == (0, 0)
@@ -15,7 +15,7 @@ import logging
 import requests
 
 # check
-from .common import tags_for_docker, tags_for_pod, is_static_pending_pod, get_pod_by_uid
+from .common import tags_for_docker, tags_for_pod
 from tagger import get_tags
 
 NAMESPACE = "kubernetes"
@@ -157,8 +157,8 @@ class CadvisorScraper(object):
 
         # FIXME we are forced to do that because the Kubelet PodList isn't updated
         # for static pods, see https://github.com/kubernetes/kubernetes/pull/59948
-        pod = get_pod_by_uid(pod_uid, pod_list)
-        if pod is not None and is_static_pending_pod(pod):
+        pod = pod_list_utils.get_pod_by_uid(pod_uid)
+        if pod_list_utils.is_static_pending_pod(pod_uid):
             in_static_pod = True
 
         # Let's see who we have here
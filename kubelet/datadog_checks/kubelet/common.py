@@ -78,15 +78,21 @@ class PodListUtils(object):
     send metrics for a given container.
     Results and podlist are cached between calls to avoid the repeated python-go switching
     cost (filter called once per prometheus metric), hence the PodListUtils object MUST
-    be re-created at every check run.
+    be re-created at every check run, or at least have its tags cache cleared if the
+    podlist didn't change (see `PodListCache`).
+
+    The podlist is indexed once by pod uid, container id and name tuples, so that the
+    lookups done for every prometheus sample don't have to walk it.
 
     Containers that are part of a static pod are not filtered, as we cannot curently
     reliably determine their image name to pass to the filtering logic.
     """
     def __init__(self, podlist):
+        self.pods = {}
         self.containers = {}
         self.static_pod_uids = set()
         self.cache = {}
+        self.tags_cache = {}
         self.pod_uid_by_name_tuple = {}
         self.container_id_by_name_tuple = {}
 
@@ -101,6 +107,8 @@ class PodListUtils(object):
             namespace = metadata.get("namespace")
             pod_name = metadata.get("name")
             self.pod_uid_by_name_tuple[(namespace, pod_name)] = uid
+            if uid is not None and uid not in self.pods:
+                self.pods[uid] = pod
 
             # FIXME we are forced to do that because the Kubelet PodList isn't updated
             # for static pods, see https://github.com/kubernetes/kubernetes/pull/59948
@@ -133,6 +141,71 @@ class PodListUtils(object):
         """
         return self.container_id_by_name_tuple.get(name_tuple, None)
 
+    def get_pod_by_uid(self, uid):
+        """
+        Get a pod from its uid
+
+        :param uid: pod uid
+        :return: pod dict object or None
+        """
+        return self.pods.get(uid, None)
+
+    def get_container_status(self, cid):
+        """
+        Get the status of a container from its id (with runtime scheme)
+
+        :param cid: container id
+        :return: container status dict object or None
+        """
+        return self.containers.get(cid, None)
+
+    def is_static_pending_pod(self, uid):
+        """
+        Return if the pod is a static pending pod, see `is_static_pending_pod`
+
+        :param uid: pod uid
+        :return: bool
+        """
+        return uid is not None and uid in self.static_pod_uids
+
+    def is_pod_host_networked(self, uid):
+        """
+        Return if the pod is on host Network
+        Return False if the Pod isn't in the pod list
+
+        :param uid: pod uid
+        :return: bool
+        """
+        pod = self.pods.get(uid)
+        if pod is None:
+            return False
+        return pod.get('spec', {}).get('hostNetwork', False)
+
+    def get_tags(self, entity, high_card):
+        """
+        Queries the tagger for an entity, e.g. a container id with runtime scheme or a
+        `kubernetes_pod://` pod uid.
+
+        Result is cached between calls to avoid the python-go switching cost for
+        prometheus metrics (will be called once per metric). A new list is returned
+        on every call, so it can be extended by the caller.
+        :param entity: tagger entity id
+        :param high_card: whether to include the high cardinality tags
+        :return: string array, empty if the entity is not found
+        """
+        key = (entity, high_card)
+        tags = self.tags_cache.get(key)
+        if tags is None:
+            tags = self.tags_cache[key] = tuple(get_tags(entity, high_card) or ())
+        return list(tags)
+
+    def clear_tags_cache(self):
+        """
+        Drop the tagger results cached so far, to be called when the object is reused
+        for another check run
+        """
+        self.tags_cache = {}
+
     def is_excluded(self, cid, pod_uid=None):
         """
         Queries the agent6 container filter interface. It retrieves container
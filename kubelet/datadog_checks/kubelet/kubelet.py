@@ -15,6 +15,7 @@ import requests
 # project
 from datadog_checks.checks import AgentCheck
 from datadog_checks.checks.openmetrics import OpenMetricsBaseCheck
+from datadog_checks.config import is_affirmative
 from datadog_checks.errors import CheckException
 from kubeutil import get_connection_info
 from tagger import get_tags
@@ -23,6 +24,7 @@ from tagger import get_tags
 from .common import CADVISOR_DEFAULT_PORT, PodListUtils, KubeletCredentials
 from .cadvisor import CadvisorScraper
 from .prometheus import CadvisorPrometheusScraperMixin
+from .podlist import CHUNK_SIZE, DEFAULT_CACHE_MAX_AGE, PodListCache, load_pod_list
 
 KUBELET_HEALTH_PATH = '/healthz'
 NODE_SPEC_PATH = '/spec'
@@ -80,6 +82,10 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
         self.cadvisor_legacy_port = inst.get('cadvisor_port', CADVISOR_DEFAULT_PORT)
         self.cadvisor_legacy_url = None
 
+        pod_list_cache_max_age = float(inst.get('pod_list_cache_max_age', DEFAULT_CACHE_MAX_AGE))
+        self.pod_list_cache = PodListCache(pod_list_cache_max_age) if pod_list_cache_max_age > 0 else None
+        self.debug_metrics = is_affirmative(inst.get('debug_metrics', False))
+
         self.cadvisor_scraper_config = self.get_scraper_config(cadvisor_instance)
         # Filter out system slices (empty pod name) to reduce memory footprint
         self.cadvisor_scraper_config['_text_filter_blacklist'] = ['pod_name=""']
@@ -162,7 +168,13 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
             self.log.debug('cAdvisor not found, running in prometheus mode: %s' % str(e))
 
         self.pod_list = self.retrieve_pod_list()
-        self.pod_list_utils = PodListUtils(self.pod_list)
+        if self.pod_list_cache is not None:
+            self.pod_list_utils = self.pod_list_cache.get_pod_list_utils(self.pod_list)
+            if self.debug_metrics:
+                self.gauge(self.NAMESPACE + '.pod_list.cache.hit_rate', self.pod_list_cache.hit_rate,
+                           self.instance_tags)
+        else:
+            self.pod_list_utils = PodListUtils(self.pod_list)
 
         self._report_node_metrics(self.instance_tags)
         self._report_pods_running(self.pod_list, self.instance_tags)
@@ -179,6 +191,7 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
             )
         elif self.cadvisor_scraper_config['prometheus_url']:  # Prometheus
             self.log.debug('processing cadvisor metrics')
+            self.reset_cgroup_identities()
             self.process(
                 self.cadvisor_scraper_config,
                 metric_transformers=self.CADVISOR_METRIC_TRANSFORMERS
@@ -190,11 +203,12 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
                 self.kubelet_scraper_config
             )
 
-        # Free up memory
+        # Free up memory, the podlist is kept by the cache if enabled
         self.pod_list = None
         self.pod_list_utils = None
+        self.reset_cgroup_identities()
 
-    def perform_kubelet_query(self, url, verbose=True, timeout=10):
+    def perform_kubelet_query(self, url, verbose=True, timeout=10, stream=False):
         """
         Perform and return a GET request against kubelet. Support auth and TLS validation.
         """
@@ -204,12 +218,28 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
             verify=self.kubelet_credentials.verify(),
             cert=self.kubelet_credentials.cert_pair(),
             headers=self.kubelet_credentials.headers(url),
-            params={'verbose': verbose}
+            params={'verbose': verbose},
+            stream=stream
         )
 
     def retrieve_pod_list(self):
+        """
+        Retrieve the podlist from the kubelet. It is decoded while it is downloaded, only
+        keeping the fields of the pods used by the check, see `podlist.POD_FIELDS`.
+        The indexes of the last podlist are reused if it didn't change, see `podlist.PodListCache`.
+        """
         try:
-            pod_list = self.perform_kubelet_query(self.pod_list_url).json()
+            response = self.perform_kubelet_query(self.pod_list_url, stream=True)
+            try:
+                response.raise_for_status()
+                chunks = response.iter_content(chunk_size=CHUNK_SIZE)
+                if self.pod_list_cache is not None:
+                    pod_list = self.pod_list_cache.load(chunks)
+                else:
+                    pod_list = load_pod_list(chunks)
+            finally:
+                response.close()
+
             if pod_list.get("items") is None:
                 # Sanitize input: if no pod are running, 'items' is a NoneObject
                 pod_list['items'] = []
@@ -0,0 +1,279 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+import codecs
+import hashlib
+import json
+import time
+
+from .common import PodListUtils
+
+# Size of the chunks read from the kubelet response
+CHUNK_SIZE = 64 * 1024
+
+# Maximum age in seconds of the cached podlist, see `PodListCache`
+DEFAULT_CACHE_MAX_AGE = 60
+
+# Fields of the pods used by the check and PodListUtils, the other fields are dropped
+# while the podlist is being read. `True` keeps the whole value, a dict keeps the given
+# keys of an object, or of each object of a list.
+POD_FIELDS = {
+    'metadata': {
+        'uid': True,
+        'name': True,
+        'namespace': True,
+        'ownerReferences': True,
+        'annotations': {
+            'kubernetes.io/config.source': True,
+        },
+    },
+    'spec': {
+        'hostNetwork': True,
+        'containers': {
+            'name': True,
+            'resources': True,
+        },
+    },
+    'status': {
+        'phase': True,
+        'containerStatuses': True,
+    },
+}
+
+WHITESPACE = ' \t\n\r'
+
+
+def project(value, fields):
+    """
+    Keep only the given fields of a decoded JSON value, see `POD_FIELDS`
+    :param value: decoded JSON value
+    :param fields: `True` or dict of the fields to keep
+    :return: projected value
+    """
+    if fields is True:
+        return value
+    if isinstance(value, dict):
+        return {key: project(value[key], sub_fields) for key, sub_fields in fields.iteritems() if key in value}
+    if isinstance(value, list):
+        return [project(item, fields) for item in value]
+    return value
+
+
+def load_pod_list(chunks, pod_fields=POD_FIELDS):
+    """
+    Decode a podlist incrementally from an iterable of utf-8 encoded chunks, e.g.
+    `requests.Response.iter_content()`. The pods are decoded one at a time and projected
+    on `pod_fields` right away, so that the full podlist is never held in memory.
+    :param chunks: iterable of bytes
+    :param pod_fields: fields of the pods to keep, `None` to keep them all
+    :return: podlist dict object
+    """
+    reader = _JSONReader(chunks)
+    pod_list = {}
+
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.next_char()
+    else:
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key == 'items' and reader.peek() == '[':
+                pod_list[key] = _load_items(reader, pod_fields)
+            else:
+                pod_list[key] = reader.value()
+
+            char = reader.next_char()
+            if char == '}':
+                break
+            if char != ',':
+                raise ValueError('Expecting , or }} in the podlist, got {!r}'.format(char))
+
+    if reader.peek() is not None:
+        raise ValueError('Extra data after the podlist')
+
+    return pod_list
+
+
+def _load_items(reader, pod_fields):
+    items = []
+
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.next_char()
+        return items
+
+    while True:
+        pod = reader.value()
+        if pod_fields is not None:
+            pod = project(pod, pod_fields)
+        items.append(pod)
+
+        char = reader.next_char()
+        if char == ']':
+            return items
+        if char != ',':
+            raise ValueError('Expecting , or ] in the podlist items, got {!r}'.format(char))
+
+
+class PodListCache(object):
+    """
+    PodListCache keeps the last podlist retrieved from the kubelet along with its PodListUtils,
+    keyed by the hash of the response body. When the kubelet returns the same podlist again,
+    the cached podlist is returned and the indexes of its PodListUtils are reused.
+
+    The kubelet doesn't set the resourceVersion of the podlist, hence the hash. The chunks are
+    hashed as they are decoded so that the body is never held in memory, which means that the
+    response is still downloaded and decoded every time: the cache only saves rebuilding the
+    PodListUtils indexes, not the parsing. The cached podlist is replaced once it's older than
+    `max_age` seconds, even if it didn't change.
+    """
+    def __init__(self, max_age=DEFAULT_CACHE_MAX_AGE):
+        self.max_age = max_age
+        self.digest = None
+        self.timestamp = None
+        self.pod_list = None
+        self.pod_list_utils = None
+
+        self.hits = 0
+        self.lookups = 0
+
+    @property
+    def hit_rate(self):
+        if not self.lookups:
+            return 0.0
+        return float(self.hits) / self.lookups
+
+    def load(self, chunks, pod_fields=POD_FIELDS):
+        """
+        Return the podlist read from an iterable of chunks, the cached one if it didn't change.
+        The chunks are always decoded, the decoded podlist is dropped on a cache hit.
+        :param chunks: iterable of bytes
+        :param pod_fields: see `load_pod_list`
+        :return: podlist dict object
+        """
+        body_hash = hashlib.sha256()
+
+        def hashed(chunks):
+            for chunk in chunks:
+                body_hash.update(chunk)
+                yield chunk
+
+        hashed_chunks = hashed(chunks)
+        pod_list = load_pod_list(hashed_chunks, pod_fields)
+        # Hash whatever follows the podlist too
+        for _ in hashed_chunks:
+            pass
+        digest = body_hash.digest()
+
+        now = time.time()
+        self.lookups += 1
+        if self.pod_list is not None and digest == self.digest and now - self.timestamp < self.max_age:
+            self.hits += 1
+            return self.pod_list
+
+        self.digest = digest
+        self.timestamp = now
+        self.pod_list = pod_list
+        self.pod_list_utils = None
+        return pod_list
+
+    def get_pod_list_utils(self, pod_list):
+        """
+        Return the PodListUtils of a podlist, the cached one for the cached podlist
+        :param pod_list: podlist dict object
+        :return: PodListUtils
+        """
+        if pod_list is None or pod_list is not self.pod_list:
+            return PodListUtils(pod_list)
+
+        if self.pod_list_utils is None:
+            self.pod_list_utils = PodListUtils(pod_list)
+        else:
+            # The tags of the containers may change even if the podlist didn't
+            self.pod_list_utils.clear_tags_cache()
+        return self.pod_list_utils
+
+
+class _JSONReader(object):
+    """
+    Reads JSON values one at a time from an iterable of chunks, only buffering the value
+    being decoded
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buf = u''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """
+        Append the next chunk to the buffer, return False at the end of the stream
+        """
+        if self._eof:
+            return False
+
+        text = u''
+        for chunk in self._chunks:
+            text = self._text_decoder.decode(chunk)
+            if text:
+                break
+        else:
+            text = self._text_decoder.decode(b'', final=True)
+            self._eof = True
+
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return bool(text) or not self._eof
+
+    def peek(self):
+        """
+        Return the next non-whitespace character without consuming it, None at the end of the stream
+        """
+        while True:
+            buf = self._buf
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return None
+
+    def next_char(self):
+        char = self.peek()
+        if char is not None:
+            self._pos += 1
+        return char
+
+    def expect(self, expected):
+        char = self.next_char()
+        if char != expected:
+            raise ValueError('Expecting {!r} in the podlist, got {!r}'.format(expected, char))
+
+    def value(self):
+        """
+        Decode the next JSON value, reading more chunks until it's complete
+        """
+        if self.peek() is None:
+            raise ValueError('Unexpected end of the podlist')
+
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+
+            # A number or literal ending the buffer may continue in the next chunk
+            if end == len(self._buf) and not self._eof:
+                self._fill()
+                continue
+
+            self._pos = end
+            return value
@@ -5,10 +5,6 @@
 # project
 from copy import deepcopy
 from datadog_checks.checks.openmetrics import OpenMetricsBaseCheck
-from tagger import get_tags
-
-# check
-from .common import is_static_pending_pod, get_pod_by_uid
 
 METRIC_TYPES = ['counter', 'gauge', 'summary']
 
@@ -16,6 +12,30 @@ METRIC_TYPES = ['counter', 'gauge', 'summary']
 CONTAINER_LABELS = ['container_name', 'namespace', 'pod_name', 'name', 'image', 'id']
 
 
+class CgroupIdentity(object):
+    """
+    Container and pod a cgroup is about, as resolved from the labels of its cAdvisor samples,
+    along with the results of the exclusion and tagger queries for them.
+    """
+    __slots__ = (
+        'is_container', 'is_pod', 'container_id', 'pod_uid', 'excluded', 'tags', 'static_pod_tags', 'pod_tags',
+    )
+
+    def __init__(self):
+        self.is_container = False
+        self.is_pod = False
+        self.container_id = None
+        self.pod_uid = None
+        # only relevant for container cgroups
+        self.excluded = True
+        # tagger tags of the container
+        self.tags = None
+        # extra tags of the containers of static pods, see `is_static_pending_pod`
+        self.static_pod_tags = None
+        # tagger tags of the pod, for pod cgroups
+        self.pod_tags = None
+
+
 class CadvisorPrometheusScraperMixin(object):
     """
     This class scrapes metrics for the kubelet "/metrics/cadvisor" prometheus endpoint and submits
@@ -30,6 +50,10 @@ class CadvisorPrometheusScraperMixin(object):
         self.fs_usage_bytes = {}
         self.mem_usage_bytes = {}
 
+        # cgroup path (`id` label) -> CgroupIdentity, shared by all the transformers
+        # of a run, see `reset_cgroup_identities`
+        self.cgroup_identities = {}
+
         self.CADVISOR_METRIC_TRANSFORMERS = {
             'container_cpu_usage_seconds_total': self.container_cpu_usage_seconds_total,
             'container_cpu_load_average_10s': self.container_cpu_load_average_10s,
@@ -92,6 +116,67 @@ class CadvisorPrometheusScraperMixin(object):
         })
         return cadvisor_instance
 
+    def reset_cgroup_identities(self):
+        """
+        Drop the cgroup identities resolved so far, to be called before processing a new payload
+        as they depend on the podlist and the tagger
+        """
+        self.cgroup_identities = {}
+
+    def _get_cgroup_identity(self, labels):
+        """
+        Return the identity of the cgroup a sample is about. All the samples of a cgroup share
+        the same identity labels, so it is resolved once per `id` label and per run.
+        :param labels: sample labels
+        :return: CgroupIdentity
+        """
+        cgroup = labels.get('id')
+        if cgroup is not None:
+            identity = self.cgroup_identities.get(cgroup)
+            if identity is not None:
+                return identity
+
+        identity = self._resolve_cgroup_identity(labels)
+        if cgroup is not None:
+            self.cgroup_identities[cgroup] = identity
+        return identity
+
+    def _resolve_cgroup_identity(self, labels):
+        identity = CgroupIdentity()
+        identity.is_container = self._is_container_metric(labels)
+        identity.is_pod = self._is_pod_metric(labels)
+        identity.pod_uid = self._get_pod_uid(labels)
+
+        if identity.is_container:
+            identity.container_id = self._get_container_id(labels)
+            identity.excluded = self.pod_list_utils.is_excluded(identity.container_id, identity.pod_uid)
+            if not identity.excluded:
+                identity.tags = self.pod_list_utils.get_tags(identity.container_id, True)
+
+                # FIXME we are forced to do that because the Kubelet PodList isn't updated
+                # for static pods, see https://github.com/kubernetes/kubernetes/pull/59948
+                if self.pod_list_utils.is_static_pending_pod(identity.pod_uid):
+                    identity.static_pod_tags = self.pod_list_utils.get_tags(
+                        'kubernetes_pod://%s' % identity.pod_uid, True)
+                    identity.static_pod_tags += self._get_kube_container_name(labels)
+
+        if identity.is_pod and identity.pod_uid:
+            identity.pod_tags = self.pod_list_utils.get_tags('kubernetes_pod://%s' % identity.pod_uid, True)
+
+        return identity
+
+    def _get_container_tags(self, identity, scraper_config, static_pod_tags=True):
+        """
+        Return the tags of a container cgroup, including the custom tags of the instance
+        :param identity: CgroupIdentity
+        :param static_pod_tags: whether to add the pod tags to the containers of static pods
+        :return: list
+        """
+        tags = identity.tags + scraper_config['custom_tags']
+        if static_pod_tags and identity.static_pod_tags is not None:
+            tags = list(set(tags + identity.static_pod_tags))
+        return tags
+
     @staticmethod
     def _is_container_metric(labels):
         """
@@ -167,8 +252,9 @@ class CadvisorPrometheusScraperMixin(object):
         :param labels
         :return str or None
         """
-        if CadvisorPrometheusScraperMixin._is_container_metric(labels):
-            return self._get_container_id(labels)
+        identity = self._get_cgroup_identity(labels)
+        if identity.is_container:
+            return identity.container_id
 
     def _get_pod_uid(self, labels):
         """
@@ -187,8 +273,9 @@ class CadvisorPrometheusScraperMixin(object):
         :param labels
         :return str or None
         """
-        if CadvisorPrometheusScraperMixin._is_pod_metric(labels):
-            return self._get_pod_uid(labels)
+        identity = self._get_cgroup_identity(labels)
+        if identity.is_pod:
+            return identity.pod_uid
 
     def _is_pod_host_networked(self, pod_uid):
         """
@@ -197,10 +284,7 @@ class CadvisorPrometheusScraperMixin(object):
         :param pod_uid: str
         :return: bool
         """
-        for pod in self.pod_list['items']:
-            if pod.get('metadata', {}).get('uid', '') == pod_uid:
-                return pod.get('spec', {}).get('hostNetwork', False)
-        return False
+        return self.pod_list_utils.is_pod_host_networked(pod_uid)
 
     def _get_pod_by_metric_label(self, labels):
         """
@@ -208,7 +292,7 @@ class CadvisorPrometheusScraperMixin(object):
         :return:
         """
         pod_uid = self._get_pod_uid(labels)
-        return get_pod_by_uid(pod_uid, self.pod_list)
+        return self.pod_list_utils.get_pod_by_uid(pod_uid)
 
     @staticmethod
     def _get_kube_container_name(labels):
@@ -267,20 +351,11 @@ class CadvisorPrometheusScraperMixin(object):
 
         samples = self._sum_values_by_context(metric, self._get_container_id_if_container_metric)
         for c_id, sample in samples.iteritems():
-            pod_uid = self._get_pod_uid(sample[self.SAMPLE_LABELS])
-            if self.pod_list_utils.is_excluded(c_id, pod_uid):
+            identity = self._get_cgroup_identity(sample[self.SAMPLE_LABELS])
+            if identity.excluded:
                 continue
 
-            tags = get_tags(c_id, True)
-            tags += scraper_config['custom_tags']
-
-            # FIXME we are forced to do that because the Kubelet PodList isn't updated
-            # for static pods, see https://github.com/kubernetes/kubernetes/pull/59948
-            pod = self._get_pod_by_metric_label(sample[self.SAMPLE_LABELS])
-            if pod is not None and is_static_pending_pod(pod):
-                tags += get_tags('kubernetes_pod://%s' % pod["metadata"]["uid"], True)
-                tags += self._get_kube_container_name(sample[self.SAMPLE_LABELS])
-                tags = list(set(tags))
+            tags = self._get_container_tags(identity, scraper_config)
 
             val = sample[self.SAMPLE_VALUE]
 
@@ -302,8 +377,8 @@ class CadvisorPrometheusScraperMixin(object):
         for pod_uid, sample in samples.iteritems():
             if '.network.' in metric_name and self._is_pod_host_networked(pod_uid):
                 continue
-            tags = get_tags('kubernetes_pod://%s' % pod_uid, True)
-            tags += scraper_config['custom_tags']
+            identity = self._get_cgroup_identity(sample[self.SAMPLE_LABELS])
+            tags = identity.pod_tags + scraper_config['custom_tags']
             val = sample[self.SAMPLE_VALUE]
             self.rate(metric_name, val, tags)
 
@@ -321,20 +396,11 @@ class CadvisorPrometheusScraperMixin(object):
             c_name = self._get_container_label(sample[self.SAMPLE_LABELS], 'name')
             if not c_name:
                 continue
-            pod_uid = self._get_pod_uid(sample[self.SAMPLE_LABELS])
-            if self.pod_list_utils.is_excluded(c_id, pod_uid):
+            identity = self._get_cgroup_identity(sample[self.SAMPLE_LABELS])
+            if identity.excluded:
                 continue
 
-            tags = get_tags(c_id, True)
-            tags += scraper_config['custom_tags']
-
-            # FIXME we are forced to do that because the Kubelet PodList isn't updated
-            # for static pods, see https://github.com/kubernetes/kubernetes/pull/59948
-            pod = self._get_pod_by_metric_label(sample[self.SAMPLE_LABELS])
-            if pod is not None and is_static_pending_pod(pod):
-                tags += get_tags('kubernetes_pod://%s' % pod["metadata"]["uid"], True)
-                tags += self._get_kube_container_name(sample[self.SAMPLE_LABELS])
-                tags = list(set(tags))
+            tags = self._get_container_tags(identity, scraper_config)
 
             val = sample[self.SAMPLE_VALUE]
             cache[c_name] = (val, tags)
@@ -355,12 +421,11 @@ class CadvisorPrometheusScraperMixin(object):
         samples = self._sum_values_by_context(metric, self._get_container_id_if_container_metric)
         for c_id, sample in samples.iteritems():
             limit = sample[self.SAMPLE_VALUE]
-            pod_uid = self._get_pod_uid(sample[self.SAMPLE_LABELS])
-            if self.pod_list_utils.is_excluded(c_id, pod_uid):
+            identity = self._get_cgroup_identity(sample[self.SAMPLE_LABELS])
+            if identity.excluded:
                 continue
 
-            tags = get_tags(c_id, True)
-            tags += scraper_config['custom_tags']
+            tags = self._get_container_tags(identity, scraper_config, static_pod_tags=False)
 
             if m_name:
                 self.gauge(m_name, limit, tags)
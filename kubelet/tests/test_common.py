@@ -176,3 +176,36 @@ def test_credentials_token_noverify():
     assert scraper_config['ssl_cert'] is None
     assert scraper_config['ssl_private_key'] is None
     assert scraper_config['extra_headers'] == {}
+
+
+def test_pod_list_utils_indexes():
+    podlist = json.loads(mock_from_file('pods.json'))
+    pod_list_utils = PodListUtils(podlist)
+
+    pod = pod_list_utils.get_pod_by_uid("260c2b1d43b094af6d6b4ccba082c2db")
+    assert pod is get_pod_by_uid("260c2b1d43b094af6d6b4ccba082c2db", podlist)
+    assert pod_list_utils.get_pod_by_uid("unknown") is None
+
+    assert pod_list_utils.is_static_pending_pod("260c2b1d43b094af6d6b4ccba082c2db") is True
+    assert pod_list_utils.is_static_pending_pod("2edfd4d9-10ce-11e8-bd5a-42010af00137") is False
+    assert pod_list_utils.is_static_pending_pod(None) is False
+
+    assert pod_list_utils.is_pod_host_networked("260c2b1d43b094af6d6b4ccba082c2db") is True
+    assert pod_list_utils.is_pod_host_networked("2edfd4d9-10ce-11e8-bd5a-42010af00137") is False
+    assert pod_list_utils.is_pod_host_networked("unknown") is False
+
+    cid = "docker://5741ed2471c0e458b6b95db40ba05d1a5ee168256638a0264f08703e48d76561"
+    assert pod_list_utils.get_container_status(cid)["name"] == "fluentd-gcp"
+    assert pod_list_utils.get_container_status("unknown") is None
+
+
+def test_pod_list_utils_tags_cache():
+    pod_list_utils = PodListUtils(None)
+
+    with mock.patch('datadog_checks.kubelet.common.get_tags', return_value=['foo:bar']) as get_tags:
+        tags = pod_list_utils.get_tags('docker://abc', True)
+        tags.append('extra:tag')
+        assert pod_list_utils.get_tags('docker://abc', True) == ['foo:bar']
+        assert pod_list_utils.get_tags('docker://abc', False) == ['foo:bar']
+
+    assert get_tags.call_count == 2
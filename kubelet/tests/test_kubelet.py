@@ -8,6 +8,7 @@ import sys
 import mock
 import pytest
 from datadog_checks.kubelet import KubeletCheck, KubeletCredentials
+from datadog_checks.kubelet.podlist import POD_FIELDS, project
 
 # Skip the whole tests module on Windows
 pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='tests for linux only')
@@ -197,7 +198,7 @@ def test_prometheus_cpu_summed(monkeypatch, aggregator):
     check = mock_kubelet_check(monkeypatch, [{}])
     monkeypatch.setattr(check, 'rate', mock.Mock())
 
-    with mock.patch("datadog_checks.kubelet.prometheus.get_tags", side_effect=mocked_get_tags):
+    with mock.patch("datadog_checks.kubelet.common.get_tags", side_effect=mocked_get_tags):
         check.check({"cadvisor_metrics_endpoint": "http://dummy/metrics/cadvisor", "kubelet_metrics_endpoint": ""})
 
     # Make sure we submit the summed rates correctly for containers:
@@ -232,7 +233,7 @@ def test_prometheus_net_summed(monkeypatch, aggregator):
     check = mock_kubelet_check(monkeypatch, [{}])
     monkeypatch.setattr(check, 'rate', mock.Mock())
 
-    with mock.patch("datadog_checks.kubelet.prometheus.get_tags", side_effect=mocked_get_tags):
+    with mock.patch("datadog_checks.kubelet.common.get_tags", side_effect=mocked_get_tags):
         check.check({"cadvisor_metrics_endpoint": "http://dummy/metrics/cadvisor", "kubelet_metrics_endpoint": ""})
 
     # Make sure we submit the summed rates correctly for pods:
@@ -492,7 +493,7 @@ def test_perform_kubelet_check(monkeypatch):
 
     get.assert_has_calls([
         mock.call('http://127.0.0.1:10255/healthz', cert=None, headers=None, params={'verbose': True}, timeout=10,
-                  verify=None)])
+                  verify=None, stream=False)])
     calls = [mock.call('kubernetes.kubelet.check', 0, tags=instance_tags)]
     check.service_check.assert_has_calls(calls)
 
@@ -514,8 +515,15 @@ def test_retrieve_pod_list_success(monkeypatch):
         def __init__(self, json_data):
             self.json_data = json_data
 
-        def json(self):
-            return (json.loads(self.json_data))
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            for i in range(0, len(self.json_data), chunk_size):
+                yield self.json_data[i:i + chunk_size]
+
+        def close(self):
+            pass
 
     check = KubeletCheck('kubelet', None, {}, [{}])
     check.pod_list_url = "dummyurl"
@@ -524,6 +532,7 @@ def test_retrieve_pod_list_success(monkeypatch):
 
     retrieved = check.retrieve_pod_list()
     expected = json.loads(mock_from_file("pod_list_raw.json"))
+    expected['items'] = [project(pod, POD_FIELDS) for pod in expected['items']]
     assert (json.dumps(retrieved, sort_keys=True) == json.dumps(expected, sort_keys=True))
 
 
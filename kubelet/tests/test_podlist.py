@@ -0,0 +1,166 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import sys
+import json
+
+import mock
+import pytest
+
+from datadog_checks.kubelet import KubeletCheck
+from datadog_checks.kubelet.common import PodListUtils
+from datadog_checks.kubelet.podlist import POD_FIELDS, PodListCache, load_pod_list, project
+
+from .test_kubelet import mock_from_file, mock_kubelet_check
+
+# Skip the whole tests module on Windows
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='tests for linux only')
+
+
+@pytest.fixture
+def aggregator():
+    from datadog_checks.stubs import aggregator
+    aggregator.reset()
+    return aggregator
+
+
+def chunked(data, chunk_size):
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024, 1024 * 1024])
+def test_load_pod_list(chunk_size):
+    raw = mock_from_file('pods.json')
+    expected = json.loads(raw)
+
+    pod_list = load_pod_list(chunked(raw, chunk_size), pod_fields=None)
+    assert pod_list == expected
+
+    pod_list = load_pod_list(chunked(raw, chunk_size))
+    assert pod_list['kind'] == expected['kind']
+    assert pod_list['items'] == [project(pod, POD_FIELDS) for pod in expected['items']]
+
+
+def test_load_pod_list_projection():
+    pod_list = load_pod_list([mock_from_file('pods.json')])
+    pod = pod_list['items'][0]
+
+    assert set(pod) == {'metadata', 'spec', 'status'}
+    assert 'volumes' not in pod['spec']
+    assert 'env' not in pod['spec']['containers'][0]
+    assert set(pod['metadata']['annotations']) <= {'kubernetes.io/config.source'}
+
+    # The projected podlist is enough for PodListUtils
+    full_utils = PodListUtils(json.loads(mock_from_file('pods.json')))
+    pod_list_utils = PodListUtils(pod_list)
+    assert pod_list_utils.static_pod_uids == full_utils.static_pod_uids
+    assert pod_list_utils.container_id_by_name_tuple == full_utils.container_id_by_name_tuple
+    assert pod_list_utils.containers == full_utils.containers
+
+
+@pytest.mark.parametrize('raw', [
+    b'{"kind": "PodList", "items": null}',
+    b'{"items": []}',
+    b'{}',
+])
+def test_load_pod_list_empty(raw):
+    assert load_pod_list(chunked(raw, 3)) == json.loads(raw)
+
+
+@pytest.mark.parametrize('raw', [
+    b'{"items": [{"metadata": {}}',
+    b'{"items": [{"metadata": {}}]',
+    b'{"items": [] "kind": "PodList"}',
+    b'{"items": []}}',
+    b'',
+])
+def test_load_pod_list_invalid(raw):
+    with pytest.raises(ValueError):
+        load_pod_list(chunked(raw, 3))
+
+
+def test_retrieve_pod_list():
+    check = KubeletCheck('kubelet', None, {}, [{}])
+    check.pod_list_url = 'http://dummy/pods'
+
+    response = mock.Mock()
+    response.iter_content = lambda chunk_size: chunked(mock_from_file('pods.json'), chunk_size)
+    with mock.patch.object(check, 'perform_kubelet_query', return_value=response) as query:
+        pod_list = check.retrieve_pod_list()
+
+    query.assert_called_once_with('http://dummy/pods', stream=True)
+    response.close.assert_called_once()
+    assert len(pod_list['items']) == 7
+
+    response.raise_for_status.side_effect = Exception('Unauthorized')
+    with mock.patch.object(check, 'perform_kubelet_query', return_value=response):
+        assert check.retrieve_pod_list() is None
+
+
+def test_pod_list_cache():
+    raw = mock_from_file('pods.json')
+    cache = PodListCache(max_age=60)
+
+    with mock.patch('time.time', return_value=1000):
+        pod_list = cache.load(chunked(raw, 1024))
+        pod_list_utils = cache.get_pod_list_utils(pod_list)
+        pod_list_utils.tags_cache[('docker://abc', True)] = ('foo:bar',)
+
+        # Same body: the podlist and its indexes are reused, the tags are not
+        assert cache.load(chunked(raw, 512)) is pod_list
+        assert cache.get_pod_list_utils(pod_list) is pod_list_utils
+        assert pod_list_utils.tags_cache == {}
+        assert cache.hit_rate == 0.5
+
+        # Different body
+        changed = raw.replace('fluentd-gcp-v2.0.10-9q9t4', 'fluentd-gcp-v2.0.10-abcde')
+        changed_pod_list = cache.load([changed])
+        assert changed_pod_list is not pod_list
+        assert cache.get_pod_list_utils(changed_pod_list) is not pod_list_utils
+
+    # Same body but too old
+    with mock.patch('time.time', return_value=1060):
+        assert cache.load([changed]) is not changed_pod_list
+
+    assert (cache.hits, cache.lookups) == (1, 4)
+
+    # A podlist that doesn't come from the cache gets its own PodListUtils
+    assert cache.get_pod_list_utils(json.loads(raw)) is not cache.get_pod_list_utils(cache.pod_list)
+
+
+def test_pod_list_cache_check(monkeypatch, aggregator):
+    check = mock_kubelet_check(monkeypatch, [{'debug_metrics': True}])
+    monkeypatch.setattr(check, 'process', mock.Mock(return_value=None))
+    pod_list = check.retrieve_pod_list()
+    monkeypatch.setattr(check.pod_list_cache, 'pod_list', pod_list)
+
+    check.check({"cadvisor_metrics_endpoint": "", "kubelet_metrics_endpoint": ""})
+    check.check({"cadvisor_metrics_endpoint": "", "kubelet_metrics_endpoint": ""})
+
+    assert check.pod_list_cache.pod_list_utils is not None
+    aggregator.assert_metric('kubernetes.pod_list.cache.hit_rate', count=2)
+
+
+def test_pod_list_cache_disabled():
+    check = KubeletCheck('kubelet', None, {}, [{'pod_list_cache_max_age': 0}])
+    assert check.pod_list_cache is None
+
+
+def test_pod_list_cache_streams():
+    raw = mock_from_file('pods.json')
+    cache = PodListCache(max_age=60)
+
+    with mock.patch('datadog_checks.kubelet.podlist.load_pod_list', wraps=load_pod_list) as load:
+        pod_list = cache.load(iter(chunked(raw, 1024)))
+        # The chunks are decoded as they are hashed, not buffered first
+        chunks = load.call_args[0][0]
+        assert not isinstance(chunks, (list, tuple))
+        assert pod_list['items'] == load_pod_list([raw])['items']
+
+        # Trailing bytes are hashed as well
+        assert cache.load([raw, '\n']) is not pod_list
+
+
+def test_pod_list_cache_max_age_string():
+    check = KubeletCheck('kubelet', None, {}, [{'pod_list_cache_max_age': '30'}])
+    assert check.pod_list_cache.max_age == 30
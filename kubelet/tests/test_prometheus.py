@@ -188,3 +188,46 @@ def test_get_kube_container_name():
 
     tags = CadvisorPrometheusScraperMixin._get_kube_container_name([])
     assert tags == []
+
+
+def test_get_cgroup_identity(cadvisor_scraper):
+    labels = {
+        "container_name": "datadog-agent",
+        "namespace": "default",
+        "pod_name": "datadog-agent-pbqt2",
+        "name": "k8s_datadog-agent_datadog-agent-pbqt2_default",
+        "image": "datadog/agent",
+        "id": "/kubepods/burstable/podb66c40af-997d-11e8-96a3-42010a840157/51cba2ca2290",
+    }
+    with mock.patch('datadog_checks.kubelet.common.is_excluded', return_value=False), \
+            mock.patch('datadog_checks.kubelet.common.get_tags', return_value=['foo:bar']):
+        identity = cadvisor_scraper._get_cgroup_identity(labels)
+
+    assert identity.is_container is True
+    assert identity.is_pod is False
+    assert identity.container_id == \
+        "containerd://51cba2ca229069039575750d44ed3a67e9b5ead651312ba7ff218dd9202fde64"
+    assert identity.pod_uid == "b66c40af-997d-11e8-96a3-42010a840157"
+    assert identity.excluded is False
+    assert identity.tags == ['foo:bar']
+
+    # Cached by the id label until the next reset
+    assert cadvisor_scraper._get_cgroup_identity(dict(labels, cpu='cpu01')) is identity
+    cadvisor_scraper.reset_cgroup_identities()
+    assert cadvisor_scraper._get_cgroup_identity(labels) is not identity
+
+
+def test_cgroup_identities_shared_by_transformers(monkeypatch):
+    from .test_kubelet import mock_kubelet_check, mocked_get_tags
+
+    check = mock_kubelet_check(monkeypatch, [{}])
+    resolve = mock.Mock(wraps=check._resolve_cgroup_identity)
+    monkeypatch.setattr(check, '_resolve_cgroup_identity', resolve)
+
+    with mock.patch("datadog_checks.kubelet.common.get_tags", side_effect=mocked_get_tags):
+        check.check({"cadvisor_metrics_endpoint": "http://dummy/metrics/cadvisor", "kubelet_metrics_endpoint": ""})
+
+    cgroups = [c[0][0]['id'] for c in resolve.call_args_list]
+    assert cgroups
+    assert len(cgroups) == len(set(cgroups))
+    assert check.cgroup_identities == {}
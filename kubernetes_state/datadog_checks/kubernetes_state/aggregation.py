@@ -0,0 +1,79 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+
+class LabelGroupBy(object):
+    """
+    LabelGroupBy sums the values of the samples of a metric family grouped by the values of some
+    of their labels, in a single pass over the samples.
+
+    The groups are keyed by the tuple of the values of the grouped labels, so that no tag is built
+    while the samples are read: the tags are only formatted when the groups are flushed, once per group.
+    """
+    __slots__ = ('labels', 'label_transformers', 'groups')
+
+    def __init__(self, labels=None, label_transformers=None):
+        """
+        :param labels: names of the labels to group by, `None` to group by all the labels of the samples
+        :param label_transformers: (optional) dict of functions applied to the values of some labels
+            when the tags are formatted, the groups ending up with the same tags are merged
+        """
+        self.labels = tuple(labels) if labels is not None else None
+        self.label_transformers = label_transformers or {}
+        self.groups = {}
+
+    def add(self, labels, value):
+        """
+        Add the value of a sample to its group
+        :param labels: dict of the labels of the sample
+        :param value: value of the sample
+        """
+        if self.labels is None:
+            key = frozenset(labels.iteritems())
+        else:
+            key = tuple(map(labels.get, self.labels))
+
+        groups = self.groups
+        groups[key] = groups.get(key, 0) + value
+
+    def clear(self):
+        self.groups = {}
+
+    def flush(self, scraper_config):
+        """
+        Return the list of `(tags, value)` of the groups and clear them. When grouping by given labels,
+        the labels missing or empty in a group are not tagged.
+        :param scraper_config: provides the `labels_mapper` and the `custom_tags` of the instance
+        """
+        groups, self.groups = self.groups, {}
+        labels_mapper = scraper_config['labels_mapper']
+        transformers = self.label_transformers
+
+        # Formatting is done per group, the prefixes of the grouped labels once per flush
+        if self.labels is not None:
+            prefixes = ['%s:' % labels_mapper.get(name, name) for name in self.labels]
+            transformers = [transformers.get(name) for name in self.labels]
+
+        counts = {}
+        for key, value in groups.iteritems():
+            tags = []
+            if self.labels is None:
+                for name, label_value in key:
+                    transformer = transformers.get(name)
+                    if transformer is not None:
+                        label_value = transformer(label_value)
+                    tags.append('%s:%s' % (labels_mapper.get(name, name), label_value))
+            else:
+                for prefix, transformer, label_value in zip(prefixes, transformers, key):
+                    if not label_value:
+                        continue
+                    if transformer is not None:
+                        label_value = transformer(label_value)
+                    tags.append(prefix + label_value)
+
+            tags = frozenset(tags)
+            counts[tags] = counts.get(tags, 0) + value
+
+        custom_tags = scraper_config['custom_tags']
+        return [(custom_tags + list(tags), value) for tags, value in counts.iteritems()]
@@ -4,13 +4,15 @@
 
 import re
 import time
-from collections import defaultdict, Counter
+import zlib
 from copy import deepcopy
 
 from datadog_checks.errors import CheckException
 from datadog_checks.checks.openmetrics import OpenMetricsBaseCheck
 from datadog_checks.config import is_affirmative
 
+from .aggregation import LabelGroupBy
+
 try:
     # this module is only available in agent 6
     from datadog_agent import get_clustername
@@ -25,6 +27,11 @@ METRIC_TYPES = ['counter', 'gauge']
 WHITELISTED_WAITING_REASONS = ['errimagepull', 'imagepullbackoff', 'crashloopbackoff', 'containercreating']
 WHITELISTED_TERMINATED_REASONS = ['oomkilled', 'containercannotrun', 'error']
 
+# Labels identifying the object of a sample when sharding, the first one found is hashed.
+# Namespaced objects are sharded by namespace so that the counts aggregated by namespace,
+# and the label joins between objects of a namespace, are entirely computed by one shard.
+SHARD_KEY_LABELS = ['namespace', 'node', 'persistentvolume', 'uid']
+
 
 class KubernetesState(OpenMetricsBaseCheck):
     """
@@ -41,6 +48,16 @@ class KubernetesState(OpenMetricsBaseCheck):
         generic_instances = [kubernetes_state_instance]
         super(KubernetesState, self).__init__(name, init_config, agentConfig, instances=generic_instances)
 
+        try:
+            self.shard_count = int(instance.get('shard_count', 1))
+            self.shard_index = int(instance.get('shard_index', 0))
+        except (TypeError, ValueError):
+            raise CheckException("shard_count and shard_index must be integers")
+        if self.shard_count < 1 or not 0 <= self.shard_index < self.shard_count:
+            raise CheckException("shard_index must be between 0 and shard_count - 1, shard_count at least 1")
+        # Shard of each value of the shard key labels, reset at every run
+        self.shards = {}
+
         self.condition_to_status_positive = {
             'true':      self.OK,
             'false':     self.CRITICAL,
@@ -63,7 +80,29 @@ class KubernetesState(OpenMetricsBaseCheck):
                 'metric_name': 'service.count',
                 'allowed_labels': ['namespace', 'type'],
             },
+            'kube_pod_status_phase': {
+                'metric_name': 'pod.status_phase',
+                'allowed_labels': ['namespace', 'phase'],
+            },
+            'kube_node_status_condition': {
+                'metric_name': 'nodes.by_condition',
+                'allowed_labels': ['condition', 'status'],
+            },
+        }
+        self.object_counters = {
+            metric: LabelGroupBy(params['allowed_labels']) for metric, params in self.object_count_params.iteritems()
         }
+        # The objects counted without keeping their shard key label are all counted by the first
+        # shard, each shard would otherwise submit a partial count with the same tags
+        self.unsharded_metrics = {
+            metric for metric, params in self.object_count_params.iteritems()
+            if not set(params['allowed_labels']).intersection(SHARD_KEY_LABELS)
+        }
+
+        # Job counters are grouped by all their labels, the job names being trimmed
+        job_label_transformers = {'job': self._trim_job_tag, 'job_name': self._trim_job_tag}
+        self.job_succeeded_count = LabelGroupBy(label_transformers=job_label_transformers)
+        self.job_failed_count = LabelGroupBy(label_transformers=job_label_transformers)
 
         self.METRIC_TRANSFORMERS = {
             'kube_pod_status_phase': self.kube_pod_status_phase,
@@ -92,16 +131,66 @@ class KubernetesState(OpenMetricsBaseCheck):
 
         # Job counters are monotonic: they increase at every run of the job
         # We want to send the delta via the `monotonic_count` method
-        self.job_succeeded_count = defaultdict(int)
-        self.job_failed_count = defaultdict(int)
+        self.job_succeeded_count.clear()
+        self.job_failed_count.clear()
+        self.shards = {}
 
         scraper_config = self.config_map[endpoint]
         self.process(scraper_config, metric_transformers=self.METRIC_TRANSFORMERS)
 
-        for job_tags, job_count in self.job_succeeded_count.iteritems():
-            self.monotonic_count(scraper_config['namespace'] + '.job.succeeded', job_count, list(job_tags))
-        for job_tags, job_count in self.job_failed_count.iteritems():
-            self.monotonic_count(scraper_config['namespace'] + '.job.failed', job_count, list(job_tags))
+        for job_tags, job_count in self.job_succeeded_count.flush(scraper_config):
+            self.monotonic_count(scraper_config['namespace'] + '.job.succeeded', job_count, job_tags)
+        for job_tags, job_count in self.job_failed_count.flush(scraper_config):
+            self.monotonic_count(scraper_config['namespace'] + '.job.failed', job_count, job_tags)
+
+    def parse_metric_family(self, response, scraper_config):
+        """
+        Drop the samples belonging to the other shards as the payload is parsed, before
+        they are processed. The families only used for label joins, i.e. not submitted, are not
+        sharded, so that labels can be joined from objects of any shard, and the families counted
+        across shards are entirely processed by the first shard, see `unsharded_metrics`.
+        """
+        metrics = super(KubernetesState, self).parse_metric_family(response, scraper_config)
+        if self.shard_count == 1:
+            for metric in metrics:
+                yield metric
+            return
+
+        label_joins = scraper_config['label_joins']
+        ignore_metrics = scraper_config['ignore_metrics']
+        metrics_mapper = scraper_config['metrics_mapper']
+        for metric in metrics:
+            if metric.name in self.unsharded_metrics:
+                if self.shard_index != 0:
+                    metric.samples = []
+                yield metric
+                continue
+
+            submitted = metric.name not in ignore_metrics and (
+                metric.name in metrics_mapper or metric.name in self.METRIC_TRANSFORMERS
+            )
+            if submitted or metric.name not in label_joins:
+                metric.samples = [s for s in metric.samples if self._in_shard(s[self.SAMPLE_LABELS])]
+            yield metric
+
+    def _in_shard(self, labels):
+        """
+        Tell whether the object of a sample is handled by the shard of this instance. The samples
+        without any of the `SHARD_KEY_LABELS` are all handled by the first shard.
+        """
+        for name in SHARD_KEY_LABELS:
+            value = labels.get(name)
+            if value:
+                break
+        else:
+            return self.shard_index == 0
+
+        key = (name, value)
+        shard = self.shards.get(key)
+        if shard is None:
+            # crc32 is stable across processes, unlike hash()
+            shard = self.shards[key] = (zlib.crc32(value.encode('utf-8')) & 0xffffffff) % self.shard_count
+        return shard == self.shard_index
 
     def _create_kubernetes_state_prometheus_instance(self, instance):
         """
@@ -384,20 +473,9 @@ class KubernetesState(OpenMetricsBaseCheck):
     # visualisable over time per namespace and phase
     def kube_pod_status_phase(self, metric, scraper_config):
         """ Phase a pod is in. """
-        metric_name = scraper_config['namespace'] + '.pod.status_phase'
-        status_phase_counter = Counter()
-
-        for sample in metric.samples:
-            # Counts aggregated cluster-wide to avoid no-data issues on pod churn,
-            # pod granularity available in the service checks
-            tags = [
-                self._label_to_tag('namespace', sample[self.SAMPLE_LABELS], scraper_config),
-                self._label_to_tag('phase', sample[self.SAMPLE_LABELS], scraper_config)
-            ] + scraper_config['custom_tags']
-            status_phase_counter[tuple(sorted(tags))] += sample[self.SAMPLE_VALUE]
-
-        for tags, count in status_phase_counter.iteritems():
-            self.gauge(metric_name, count, tags=list(tags))
+        # Counts aggregated cluster-wide to avoid no-data issues on pod churn,
+        # pod granularity available in the service checks
+        self.count_objects_by_tags(metric, scraper_config)
 
     def _submit_metric_kube_pod_container_status_reason(self, metric, metric_suffix, whitelisted_status_reasons,
                                                         scraper_config):
@@ -479,31 +557,17 @@ class KubernetesState(OpenMetricsBaseCheck):
 
     def kube_job_status_failed(self, metric, scraper_config):
         for sample in metric.samples:
-            tags = [] + scraper_config['custom_tags']
-            for label_name, label_value in sample[self.SAMPLE_LABELS].iteritems():
-                if label_name == 'job' or label_name == 'job_name':
-                    trimmed_job = self._trim_job_tag(label_value)
-                    tags.append(self._format_tag(label_name, trimmed_job, scraper_config))
-                else:
-                    tags.append(self._format_tag(label_name, label_value, scraper_config))
-            self.job_failed_count[frozenset(tags)] += sample[self.SAMPLE_VALUE]
+            self.job_failed_count.add(sample[self.SAMPLE_LABELS], sample[self.SAMPLE_VALUE])
 
     def kube_job_status_succeeded(self, metric, scraper_config):
         for sample in metric.samples:
-            tags = [] + scraper_config['custom_tags']
-            for label_name, label_value in sample[self.SAMPLE_LABELS].iteritems():
-                if label_name == 'job' or label_name == 'job_name':
-                    trimmed_job = self._trim_job_tag(label_value)
-                    tags.append(self._format_tag(label_name, trimmed_job, scraper_config))
-                else:
-                    tags.append(self._format_tag(label_name, label_value, scraper_config))
-            self.job_succeeded_count[frozenset(tags)] += sample[self.SAMPLE_VALUE]
+            self.job_succeeded_count.add(sample[self.SAMPLE_LABELS], sample[self.SAMPLE_VALUE])
 
     def kube_node_status_condition(self, metric, scraper_config):
         """ The ready status of a cluster node. v1.0+"""
         base_check_name = scraper_config['namespace'] + '.node'
         metric_name = scraper_config['namespace'] + '.nodes.by_condition'
-        by_condition_counter = Counter()
+        by_condition_counter = self.object_counters[metric.name]
 
         for sample in metric.samples:
             node_tag = self._label_to_tag("node", sample[self.SAMPLE_LABELS], scraper_config)
@@ -512,14 +576,10 @@ class KubernetesState(OpenMetricsBaseCheck):
 
             # Counts aggregated cluster-wide to avoid no-data issues on node churn,
             # node granularity available in the service checks
-            tags = [
-                self._label_to_tag("condition", sample[self.SAMPLE_LABELS], scraper_config),
-                self._label_to_tag("status", sample[self.SAMPLE_LABELS], scraper_config)
-            ] + scraper_config['custom_tags']
-            by_condition_counter[tuple(sorted(tags))] += sample[self.SAMPLE_VALUE]
+            by_condition_counter.add(sample[self.SAMPLE_LABELS], sample[self.SAMPLE_VALUE])
 
-        for tags, count in by_condition_counter.iteritems():
-            self.gauge(metric_name, count, tags=list(tags))
+        for tags, count in by_condition_counter.flush(scraper_config):
+            self.gauge(metric_name, count, tags=tags)
 
     def kube_node_status_ready(self, metric, scraper_config):
         """ The ready status of a cluster node (legacy)"""
@@ -628,13 +688,10 @@ class KubernetesState(OpenMetricsBaseCheck):
         """ Count objects by whitelisted tags and submit counts as gauges. """
         config = self.object_count_params[metric.name]
         metric_name = "{}.{}".format(scraper_config['namespace'], config['metric_name'])
-        object_counter = Counter()
+        object_counter = self.object_counters[metric.name]
 
         for sample in metric.samples:
-            tags = [
-                self._label_to_tag(l, sample[self.SAMPLE_LABELS], scraper_config) for l in config['allowed_labels']
-            ] + scraper_config['custom_tags']
-            object_counter[tuple(sorted(tags))] += sample[self.SAMPLE_VALUE]
+            object_counter.add(sample[self.SAMPLE_LABELS], sample[self.SAMPLE_VALUE])
 
-        for tags, count in object_counter.iteritems():
-            self.gauge(metric_name, count, tags=list(tags))
+        for tags, count in object_counter.flush(scraper_config):
+            self.gauge(metric_name, count, tags=tags)
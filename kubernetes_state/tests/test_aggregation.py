@@ -0,0 +1,42 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+from datadog_checks.kubernetes_state.aggregation import LabelGroupBy
+
+SCRAPER_CONFIG = {
+    'labels_mapper': {'namespace': 'kube_namespace'},
+    'custom_tags': ['optional:tag1'],
+}
+
+
+def test_group_by_labels():
+    group_by = LabelGroupBy(['namespace', 'phase'])
+    group_by.add({'namespace': 'default', 'phase': 'Running', 'pod': 'a'}, 1)
+    group_by.add({'namespace': 'default', 'phase': 'Running', 'pod': 'b'}, 1)
+    group_by.add({'namespace': 'default', 'phase': 'Pending', 'pod': 'c'}, 1)
+    # Missing and empty labels end up in the same group
+    group_by.add({'phase': 'Failed', 'pod': 'd'}, 1)
+    group_by.add({'namespace': '', 'phase': 'Failed', 'pod': 'e'}, 0)
+
+    counts = sorted((sorted(tags), value) for tags, value in group_by.flush(SCRAPER_CONFIG))
+    assert counts == [
+        (['kube_namespace:default', 'optional:tag1', 'phase:Pending'], 1),
+        (['kube_namespace:default', 'optional:tag1', 'phase:Running'], 2),
+        (['optional:tag1', 'phase:Failed'], 1),
+    ]
+
+    # The groups are cleared once flushed
+    assert group_by.flush(SCRAPER_CONFIG) == []
+
+
+def test_group_by_all_labels():
+    group_by = LabelGroupBy(label_transformers={'job_name': lambda name: name.split('-')[0]})
+    group_by.add({'namespace': 'default', 'job_name': 'hello-1509998340'}, 1)
+    group_by.add({'namespace': 'default', 'job_name': 'hello-1509998400'}, 2)
+    group_by.add({'namespace': 'kube-system', 'job_name': 'hello-1509998400'}, 3)
+
+    counts = sorted((sorted(tags), value) for tags, value in group_by.flush(SCRAPER_CONFIG))
+    assert counts == [
+        (['job_name:hello', 'kube_namespace:default', 'optional:tag1'], 3),
+        (['job_name:hello', 'kube_namespace:kube-system', 'optional:tag1'], 3),
+    ]
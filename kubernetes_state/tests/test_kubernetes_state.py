@@ -2,10 +2,12 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 import os
+from collections import Counter, defaultdict
 
 import mock
 import pytest
 
+from datadog_checks.errors import CheckException
 from datadog_checks.stubs import aggregator as _aggregator
 from datadog_checks.kubernetes_state import KubernetesState
 
@@ -361,3 +363,55 @@ def test_pod_phase_gauges(aggregator, instance, check):
                              tags=['namespace:default', 'phase:Running', 'optional:tag1'], value=3)
     aggregator.assert_metric(NAMESPACE + '.pod.status_phase',
                              tags=['namespace:default', 'phase:Failed', 'optional:tag1'], value=2)
+
+
+def _collect_submissions(aggregator):
+    metrics = defaultdict(float)
+    for name in aggregator.metric_names:
+        for m in aggregator.metrics(name):
+            metrics[(m.name, m.type, tuple(sorted(m.tags)), m.hostname)] += m.value
+    service_checks = Counter()
+    for name in aggregator.service_check_names:
+        for sc in aggregator.service_checks(name):
+            service_checks[(sc.name, sc.status, tuple(sorted(sc.tags)), sc.hostname)] += 1
+    return metrics, service_checks
+
+
+def test_sharding(aggregator, instance, check):
+    check.check(instance)
+    expected_metrics, expected_service_checks = _collect_submissions(aggregator)
+
+    metrics = {}
+    service_checks = Counter()
+    for shard_index in range(3):
+        aggregator.reset()
+        shard_instance = dict(instance, shard_count=3, shard_index=shard_index)
+        shard_check = KubernetesState(CHECK_NAME, {}, {}, [shard_instance])
+        shard_check.poll = check.poll
+        shard_check.check(shard_instance)
+
+        shard_metrics, shard_service_checks = _collect_submissions(aggregator)
+        assert 0 < len(shard_metrics) < len(expected_metrics)
+        for key, value in shard_metrics.items():
+            # Each context is submitted by a single shard, with its complete value
+            assert key not in metrics
+            assert value == expected_metrics[key], key
+            metrics[key] = value
+        for key in shard_service_checks:
+            assert key not in service_checks
+        service_checks.update(shard_service_checks)
+
+        # The counts across nodes and persistent volumes are only submitted by the first shard
+        for name in (NAMESPACE + '.nodes.by_condition', NAMESPACE + '.persistentvolumes.by_phase'):
+            assert bool(aggregator.metrics(name)) == (shard_index == 0)
+
+    # Together, the shards submit the same values as the unsharded check
+    assert metrics == expected_metrics
+    assert service_checks == expected_service_checks
+
+
+@pytest.mark.parametrize('shard_count, shard_index', [(0, 0), (2, 2), (2, -1), ('two', 0)])
+def test_sharding_invalid(instance, shard_count, shard_index):
+    instance.update({'shard_count': shard_count, 'shard_index': shard_index})
+    with pytest.raises(CheckException):
+        KubernetesState(CHECK_NAME, {}, {}, [instance])
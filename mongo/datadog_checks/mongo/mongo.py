@@ -10,6 +10,7 @@ from six import PY3, iteritems, itervalues
 from six.moves.urllib.parse import unquote_plus, urlsplit
 
 from datadog_checks.base import AgentCheck, is_affirmative
+from datadog_checks.base.utils.executor import ExecutorQueueFull, TimeoutError, get_executor
 
 if PY3:
     long = int
@@ -421,6 +422,11 @@ class MongoDb(AgentCheck):
         for key, value in iteritems(self.COLLECTION_METRICS):
             self.collection_metrics_names.append(key.split('.')[1])
 
+        # Authenticated MongoClients kept across runs, by server and replica set name
+        self._clients = {}
+        # Number of commands rejected by the executor since the last submission of its metrics
+        self._rejected_tasks = 0
+
     @classmethod
     def get_library_versions(cls):
         return {'pymongo': pymongo.version}
@@ -631,22 +637,112 @@ class MongoDb(AgentCheck):
 
         return username, password, db_name, nodelist, clean_server_name, auth_source
 
-    def _collect_indexes_stats(self, instance, db, tags):
+    def _get_cached_client(self, key, clean_server_name):
         """
-        Collect indexes statistics for all collections in the configuration.
-        This use the "$indexStats" command.
+        Return the MongoClient cached for `key` if it still answers, None otherwise.
+        An unhealthy client is closed and dropped, so that a new one gets created and authenticated.
+        """
+        cli = self._clients.get(key)
+        if cli is None:
+            return None
+
+        try:
+            cli['admin'].command('ping')
+        except pymongo.errors.PyMongoError as e:
+            self.log.warning(u"Connection to `%s` is unhealthy, reconnecting: %s", clean_server_name, e)
+            del self._clients[key]
+            cli.close()
+            return None
+
+        return cli
+
+    def _run_concurrently(self, func, args_list, timeout):
         """
-        for coll_name in instance.get('collections', []):
+        Call `func` with each tuple of `args_list` on the executor shared by the checks and return
+        the list of `(result, exception)`, in the order of `args_list`. The calls that don't fit in
+        the queue of the executor are run from the thread of the check. The calls not done within
+        `timeout` seconds are given up on with a `TimeoutError`.
+        """
+        def call(args):
             try:
-                for stats in db[coll_name].aggregate([{"$indexStats": {}}], cursor={}):
-                    idx_tags = tags + [
-                        "name:{0}".format(stats.get('name', 'unknown')),
-                        "collection:{0}".format(coll_name),
-                    ]
-                    val = int(stats.get('accesses', {}).get('ops', 0))
-                    self.gauge('mongodb.collection.indexes.accesses.ops', val, idx_tags)
+                return func(*args), None
             except Exception as e:
+                return None, e
+
+        executor = get_executor()
+        deadline = time.time() + timeout
+        futures = []
+        for args in args_list:
+            try:
+                futures.append(executor.submit_with_timeout(timeout, call, args))
+            except ExecutorQueueFull:
+                self._rejected_tasks += 1
+                futures.append(None)
+
+        results = []
+        for args, future in zip(args_list, futures):
+            if future is None:
+                results.append(call(args))
+                continue
+            try:
+                results.append(future.result(max(deadline - time.time(), 0)))
+            except TimeoutError:
+                future.cancel()
+                results.append((None, TimeoutError('Timed out after {}s'.format(timeout))))
+        return results
+
+    def cancel(self):
+        """
+        Close the cached clients when the check is unscheduled.
+        """
+        clients, self._clients = self._clients, {}
+        for cli in itervalues(clients):
+            cli.close()
+
+    # Called by the Agent 5 instead of `cancel`
+    stop = cancel
+
+    def _collect_indexes_stats(self, instance, db, tags):
+        """
+        Collect indexes statistics for all collections in the configuration.
+        This use the "$indexStats" command, run concurrently for the collections.
+        """
+        def get_indexes_stats(coll_name):
+            return list(db[coll_name].aggregate([{"$indexStats": {}}], cursor={}))
+
+        coll_names = instance.get('collections', [])
+        results = self._run_concurrently(get_indexes_stats, [(coll_name,) for coll_name in coll_names],
+                                         float(instance.get('timeout', DEFAULT_TIMEOUT)))
+        for coll_name, (indexes_stats, e) in zip(coll_names, results):
+            if e is not None:
                 self.log.error("Could not fetch indexes stats for collection %s: %s", coll_name, e)
+                continue
+
+            for stats in indexes_stats:
+                idx_tags = tags + [
+                    "name:{0}".format(stats.get('name', 'unknown')),
+                    "collection:{0}".format(coll_name),
+                ]
+                val = int(stats.get('accesses', {}).get('ops', 0))
+                self.gauge('mongodb.collection.indexes.accesses.ops', val, idx_tags)
+
+    def _get_dbstats(self, cli, dbnames, timeout):
+        """
+        Run the `dbstats` command concurrently for all the databases, the ones for which it fails
+        or doesn't complete within `timeout` seconds are skipped
+        """
+        def get_dbstats(db_n):
+            return cli[db_n].command('dbstats')
+
+        dbstats = {}
+        results = self._run_concurrently(get_dbstats, [(db_n,) for db_n in dbnames], timeout)
+        for db_n, (stats, e) in zip(dbnames, results):
+            if e is not None:
+                self.log.warning(u"Failed to record `dbstats` metrics for database %s: %s", db_n, e)
+                continue
+            dbstats[db_n] = {'stats': stats}
+
+        return dbstats
 
     def check(self, instance):
         """
@@ -723,23 +819,6 @@ class MongoDb(AgentCheck):
             ]
 
         timeout = float(instance.get('timeout', DEFAULT_TIMEOUT)) * 1000
-        try:
-            cli = pymongo.mongo_client.MongoClient(
-                server,
-                socketTimeoutMS=timeout,
-                connectTimeoutMS=timeout,
-                serverSelectionTimeoutMS=timeout,
-                read_preference=pymongo.ReadPreference.PRIMARY_PREFERRED,
-                **ssl_params)
-            # some commands can only go against the admin DB
-            admindb = cli['admin']
-            db = cli[db_name]
-        except Exception:
-            self.service_check(
-                self.SERVICE_CHECK_NAME,
-                AgentCheck.CRITICAL,
-                tags=service_check_tags)
-            raise
 
         # Authenticate
         do_auth = True
@@ -751,18 +830,43 @@ class MongoDb(AgentCheck):
             )
             do_auth = False
 
-        if do_auth:
-            if auth_source:
-                msg = "authSource was specified in the the server URL: using '%s' as the authentication database"
-                self.log.info(msg, auth_source)
-                self._authenticate(cli[auth_source],
-                                   username,
-                                   password,
-                                   use_x509,
-                                   clean_server_name,
-                                   service_check_tags)
-            else:
-                self._authenticate(db, username, password, use_x509, clean_server_name, service_check_tags)
+        # The client is kept across runs, it's only authenticated when it's created
+        cli = self._get_cached_client((server, None), clean_server_name)
+        if cli is None:
+            try:
+                cli = pymongo.mongo_client.MongoClient(
+                    server,
+                    socketTimeoutMS=timeout,
+                    connectTimeoutMS=timeout,
+                    serverSelectionTimeoutMS=timeout,
+                    read_preference=pymongo.ReadPreference.PRIMARY_PREFERRED,
+                    **ssl_params)
+            except Exception:
+                self.service_check(
+                    self.SERVICE_CHECK_NAME,
+                    AgentCheck.CRITICAL,
+                    tags=service_check_tags)
+                raise
+
+            if do_auth:
+                if auth_source:
+                    msg = "authSource was specified in the the server URL: using '%s' as the authentication database"
+                    self.log.info(msg, auth_source)
+                    self._authenticate(cli[auth_source],
+                                       username,
+                                       password,
+                                       use_x509,
+                                       clean_server_name,
+                                       service_check_tags)
+                else:
+                    self._authenticate(cli[db_name], username, password, use_x509, clean_server_name,
+                                       service_check_tags)
+
+            self._clients[(server, None)] = cli
+
+        # some commands can only go against the admin DB
+        admindb = cli['admin']
+        db = cli[db_name]
 
         try:
             status = db.command('serverStatus', tcmalloc=collect_tcmalloc_metrics)
@@ -801,30 +905,34 @@ class MongoDb(AgentCheck):
 
                     # need a new connection to deal with replica sets
                     setname = replSet.get('set')
-                    cli_rs = pymongo.mongo_client.MongoClient(
-                        server,
-                        socketTimeoutMS=timeout,
-                        connectTimeoutMS=timeout,
-                        serverSelectionTimeoutMS=timeout,
-                        replicaset=setname,
-                        read_preference=pymongo.ReadPreference.NEAREST,
-                        **ssl_params)
-
-                    if do_auth:
-                        if auth_source:
-                            self._authenticate(cli_rs[auth_source],
-                                               username,
-                                               password,
-                                               use_x509,
-                                               server,
-                                               service_check_tags)
-                        else:
-                            self._authenticate(cli_rs[db_name],
-                                               username,
-                                               password,
-                                               use_x509,
-                                               server,
-                                               service_check_tags)
+                    cli_rs = self._get_cached_client((server, setname), clean_server_name)
+                    if cli_rs is None:
+                        cli_rs = pymongo.mongo_client.MongoClient(
+                            server,
+                            socketTimeoutMS=timeout,
+                            connectTimeoutMS=timeout,
+                            serverSelectionTimeoutMS=timeout,
+                            replicaset=setname,
+                            read_preference=pymongo.ReadPreference.NEAREST,
+                            **ssl_params)
+
+                        if do_auth:
+                            if auth_source:
+                                self._authenticate(cli_rs[auth_source],
+                                                   username,
+                                                   password,
+                                                   use_x509,
+                                                   server,
+                                                   service_check_tags)
+                            else:
+                                self._authenticate(cli_rs[db_name],
+                                                   username,
+                                                   password,
+                                                   use_x509,
+                                                   server,
+                                                   service_check_tags)
+
+                        self._clients[(server, setname)] = cli_rs
 
                     # Replication set information
                     replset_name = replSet['set']
@@ -889,9 +997,7 @@ class MongoDb(AgentCheck):
         dbnames = cli.database_names()
         self.gauge('mongodb.dbs', len(dbnames), tags=tags)
 
-        for db_n in dbnames:
-            db_aux = cli[db_n]
-            dbstats[db_n] = {'stats': db_aux.command('dbstats')}
+        dbstats.update(self._get_dbstats(cli, [db_n for db_n in dbnames if db_n != db_name], timeout / 1000))
 
         # Go through the metrics and save the values
         for metric_name in metrics_to_collect:
@@ -1048,10 +1154,14 @@ class MongoDb(AgentCheck):
             db = cli[db_name]
             # grab the collections from the configutation
             coll_names = instance.get('collections', [])
+            # grab the stats of the collections concurrently
+            results = self._run_concurrently(db.command, [("collstats", coll_name) for coll_name in coll_names],
+                                             timeout / 1000)
             # loop through the collections
-            for coll_name in coll_names:
-                # grab the stats from the collection
-                stats = db.command("collstats", coll_name)
+            for coll_name, (stats, e) in zip(coll_names, results):
+                if e is not None:
+                    self.log.warning(u"Failed to record `collection` metrics for collection %s: %s", coll_name, e)
+                    continue
                 # loop through the metrics
                 for m in self.collection_metrics_names:
                     coll_tags = tags + ["db:%s" % db_name, "collection:%s" % coll_name]
@@ -1075,3 +1185,6 @@ class MongoDb(AgentCheck):
         except Exception as e:
             self.log.warning(u"Failed to record `collection` metrics.")
             self.log.exception(e)
+
+        self.submit_executor_stats('mongodb', self._rejected_tasks, tags)
+        self._rejected_tasks = 0
@@ -49,7 +49,9 @@ def instance_authdb():
 
 @pytest.fixture
 def check():
-    return MongoDb('mongo', {}, {})
+    check = MongoDb('mongo', {}, {})
+    yield check
+    check.cancel()
 
 
 def setup_sharding(compose_file):
@@ -2,11 +2,14 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import logging
+import threading
 
 import mock
+import pymongo
 import pytest
 from six import iteritems
 
+from datadog_checks.base.utils.executor import ExecutorQueueFull, TimeoutError
 from datadog_checks.mongo import MongoDb
 
 log = logging.getLogger('test_mongo')
@@ -159,3 +162,83 @@ def test_server_uri_sanitization(check):
     for server, expected_clean_name in server_names:
         _, _, _, _, clean_name, _ = _parse_uri(server, sanitize_username=True)
         assert expected_clean_name == clean_name
+
+
+@pytest.mark.unit
+def test_cached_client(check):
+    """
+    Healthy clients are reused across runs, unhealthy ones are closed and dropped.
+    """
+    assert check._get_cached_client(('mongodb://localhost:27017/admin', None), 'localhost') is None
+
+    cli = mock.MagicMock()
+    check._clients[('mongodb://localhost:27017/admin', None)] = cli
+    assert check._get_cached_client(('mongodb://localhost:27017/admin', None), 'localhost') is cli
+    cli['admin'].command.assert_called_once_with('ping')
+
+    cli['admin'].command.side_effect = pymongo.errors.AutoReconnect('connection closed')
+    assert check._get_cached_client(('mongodb://localhost:27017/admin', None), 'localhost') is None
+    cli.close.assert_called_once_with()
+    assert check._clients == {}
+
+
+@pytest.mark.unit
+def test_run_concurrently(check):
+    """
+    The results and errors are returned in the order of the arguments.
+    """
+    def divide(a, b):
+        return a / b
+
+    results = check._run_concurrently(divide, [(4, 2), (1, 0), (9, 3)], 5)
+
+    assert [r for r, _ in results] == [2, None, 3]
+    assert [type(e) for _, e in results] == [type(None), ZeroDivisionError, type(None)]
+    assert check._run_concurrently(divide, [], 5) == []
+
+
+@pytest.mark.unit
+def test_run_concurrently_executor_full(check):
+    """
+    The calls are run from the thread of the check when the queue of the executor is full.
+    """
+    executor = mock.MagicMock()
+    executor.submit_with_timeout.side_effect = ExecutorQueueFull()
+    with mock.patch('datadog_checks.mongo.mongo.get_executor', return_value=executor):
+        assert check._run_concurrently(abs, [(-1,), (-2,)], 5) == [(1, None), (2, None)]
+    assert check._rejected_tasks == 2
+
+
+@pytest.mark.unit
+def test_run_concurrently_timeout(check):
+    """
+    The calls not done in time fail with a TimeoutError, the others still return their result.
+    """
+    release = threading.Event()
+
+    def wait(name):
+        if name == 'slow':
+            release.wait(5)
+        return name
+
+    try:
+        results = check._run_concurrently(wait, [('fast',), ('slow',)], 0.1)
+    finally:
+        release.set()
+
+    assert results[0] == ('fast', None)
+    assert results[1][0] is None and isinstance(results[1][1], TimeoutError)
+
+
+@pytest.mark.unit
+def test_cancel(check):
+    """
+    The cached clients are closed.
+    """
+    cli = mock.MagicMock()
+    check._clients[('mongodb://localhost:27017/admin', None)] = cli
+
+    check.cancel()
+
+    cli.close.assert_called_once_with()
+    assert check._clients == {}
@@ -0,0 +1,106 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import heapq
+from collections import defaultdict
+
+from six import PY3, iteritems
+
+if PY3:
+    long = int
+
+# Maximum number of digests tracked between two runs
+DEFAULT_MAX_DIGESTS = 5000
+
+# The timers of performance_schema are in picoseconds
+PICOSECONDS_PER_MICROSECOND = 1000000
+
+
+class DigestCollector(object):
+    """
+    Keep the last snapshot of `performance_schema.events_statements_summary_by_digest`,
+    by (schema, digest), to compute what ran in the interval between two snapshots.
+    """
+    def __init__(self, max_digests=DEFAULT_MAX_DIGESTS):
+        self.max_digests = max_digests
+        self._snapshot = None
+
+    def update(self, rows):
+        """
+        Take a new snapshot from the `(schema_name, digest, count_star, sum_timer_wait)` rows and
+        return the list of `(schema_name, count, timer_wait)` deltas of the digests that ran since the
+        previous one. The first snapshot returns no deltas.
+
+        Only the `max_digests` digests with the highest `sum_timer_wait` are kept. A digest missing from
+        the previous snapshot only gets a delta on the next run, its counters could predate that snapshot.
+        """
+        snapshot = {}
+        for schema_name, digest, count_star, sum_timer_wait in rows:
+            snapshot[(schema_name, digest)] = (long(count_star), long(sum_timer_wait))
+
+        if len(snapshot) > self.max_digests:
+            keys = heapq.nlargest(self.max_digests, snapshot, key=lambda k: snapshot[k][1])
+            snapshot = {key: snapshot[key] for key in keys}
+
+        previous, self._snapshot = self._snapshot, snapshot
+        if previous is None:
+            return []
+
+        deltas = []
+        for key, (count_star, sum_timer_wait) in iteritems(snapshot):
+            if key not in previous:
+                continue
+
+            prev_count_star, prev_sum_timer_wait = previous[key]
+            count = count_star - prev_count_star
+            timer_wait = sum_timer_wait - prev_sum_timer_wait
+            # Nothing ran, or the table was truncated in between
+            if count <= 0 or timer_wait < 0:
+                continue
+
+            deltas.append((key[0], count, timer_wait))
+
+        return deltas
+
+
+def avg_us_percentile(deltas, percentile):
+    """
+    Return the `percentile` of the average execution time of the digests in microseconds,
+    None if no digest ran
+    """
+    if not deltas:
+        return None
+
+    digests = sorted(((timer_wait, count) for _, count, timer_wait in deltas),
+                     key=lambda digest: float(digest[0]) / digest[1])
+    # The first row ranked above `ROUND(percentile * count)`, the last one at least
+    rank = min(int(percentile * len(digests) + 0.5), len(digests) - 1)
+
+    return _avg_us(*digests[rank])
+
+
+def avg_us_per_schema(deltas):
+    """
+    Return the average execution time of the statements in microseconds, by `schema:<name>` tag
+    """
+    counts = defaultdict(int)
+    timer_waits = defaultdict(int)
+    for schema_name, count, timer_wait in deltas:
+        if schema_name is None:
+            continue
+        counts[schema_name] += count
+        timer_waits[schema_name] += timer_wait
+
+    return {
+        "schema:{0}".format(schema_name): _avg_us(timer_waits[schema_name], count)
+        for schema_name, count in iteritems(counts)
+    }
+
+
+def _avg_us(timer_wait, count):
+    """
+    Return the average of `count` executions lasting `timer_wait` picoseconds in total, in microseconds
+    rounded half up. Integer arithmetic is used as `round` rounds half to even on Python 3 only.
+    """
+    divisor = count * PICOSECONDS_PER_MICROSECOND
+    return long((timer_wait + divisor // 2) // divisor)
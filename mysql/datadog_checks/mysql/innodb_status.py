@@ -0,0 +1,331 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+"""
+Parser of the output of `SHOW ENGINE INNODB STATUS`.
+
+The output is split on its section headers, e.g.
+
+    ------------
+    TRANSACTIONS
+    ------------
+
+and each section is scanned with a single regex, the alternation of the patterns of
+the lines holding metrics in that section. Each pattern has a handler, called with
+the groups of the match, that stores the values in the results.
+
+This is heavily inspired by the Percona monitoring plugins work.
+"""
+import logging
+import re
+from collections import defaultdict
+
+from six import PY3
+
+if PY3:
+    long = int
+
+log = logging.getLogger(__name__)
+
+SECTION_HEADER = re.compile(r'^-{3,}\r?\n([A-Z][A-Z /]*?)\r?\n-{3,}\r?$', re.M)
+
+# Start of the list of the transactions in the TRANSACTIONS section
+TRANSACTION_LIST_HEADER = 'LIST OF TRANSACTIONS FOR EACH SESSION:'
+
+# Metrics only found in the list of the transactions
+TRANSACTION_METRICS = (
+    'Innodb_active_transactions',
+    'Innodb_current_transactions',
+    'Innodb_lock_structs',
+    'Innodb_locked_tables',
+    'Innodb_locked_transactions',
+    'Innodb_row_lock_time',
+    'Innodb_tables_in_use',
+)
+
+
+class SectionParser(object):
+    """
+    Compile the `(pattern, handler)` rules of a section into a single regex, the patterns match the start of a line.
+    The handler of the rule matching a line is called with the results and the groups of its pattern.
+    """
+    def __init__(self, rules):
+        self.handlers = {}
+
+        patterns = []
+        index = 1
+        for pattern, handler in rules:
+            groups = re.compile(pattern).groups
+            patterns.append('({})'.format(pattern))
+            # The groups of the pattern follow the group wrapping it
+            self.handlers[index] = (handler, index + 1, index + 1 + groups)
+            index += 1 + groups
+
+        # The patterns are anchored at the start of the lines, ignoring the indentation
+        self.regex = re.compile(r'^[ \t]*(?:{})'.format('|'.join(patterns)), re.M)
+
+    def parse(self, text, results):
+        for match in self.regex.finditer(text):
+            # The group wrapping the pattern that matched is the last one to close
+            handler, start, end = self.handlers[match.lastindex]
+            handler(results, *[match.group(i) for i in range(start, end)])
+
+
+def set_values(*metrics):
+    def handler(results, *values):
+        for metric, value in zip(metrics, values):
+            results[metric] = long(value)
+    return handler
+
+
+def add_values(*metrics):
+    def handler(results, *values):
+        for metric, value in zip(metrics, values):
+            results[metric] += long(value)
+    return handler
+
+
+def _are_values_numeric(array):
+    return all(v.isdigit() for v in array)
+
+
+def semaphore_wait(results, seconds):
+    # --Thread 907205 has waited at handler/ha_innodb.cc line 7156 for 1.00 seconds the semaphore:
+    results['Innodb_semaphore_waits'] += 1
+    results['Innodb_semaphore_wait_time'] += long(float(seconds)) * 1000
+
+
+def transaction(results, description):
+    # ---TRANSACTION 0, not started, process no 13510, OS thread id 1170446656
+    results['Innodb_current_transactions'] += 1
+    if 'ACTIVE' in description:
+        results['Innodb_active_transactions'] += 1
+
+
+def lock_wait(results, seconds):
+    # ------- TRX HAS BEEN WAITING 32 SEC FOR THIS LOCK TO BE GRANTED:
+    results['Innodb_row_lock_time'] += long(seconds) * 1000
+
+
+def locked_transaction(results, lock_structs):
+    # LOCK WAIT 12 lock struct(s), heap size 3024, undo log entries 5
+    results['Innodb_lock_structs'] += long(lock_structs)
+    results['Innodb_locked_transactions'] += 1
+
+
+def pending_normal_aio(results, text):
+    row = re.split(" +", text.strip())
+    row = [item.strip(',;[]') for item in row]
+    try:
+        if len(row) == 8:
+            # (len(row) == 8)  Pending normal aio reads: 0, aio writes: 0,
+            results['Innodb_pending_normal_aio_reads'] = long(row[4])
+            results['Innodb_pending_normal_aio_writes'] = long(row[7])
+        elif len(row) == 14:
+            # (len(row) == 14) Pending normal aio reads: 0 [0, 0] , aio writes: 0 [0, 0] ,
+            results['Innodb_pending_normal_aio_reads'] = long(row[4])
+            results['Innodb_pending_normal_aio_writes'] = long(row[10])
+        elif len(row) == 16:
+            # (len(row) == 16) Pending normal aio reads: [0, 0, 0, 0] , aio writes: [0, 0, 0, 0] ,
+            if _are_values_numeric(row[4:8]) and _are_values_numeric(row[11:15]):
+                results['Innodb_pending_normal_aio_reads'] = (long(row[4]) + long(row[5]) +
+                                                              long(row[6]) + long(row[7]))
+                results['Innodb_pending_normal_aio_writes'] = (long(row[11]) + long(row[12]) +
+                                                               long(row[13]) + long(row[14]))
+
+            # (len(row) == 16) Pending normal aio reads: 0 [0, 0, 0, 0] , aio writes: 0 [0, 0] ,
+            elif _are_values_numeric(row[4:9]) and _are_values_numeric(row[12:15]):
+                results['Innodb_pending_normal_aio_reads'] = long(row[4])
+                results['Innodb_pending_normal_aio_writes'] = long(row[12])
+            else:
+                log.warning("Can't parse result line %s", text)
+        elif len(row) == 18:
+            # (len(row) == 18) Pending normal aio reads: 0 [0, 0, 0, 0] , aio writes: 0 [0, 0, 0, 0] ,
+            results['Innodb_pending_normal_aio_reads'] = long(row[4])
+            results['Innodb_pending_normal_aio_writes'] = long(row[12])
+        elif len(row) == 22:
+            # (len(row) == 22)
+            # Pending normal aio reads: 0 [0, 0, 0, 0, 0, 0, 0, 0] , aio writes: 0 [0, 0, 0, 0] ,
+            results['Innodb_pending_normal_aio_reads'] = long(row[4])
+            results['Innodb_pending_normal_aio_writes'] = long(row[16])
+    except ValueError as e:
+        log.warning("Can't parse result line %s: %s", text, e)
+
+
+def pending_ibuf_aio(results, ibuf_aio_reads, log_ios, sync_ios):
+    #  ibuf aio reads: 0, log i/o's: 0, sync i/o's: 0
+    #  or ibuf aio reads:, log i/o's:, sync i/o's:
+    results['Innodb_pending_ibuf_aio_reads'] = long(ibuf_aio_reads or 0)
+    results['Innodb_pending_aio_log_ios'] = long(log_ios or 0)
+    results['Innodb_pending_aio_sync_ios'] = long(sync_ios or 0)
+
+
+def ibuf(results, size, free_list, segment_size, merges):
+    # Ibuf: size 1, free list len 4634, seg size 4636,
+    # Ibuf: size 1, free list len 0, seg size 2, 0 merges
+    results['Innodb_ibuf_size'] = long(size)
+    results['Innodb_ibuf_free_list'] = long(free_list)
+    results['Innodb_ibuf_segment_size'] = long(segment_size)
+    if merges is not None:
+        results['Innodb_ibuf_merges'] = long(merges)
+
+
+def ibuf_merged_operations(results, inserts, delete_marks, deletes):
+    # Output of show engine innodb status has changed in 5.5
+    # merged operations:
+    # insert 593983, delete mark 387006, delete 73092
+    results['Innodb_ibuf_merged_inserts'] = long(inserts)
+    results['Innodb_ibuf_merged_delete_marks'] = long(delete_marks)
+    results['Innodb_ibuf_merged_deletes'] = long(deletes)
+    results['Innodb_ibuf_merged'] = long(inserts) + long(delete_marks) + long(deletes)
+
+
+def hash_table(results, size, used_cells):
+    # In some versions of InnoDB, the used cells is omitted.
+    # Hash table size 4425293, used cells 4229064, ....
+    # Hash table size 57374437, node heap has 72964 buffer(s) <--
+    # no used cells
+    results['Innodb_hash_index_cells_total'] = long(size)
+    results['Innodb_hash_index_cells_used'] = long(used_cells or 0)
+
+
+def memory(label):
+    """
+    Pattern of a line of the memory breakdown, the labels are padded to 20 characters
+    """
+    return re.escape(label.ljust(20)) + r' *(\d+)'
+
+
+SECTION_PARSERS = {
+    'SEMAPHORES': SectionParser([
+        # Mutex spin waits 79626940, rounds 157459864, OS waits 698719
+        (r'Mutex spin waits (\d+), rounds (\d+), OS waits (\d+)',
+         set_values('Innodb_mutex_spin_waits', 'Innodb_mutex_spin_rounds', 'Innodb_mutex_os_waits')),
+        # RW-shared spins 3859028, OS waits 2100750; RW-excl spins 4641946, OS waits 1530310
+        (r'RW-shared spins (\d+), OS waits (\d+); RW-excl spins (\d+), OS waits (\d+)',
+         set_values('Innodb_s_lock_spin_waits', 'Innodb_s_lock_os_waits',
+                    'Innodb_x_lock_spin_waits', 'Innodb_x_lock_os_waits')),
+        # Post 5.5.17 SHOW ENGINE INNODB STATUS syntax
+        # RW-shared spins 604733, rounds 8107431, OS waits 241268
+        (r'RW-shared spins (\d+), rounds (\d+), OS waits (\d+)',
+         set_values('Innodb_s_lock_spin_waits', 'Innodb_s_lock_spin_rounds', 'Innodb_s_lock_os_waits')),
+        # RW-excl spins 604733, rounds 8107431, OS waits 241268
+        (r'RW-excl spins (\d+), rounds (\d+), OS waits (\d+)',
+         set_values('Innodb_x_lock_spin_waits', 'Innodb_x_lock_spin_rounds', 'Innodb_x_lock_os_waits')),
+        (r'\S.* for (\d+(?:\.\d+)?) seconds the semaphore:', semaphore_wait),
+    ]),
+    'TRANSACTIONS': SectionParser([
+        # History list length 132
+        (r'History list length (\d+)', set_values('Innodb_history_list_length')),
+        (r'---TRANSACTION(.*)$', transaction),
+        (r'------- TRX HAS BEEN WAITING (\d+) SEC', lock_wait),
+        # mysql tables in use 2, locked 2
+        (r'mysql tables in use (\d+), locked (\d+)', add_values('Innodb_tables_in_use', 'Innodb_locked_tables')),
+        # 23 lock struct(s), heap size 3024, undo log entries 27
+        # LOCK WAIT 12 lock struct(s), heap size 3024, undo log entries 5
+        # LOCK WAIT 2 lock struct(s), heap size 368
+        (r'LOCK WAIT (\d+) lock struct\(s\)', locked_transaction),
+        # ROLLING BACK 127539 lock struct(s), heap size 15201832,
+        # 4411492 row lock(s), undo log entries 1042488
+        (r'(?:ROLLING BACK )?(\d+) lock struct\(s\)', add_values('Innodb_lock_structs')),
+    ]),
+    'FILE I/O': SectionParser([
+        # 8782182 OS file reads, 15635445 OS file writes, 947800 OS fsyncs
+        (r'(\d+) OS file reads, (\d+) OS file writes, (\d+) OS fsyncs',
+         set_values('Innodb_os_file_reads', 'Innodb_os_file_writes', 'Innodb_os_file_fsyncs')),
+        (r'(Pending normal aio reads:.*)$', pending_normal_aio),
+        (r"ibuf aio reads:[ \t]*(\d*),?[ \t]*log i/o's:[ \t]*(\d*),?[ \t]*sync i/o's:[ \t]*(\d*)",
+         pending_ibuf_aio),
+        # Pending flushes (fsync) log: 0; buffer pool: 0
+        (r'Pending flushes \(fsync\) log: (\d+); buffer pool: (\d+)',
+         set_values('Innodb_pending_log_flushes', 'Innodb_pending_buffer_pool_flushes')),
+    ]),
+    'INSERT BUFFER AND ADAPTIVE HASH INDEX': SectionParser([
+        # Older InnoDB code seemed to be ready for an ibuf per tablespace.  It
+        # had two lines in the output.  Newer has just one line, see below.
+        # Ibuf for space 0: size 1, free list len 887, seg size 889, is not empty
+        (r'Ibuf for space 0: size (\d+), free list len (\d+), seg size (\d+)',
+         set_values('Innodb_ibuf_size', 'Innodb_ibuf_free_list', 'Innodb_ibuf_segment_size')),
+        (r'Ibuf: size (\d+), free list len (\d+), seg size (\d+),(?: (\d+) merges)?', ibuf),
+        (r'merged operations:[ \t]*\r?\n[ \t]*insert (\d+), delete mark (\d+), delete (\d+)',
+         ibuf_merged_operations),
+        # 19817685 inserts, 19817684 merged recs, 3552620 merges
+        (r'(\d+) inserts, (\d+) merged recs, (\d+) merges',
+         set_values('Innodb_ibuf_merged_inserts', 'Innodb_ibuf_merged', 'Innodb_ibuf_merges')),
+        (r'Hash table size (\d+)(?:, used cells (\d+))?', hash_table),
+    ]),
+    'LOG': SectionParser([
+        # 3430041 log i/o's done, 17.44 log i/o's/second
+        (r"(\d+) log i/o's done, ", set_values('Innodb_log_writes')),
+        # 0 pending log writes, 0 pending chkp writes
+        (r'(\d+) pending log writes, (\d+) pending chkp writes',
+         set_values('Innodb_pending_log_writes', 'Innodb_pending_checkpoint_writes')),
+        # This number is NOT printed in hex in InnoDB plugin.
+        # Log sequence number 272588624
+        (r'Log sequence number[ \t]+(\d+)', set_values('Innodb_lsn_current')),
+        # Log flushed up to   272588624
+        (r'Log flushed up to[ \t]+(\d+)', set_values('Innodb_lsn_flushed')),
+        # Last checkpoint at  272588624
+        (r'Last checkpoint at[ \t]+(\d+)', set_values('Innodb_lsn_last_checkpoint')),
+    ]),
+    # Only the aggregated buffer pool metrics are reported, the INDIVIDUAL BUFFER POOL INFO section is ignored
+    'BUFFER POOL AND MEMORY': SectionParser([
+        # Total memory allocated 29642194944; in additional pool allocated 0
+        (r'Total memory allocated (\d+); in additional pool allocated (\d+)',
+         set_values('Innodb_mem_total', 'Innodb_mem_additional_pool')),
+        #   Adaptive hash index 1538240664     (186998824 + 1351241840)
+        (r'Adaptive hash index (\d+)', set_values('Innodb_mem_adaptive_hash')),
+        (memory('Page hash'), set_values('Innodb_mem_page_hash')),
+        (memory('Dictionary cache'), set_values('Innodb_mem_dictionary')),
+        (memory('File system'), set_values('Innodb_mem_file_system')),
+        (memory('Lock system'), set_values('Innodb_mem_lock_system')),
+        (memory('Recovery system'), set_values('Innodb_mem_recovery_system')),
+        (memory('Threads'), set_values('Innodb_mem_thread_hash')),
+        # The " " after size is necessary to avoid matching the wrong line:
+        # Buffer pool size        1769471
+        # Buffer pool size, bytes 28991012864
+        (r'Buffer pool size +(\d+)', set_values('Innodb_buffer_pool_pages_total')),
+        (r'Free buffers +(\d+)', set_values('Innodb_buffer_pool_pages_free')),
+        (r'Database pages +(\d+)', set_values('Innodb_buffer_pool_pages_data')),
+        (r'Modified db pages +(\d+)', set_values('Innodb_buffer_pool_pages_dirty')),
+        # Pages read 15240822, created 1770238, written 21705836
+        (r'Pages read (\d+), created (\d+), written (\d+)',
+         set_values('Innodb_pages_read', 'Innodb_pages_created', 'Innodb_pages_written')),
+    ]),
+    'ROW OPERATIONS': SectionParser([
+        # Number of rows inserted 50678311, updated 66425915, deleted 20605903, read 454561562
+        (r'Number of rows inserted (\d+), updated (\d+), deleted (\d+), read (\d+)',
+         set_values('Innodb_rows_inserted', 'Innodb_rows_updated', 'Innodb_rows_deleted', 'Innodb_rows_read')),
+        # 0 queries inside InnoDB, 0 queries in queue
+        (r'(\d+) queries inside InnoDB, (\d+) queries in queue',
+         set_values('Innodb_queries_inside', 'Innodb_queries_queued')),
+        # 1 read views open inside InnoDB
+        (r'(\d+) read views open inside InnoDB', set_values('Innodb_read_views')),
+    ]),
+}
+
+
+def parse_innodb_status(text, collect_transactions=True):
+    """
+    Return the metrics found in the output of `SHOW ENGINE INNODB STATUS`, as a `defaultdict(int)`.
+
+    Unless `collect_transactions` is set, the list of the transactions isn't scanned
+    and the `TRANSACTION_METRICS` aren't reported.
+    """
+    results = defaultdict(int)
+
+    # [preamble, name, body, name, body, ...]
+    sections = SECTION_HEADER.split(text)
+    for name, body in zip(sections[1::2], sections[2::2]):
+        parser = SECTION_PARSERS.get(name)
+        if parser is None:
+            continue
+
+        if name == 'TRANSACTIONS' and not collect_transactions:
+            end = body.find(TRANSACTION_LIST_HEADER)
+            if end != -1:
+                body = body[:end]
+
+        parser.parse(body, results)
+
+    return results
@@ -3,9 +3,11 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 import re
+import time
 import traceback
 from collections import defaultdict
 from contextlib import closing, contextmanager
+from timeit import default_timer as timer
 
 import pymysql
 from six import PY3, iteritems, itervalues, text_type
@@ -17,6 +19,8 @@ except ImportError:
     PSUTIL_AVAILABLE = False
 
 from datadog_checks.base import AgentCheck, is_affirmative
+from .digests import DEFAULT_MAX_DIGESTS, DigestCollector, avg_us_percentile, avg_us_per_schema
+from .innodb_status import parse_innodb_status
 
 if PY3:
     long = int
@@ -27,6 +31,12 @@ COUNT = "count"
 MONOTONIC = "monotonic_count"
 PROC_NAME = 'mysqld'
 
+# Maximum number of seconds a persistent connection is reused before being re-established
+DEFAULT_CONNECTION_MAX_LIFETIME = 3600
+
+# Number of seconds between two queries of the size of the schemas
+DEFAULT_SCHEMA_SIZE_INTERVAL = 600
+
 # Vars found in "SHOW STATUS;"
 STATUS_VARS = {
     # Command Metrics
@@ -284,6 +294,14 @@ class MySql(AgentCheck):
         AgentCheck.__init__(self, name, init_config, agentConfig, instances)
         self.mysql_version = {}
         self.qcache_stats = {}
+        # Persistent connections kept across runs, by host key: (connection, creation time)
+        self._connections = {}
+        # Snapshots of the statements summary by digest, by host key
+        self._digest_collectors = {}
+        # Sizes of the schemas, by host key: (time of the query, sizes)
+        self._schema_size_cache = {}
+        # Duration in seconds of the queries of the current run, by query name
+        self._query_times = {}
 
     @classmethod
     def get_library_versions(cls):
@@ -292,16 +310,18 @@ class MySql(AgentCheck):
     def check(self, instance):
         host, port, user, password, mysql_sock, \
             defaults_file, tags, options, queries, ssl, \
-            connect_timeout, max_custom_queries = \
-            self._get_config(instance)
+            connect_timeout, max_custom_queries, persistent_connection, \
+            connection_max_lifetime = self._get_config(instance)
 
         self._set_qcache_stats()
+        self._query_times = {}
 
         if not (host and user) and not defaults_file:
             raise Exception("Mysql host and user are needed.")
 
         with self._connect(host, port, mysql_sock, user,
-                           password, defaults_file, ssl, connect_timeout, tags) as db:
+                           password, defaults_file, ssl, connect_timeout, tags,
+                           persistent_connection, connection_max_lifetime) as db:
             try:
                 # Metadata collection
                 self._collect_metadata(db)
@@ -316,6 +336,8 @@ class MySql(AgentCheck):
             except Exception as e:
                 self.log.exception("error!")
                 raise e
+            finally:
+                self._submit_query_times(tags, options)
 
     def _get_config(self, instance):
         self.host = instance.get('server', '')
@@ -330,9 +352,12 @@ class MySql(AgentCheck):
         ssl = instance.get('ssl', {})
         connect_timeout = instance.get('connect_timeout', 10)
         max_custom_queries = instance.get('max_custom_queries', self.DEFAULT_MAX_CUSTOM_QUERIES)
+        persistent_connection = is_affirmative(instance.get('persistent_connection', False))
+        connection_max_lifetime = int(instance.get('connection_max_lifetime', DEFAULT_CONNECTION_MAX_LIFETIME))
 
         return (self.host, self.port, user, password, self.mysql_sock,
-                self.defaults_file, tags, options, queries, ssl, connect_timeout, max_custom_queries)
+                self.defaults_file, tags, options, queries, ssl, connect_timeout, max_custom_queries,
+                persistent_connection, connection_max_lifetime)
 
     def _set_qcache_stats(self):
         host_key = self._get_host_key()
@@ -363,7 +388,8 @@ class MySql(AgentCheck):
         return hostkey
 
     @contextmanager
-    def _connect(self, host, port, mysql_sock, user, password, defaults_file, ssl, connect_timeout, tags):
+    def _connect(self, host, port, mysql_sock, user, password, defaults_file, ssl, connect_timeout, tags,
+                 persistent=False, max_lifetime=DEFAULT_CONNECTION_MAX_LIFETIME):
         self.service_check_tags = [
             'server:%s' % (mysql_sock if mysql_sock != '' else host),
             'port:%s' % ('unix_socket' if port == 0 else port)
@@ -372,68 +398,158 @@ class MySql(AgentCheck):
         if tags is not None:
             self.service_check_tags.extend(tags)
 
+        if defaults_file == '' and mysql_sock != '':
+            self.service_check_tags = [
+                'server:{0}'.format(mysql_sock),
+                'port:unix_socket'
+            ] + (tags or [])
+
         db = None
         try:
-            ssl = dict(ssl) if ssl else None
+            if persistent:
+                db = self._get_persistent_connection(max_lifetime)
+
+            if db is None:
+                db = self._new_connection(host, port, mysql_sock, user, password, defaults_file, ssl,
+                                          connect_timeout)
+                self.log.debug("Connected to MySQL")
+                if persistent:
+                    self._connections[self._get_host_key()] = (db, time.time())
 
-            if defaults_file != '':
-                db = pymysql.connect(
-                    read_default_file=defaults_file,
-                    ssl=ssl,
-                    connect_timeout=connect_timeout
-                )
-            elif mysql_sock != '':
-                self.service_check_tags = [
-                    'server:{0}'.format(mysql_sock),
-                    'port:unix_socket'
-                ] + tags
-                db = pymysql.connect(
-                    unix_socket=mysql_sock,
-                    user=user,
-                    passwd=password,
-                    connect_timeout=connect_timeout
-                )
-            elif port:
-                db = pymysql.connect(
-                    host=host,
-                    port=port,
-                    user=user,
-                    passwd=password,
-                    ssl=ssl,
-                    connect_timeout=connect_timeout
-                )
-            else:
-                db = pymysql.connect(
-                    host=host,
-                    user=user,
-                    passwd=password,
-                    ssl=ssl,
-                    connect_timeout=connect_timeout
-                )
-            self.log.debug("Connected to MySQL")
             self.service_check_tags = list(set(self.service_check_tags))
             self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.OK,
                                tags=self.service_check_tags)
             yield db
-        except Exception:
+        except Exception as e:
             self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL,
                                tags=self.service_check_tags)
+            # A broken persistent connection is re-established on the next run
+            if persistent and isinstance(e, (pymysql.err.OperationalError, pymysql.err.InterfaceError)):
+                self._close_persistent_connection()
             raise
         finally:
-            if db:
+            if db and not persistent:
                 db.close()
 
+    def _new_connection(self, host, port, mysql_sock, user, password, defaults_file, ssl, connect_timeout):
+        ssl = dict(ssl) if ssl else None
+
+        # With autocommit, every query reads the current state of the server. Otherwise, a persistent
+        # connection would stay in the same REPEATABLE READ transaction across runs, reading a stale
+        # snapshot and holding back the InnoDB purge.
+        if defaults_file != '':
+            return pymysql.connect(
+                read_default_file=defaults_file,
+                ssl=ssl,
+                connect_timeout=connect_timeout,
+                autocommit=True
+            )
+        elif mysql_sock != '':
+            return pymysql.connect(
+                unix_socket=mysql_sock,
+                user=user,
+                passwd=password,
+                connect_timeout=connect_timeout,
+                autocommit=True
+            )
+        elif port:
+            return pymysql.connect(
+                host=host,
+                port=port,
+                user=user,
+                passwd=password,
+                ssl=ssl,
+                connect_timeout=connect_timeout,
+                autocommit=True
+            )
+        else:
+            return pymysql.connect(
+                host=host,
+                user=user,
+                passwd=password,
+                ssl=ssl,
+                connect_timeout=connect_timeout,
+                autocommit=True
+            )
+
+    def _get_persistent_connection(self, max_lifetime):
+        """
+        Return the persistent connection of the instance if it's still alive and not older than
+        `max_lifetime` seconds, None otherwise. A connection that can't be reused is closed.
+        """
+        db, created = self._connections.get(self._get_host_key(), (None, None))
+        if db is None:
+            return None
+
+        if max_lifetime and time.time() - created >= max_lifetime:
+            self.log.debug("MySQL connection reached its max lifetime, reconnecting")
+            self._close_persistent_connection()
+            return None
+
+        try:
+            db.ping(reconnect=False)
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            self.log.warning("MySQL connection is unhealthy, reconnecting: %s", e)
+            self._close_persistent_connection()
+            return None
+
+        return db
+
+    def _close_persistent_connection(self):
+        db, _ = self._connections.pop(self._get_host_key(), (None, None))
+        if db is not None:
+            self._close_connection(db)
+
+    def _close_connection(self, db):
+        try:
+            db.close()
+        except Exception as e:
+            # The connection might already be closed
+            self.log.debug("Error closing MySQL connection: %s", e)
+
+    def cancel(self):
+        """
+        Close the persistent connections when the check is unscheduled.
+        """
+        connections, self._connections = self._connections, {}
+        for db, _ in itervalues(connections):
+            self._close_connection(db)
+
+    # Called by the Agent 5 instead of `cancel`
+    stop = cancel
+
+    @contextmanager
+    def _timed_query(self, name):
+        """
+        Measure the time spent running the query `name`, it's reported at the end of the run
+        """
+        start = timer()
+        try:
+            yield
+        finally:
+            self._query_times[name] = self._query_times.get(name, 0) + timer() - start
+
+    def _submit_query_times(self, tags, options):
+        for name, elapsed in iteritems(self._query_times):
+            self.log.debug("MySQL query `%s` took %.3fs", name, elapsed)
+            if is_affirmative(options.get('query_timing_metrics', False)):
+                self.gauge('mysql.check.query_time', elapsed, tags=tags + ['query:{0}'.format(name)])
+
     def _collect_metrics(self, db, tags, options, queries, max_custom_queries):
 
         # Get aggregate of all VARS we want to collect
         metrics = STATUS_VARS
 
         # collect results from db
-        results = self._get_stats_from_status(db)
-        results.update(self._get_stats_from_variables(db))
+        with self._timed_query('status'):
+            results = self._get_stats_from_status(db)
+        with self._timed_query('variables'):
+            results.update(self._get_stats_from_variables(db))
 
         if not is_affirmative(options.get('disable_innodb_metrics', False)) and self._is_innodb_engine_enabled(db):
-            results.update(self._get_stats_from_innodb_status(db))
+            with self._timed_query('innodb_status'):
+                collect_transactions = is_affirmative(options.get('extra_innodb_metrics', False))
+                results.update(self._get_stats_from_innodb_status(db, collect_transactions))
 
             innodb_keys = [
                 'Innodb_page_size',
@@ -483,8 +599,8 @@ class MySql(AgentCheck):
 
         # Binary log statistics
         if self._get_variable_enabled(results, 'log_bin'):
-            results[
-                'Binlog_space_usage_bytes'] = self._get_binary_log_stats(db)
+            with self._timed_query('binary_logs'):
+                results['Binlog_space_usage_bytes'] = self._get_binary_log_stats(db)
 
         # Compute key cache utilization metric
         key_blocks_unused = self._collect_scalar('Key_blocks_unused', results)
@@ -524,14 +640,18 @@ class MySql(AgentCheck):
         performance_schema_enabled = self._get_variable_enabled(results, 'performance_schema')
         above_560 = self._version_compatible(db, (5, 6, 0))
         if is_affirmative(options.get('extra_performance_metrics', False)) and above_560 and performance_schema_enabled:
-            # report avg query response time per schema to Datadog
-            results['perf_digest_95th_percentile_avg_us'] = self._get_query_exec_time_95th_us(db)
-            results['query_run_time_avg'] = self._query_exec_time_per_schema(db)
+            # report avg query response time per schema to Datadog, for the statements run since the last run
+            max_digests = int(options.get('max_digests', DEFAULT_MAX_DIGESTS))
+            with self._timed_query('performance_schema'):
+                digest_deltas = self._get_digest_deltas(db, max_digests)
+            results['perf_digest_95th_percentile_avg_us'] = avg_us_percentile(digest_deltas, 0.95)
+            results['query_run_time_avg'] = avg_us_per_schema(digest_deltas)
             metrics.update(PERFORMANCE_VARS)
 
         if is_affirmative(options.get('schema_size_metrics', False)):
-            # report avg query response time per schema to Datadog
-            results['information_schema_size'] = self._query_size_per_schema(db)
+            # report the size of each schema to Datadog
+            schema_size_interval = int(options.get('schema_size_interval', DEFAULT_SCHEMA_SIZE_INTERVAL))
+            results['information_schema_size'] = self._get_schema_size(db, schema_size_interval)
             metrics.update(SCHEMA_VARS)
 
         if is_affirmative(options.get('replication', False)):
@@ -541,9 +661,10 @@ class MySql(AgentCheck):
             if replication_channel:
                 self.service_check_tags.append("channel:{0}".format(replication_channel))
                 tags.append("channel:{0}".format(replication_channel))
-            results.update(self._get_replica_stats(db, is_mariadb, replication_channel))
             nonblocking = is_affirmative(options.get('replication_non_blocking_status', False))
-            results.update(self._get_slave_status(db, above_560, nonblocking))
+            with self._timed_query('replication'):
+                results.update(self._get_replica_stats(db, is_mariadb, replication_channel))
+                results.update(self._get_slave_status(db, above_560, nonblocking))
             metrics.update(REPLICA_VARS)
 
             # get slave running form global status page
@@ -615,11 +736,12 @@ class MySql(AgentCheck):
         if isinstance(queries, list):
             for index, check in enumerate(queries[:max_custom_queries]):
                 total_tags = tags + check.get('tags', [])
-                self._collect_dict(check['type'],
-                                   {check['field']: check['metric']},
-                                   check['query'],
-                                   db,
-                                   tags=total_tags)
+                with self._timed_query('custom_{0}'.format(index)):
+                    self._collect_dict(check['type'],
+                                       {check['field']: check['metric']},
+                                       check['query'],
+                                       db,
+                                       tags=total_tags)
 
             if len(queries) > max_custom_queries:
                 self.warning("Maximum number (%s) of custom queries reached.  Skipping the rest."
@@ -944,11 +1066,7 @@ class MySql(AgentCheck):
             self.warning("Privileges error accessing the process tables (must grant PROCESS): %s" % str(e))
             return {}
 
-    @classmethod
-    def _are_values_numeric(cls, array):
-        return all(v.isdigit() for v in array)
-
-    def _get_stats_from_innodb_status(self, db):
+    def _get_stats_from_innodb_status(self, db, collect_transactions=True):
         # There are a number of important InnoDB metrics that are reported in
         # InnoDB status but are not otherwise present as part of the STATUS
         # variables in MySQL. Majority of these metrics are reported though
@@ -973,288 +1091,7 @@ class MySql(AgentCheck):
         innodb_status = cursor.fetchone()
         innodb_status_text = innodb_status[2]
 
-        results = defaultdict(int)
-
-        # Here we now parse InnoDB STATUS one line at a time
-        # This is heavily inspired by the Percona monitoring plugins work
-        txn_seen = False
-        prev_line = ''
-        # Only return aggregated buffer pool metrics
-        buffer_id = -1
-        for line in innodb_status_text.splitlines():
-            line = line.strip()
-            row = re.split(" +", line)
-            row = [item.strip(',') for item in row]
-            row = [item.strip(';') for item in row]
-            row = [item.strip('[') for item in row]
-            row = [item.strip(']') for item in row]
-
-            if line.startswith('---BUFFER POOL'):
-                buffer_id = long(row[2])
-
-            # SEMAPHORES
-            if line.find('Mutex spin waits') == 0:
-                # Mutex spin waits 79626940, rounds 157459864, OS waits 698719
-                # Mutex spin waits 0, rounds 247280272495, OS waits 316513438
-                results['Innodb_mutex_spin_waits'] = long(row[3])
-                results['Innodb_mutex_spin_rounds'] = long(row[5])
-                results['Innodb_mutex_os_waits'] = long(row[8])
-            elif line.find('RW-shared spins') == 0 and line.find(';') > 0:
-                # RW-shared spins 3859028, OS waits 2100750; RW-excl spins
-                # 4641946, OS waits 1530310
-                results['Innodb_s_lock_spin_waits'] = long(row[2])
-                results['Innodb_x_lock_spin_waits'] = long(row[8])
-                results['Innodb_s_lock_os_waits'] = long(row[5])
-                results['Innodb_x_lock_os_waits'] = long(row[11])
-            elif line.find('RW-shared spins') == 0 and line.find('; RW-excl spins') == -1:
-                # Post 5.5.17 SHOW ENGINE INNODB STATUS syntax
-                # RW-shared spins 604733, rounds 8107431, OS waits 241268
-                results['Innodb_s_lock_spin_waits'] = long(row[2])
-                results['Innodb_s_lock_spin_rounds'] = long(row[4])
-                results['Innodb_s_lock_os_waits'] = long(row[7])
-            elif line.find('RW-excl spins') == 0:
-                # Post 5.5.17 SHOW ENGINE INNODB STATUS syntax
-                # RW-excl spins 604733, rounds 8107431, OS waits 241268
-                results['Innodb_x_lock_spin_waits'] = long(row[2])
-                results['Innodb_x_lock_spin_rounds'] = long(row[4])
-                results['Innodb_x_lock_os_waits'] = long(row[7])
-            elif line.find('seconds the semaphore:') > 0:
-                # --Thread 907205 has waited at handler/ha_innodb.cc line 7156 for 1.00 seconds the semaphore:
-                results['Innodb_semaphore_waits'] += 1
-                results[
-                    'Innodb_semaphore_wait_time'] += long(float(row[9])) * 1000
-
-            # TRANSACTIONS
-            elif line.find('Trx id counter') == 0:
-                # The beginning of the TRANSACTIONS section: start counting
-                # transactions
-                # Trx id counter 0 1170664159
-                # Trx id counter 861B144C
-                txn_seen = True
-            elif line.find('History list length') == 0:
-                # History list length 132
-                results['Innodb_history_list_length'] = long(row[3])
-            elif txn_seen and line.find('---TRANSACTION') == 0:
-                # ---TRANSACTION 0, not started, process no 13510, OS thread id 1170446656
-                results['Innodb_current_transactions'] += 1
-                if line.find('ACTIVE') > 0:
-                    results['Innodb_active_transactions'] += 1
-            elif txn_seen and line.find('------- TRX HAS BEEN') == 0:
-                # ------- TRX HAS BEEN WAITING 32 SEC FOR THIS LOCK TO BE GRANTED:
-                results['Innodb_row_lock_time'] += long(row[5]) * 1000
-            elif line.find('read views open inside InnoDB') > 0:
-                # 1 read views open inside InnoDB
-                results['Innodb_read_views'] = long(row[0])
-            elif line.find('mysql tables in use') == 0:
-                # mysql tables in use 2, locked 2
-                results['Innodb_tables_in_use'] += long(row[4])
-                results['Innodb_locked_tables'] += long(row[6])
-            elif txn_seen and line.find('lock struct(s)') > 0:
-                # 23 lock struct(s), heap size 3024, undo log entries 27
-                # LOCK WAIT 12 lock struct(s), heap size 3024, undo log entries 5
-                # LOCK WAIT 2 lock struct(s), heap size 368
-                if line.find('LOCK WAIT') == 0:
-                    results['Innodb_lock_structs'] += long(row[2])
-                    results['Innodb_locked_transactions'] += 1
-                elif line.find('ROLLING BACK') == 0:
-                    # ROLLING BACK 127539 lock struct(s), heap size 15201832,
-                    # 4411492 row lock(s), undo log entries 1042488
-                    results['Innodb_lock_structs'] += long(row[2])
-                else:
-                    results['Innodb_lock_structs'] += long(row[0])
-
-            # FILE I/O
-            elif line.find(' OS file reads, ') > 0:
-                # 8782182 OS file reads, 15635445 OS file writes, 947800 OS
-                # fsyncs
-                results['Innodb_os_file_reads'] = long(row[0])
-                results['Innodb_os_file_writes'] = long(row[4])
-                results['Innodb_os_file_fsyncs'] = long(row[8])
-            elif line.find('Pending normal aio reads:') == 0:
-                try:
-                    if len(row) == 8:
-                        # (len(row) == 8)  Pending normal aio reads: 0, aio writes: 0,
-                        results['Innodb_pending_normal_aio_reads'] = long(row[4])
-                        results['Innodb_pending_normal_aio_writes'] = long(row[7])
-                    elif len(row) == 14:
-                        # (len(row) == 14) Pending normal aio reads: 0 [0, 0] , aio writes: 0 [0, 0] ,
-                        results['Innodb_pending_normal_aio_reads'] = long(row[4])
-                        results['Innodb_pending_normal_aio_writes'] = long(row[10])
-                    elif len(row) == 16:
-                        # (len(row) == 16) Pending normal aio reads: [0, 0, 0, 0] , aio writes: [0, 0, 0, 0] ,
-                        if self._are_values_numeric(row[4:8]) and self._are_values_numeric(row[11:15]):
-                            results['Innodb_pending_normal_aio_reads'] = (long(row[4]) + long(row[5]) +
-                                                                          long(row[6]) + long(row[7]))
-                            results['Innodb_pending_normal_aio_writes'] = (long(row[11]) + long(row[12]) +
-                                                                           long(row[13]) + long(row[14]))
-
-                        # (len(row) == 16) Pending normal aio reads: 0 [0, 0, 0, 0] , aio writes: 0 [0, 0] ,
-                        elif self._are_values_numeric(row[4:9]) and self._are_values_numeric(row[12:15]):
-                            results['Innodb_pending_normal_aio_reads'] = long(row[4])
-                            results['Innodb_pending_normal_aio_writes'] = long(row[12])
-                        else:
-                            self.log.warning("Can't parse result line %s" % line)
-                    elif len(row) == 18:
-                        # (len(row) == 18) Pending normal aio reads: 0 [0, 0, 0, 0] , aio writes: 0 [0, 0, 0, 0] ,
-                        results['Innodb_pending_normal_aio_reads'] = long(row[4])
-                        results['Innodb_pending_normal_aio_writes'] = long(row[12])
-                    elif len(row) == 22:
-                        # (len(row) == 22)
-                        # Pending normal aio reads: 0 [0, 0, 0, 0, 0, 0, 0, 0] , aio writes: 0 [0, 0, 0, 0] ,
-                        results['Innodb_pending_normal_aio_reads'] = long(row[4])
-                        results['Innodb_pending_normal_aio_writes'] = long(row[16])
-                except ValueError as e:
-                    self.log.warning("Can't parse result line %s: %s", line, e)
-            elif line.find('ibuf aio reads') == 0:
-                #  ibuf aio reads: 0, log i/o's: 0, sync i/o's: 0
-                #  or ibuf aio reads:, log i/o's:, sync i/o's:
-                if len(row) == 10:
-                    results['Innodb_pending_ibuf_aio_reads'] = long(row[3])
-                    results['Innodb_pending_aio_log_ios'] = long(row[6])
-                    results['Innodb_pending_aio_sync_ios'] = long(row[9])
-                elif len(row) == 7:
-                    results['Innodb_pending_ibuf_aio_reads'] = 0
-                    results['Innodb_pending_aio_log_ios'] = 0
-                    results['Innodb_pending_aio_sync_ios'] = 0
-            elif line.find('Pending flushes (fsync)') == 0:
-                # Pending flushes (fsync) log: 0; buffer pool: 0
-                results['Innodb_pending_log_flushes'] = long(row[4])
-                results['Innodb_pending_buffer_pool_flushes'] = long(row[7])
-
-            # INSERT BUFFER AND ADAPTIVE HASH INDEX
-            elif line.find('Ibuf for space 0: size ') == 0:
-                # Older InnoDB code seemed to be ready for an ibuf per tablespace.  It
-                # had two lines in the output.  Newer has just one line, see below.
-                # Ibuf for space 0: size 1, free list len 887, seg size 889, is not empty
-                # Ibuf for space 0: size 1, free list len 887, seg size 889,
-                results['Innodb_ibuf_size'] = long(row[5])
-                results['Innodb_ibuf_free_list'] = long(row[9])
-                results['Innodb_ibuf_segment_size'] = long(row[12])
-            elif line.find('Ibuf: size ') == 0:
-                # Ibuf: size 1, free list len 4634, seg size 4636,
-                results['Innodb_ibuf_size'] = long(row[2])
-                results['Innodb_ibuf_free_list'] = long(row[6])
-                results['Innodb_ibuf_segment_size'] = long(row[9])
-
-                if line.find('merges') > -1:
-                    results['Innodb_ibuf_merges'] = long(row[10])
-            elif line.find(', delete mark ') > 0 and prev_line.find('merged operations:') == 0:
-                # Output of show engine innodb status has changed in 5.5
-                # merged operations:
-                # insert 593983, delete mark 387006, delete 73092
-                results['Innodb_ibuf_merged_inserts'] = long(row[1])
-                results['Innodb_ibuf_merged_delete_marks'] = long(row[4])
-                results['Innodb_ibuf_merged_deletes'] = long(row[6])
-                results['Innodb_ibuf_merged'] = results['Innodb_ibuf_merged_inserts'] + results[
-                    'Innodb_ibuf_merged_delete_marks'] + results['Innodb_ibuf_merged_deletes']
-            elif line.find(' merged recs, ') > 0:
-                # 19817685 inserts, 19817684 merged recs, 3552620 merges
-                results['Innodb_ibuf_merged_inserts'] = long(row[0])
-                results['Innodb_ibuf_merged'] = long(row[2])
-                results['Innodb_ibuf_merges'] = long(row[5])
-            elif line.find('Hash table size ') == 0:
-                # In some versions of InnoDB, the used cells is omitted.
-                # Hash table size 4425293, used cells 4229064, ....
-                # Hash table size 57374437, node heap has 72964 buffer(s) <--
-                # no used cells
-                results['Innodb_hash_index_cells_total'] = long(row[3])
-                results['Innodb_hash_index_cells_used'] = long(
-                    row[6]) if line.find('used cells') > 0 else 0
-
-            # LOG
-            elif line.find(" log i/o's done, ") > 0:
-                # 3430041 log i/o's done, 17.44 log i/o's/second
-                # 520835887 log i/o's done, 17.28 log i/o's/second, 518724686
-                # syncs, 2980893 checkpoints
-                results['Innodb_log_writes'] = long(row[0])
-            elif line.find(" pending log writes, ") > 0:
-                # 0 pending log writes, 0 pending chkp writes
-                results['Innodb_pending_log_writes'] = long(row[0])
-                results['Innodb_pending_checkpoint_writes'] = long(row[4])
-            elif line.find("Log sequence number") == 0:
-                # This number is NOT printed in hex in InnoDB plugin.
-                # Log sequence number 272588624
-                results['Innodb_lsn_current'] = long(row[3])
-            elif line.find("Log flushed up to") == 0:
-                # This number is NOT printed in hex in InnoDB plugin.
-                # Log flushed up to   272588624
-                results['Innodb_lsn_flushed'] = long(row[4])
-            elif line.find("Last checkpoint at") == 0:
-                # Last checkpoint at  272588624
-                results['Innodb_lsn_last_checkpoint'] = long(row[3])
-
-            # BUFFER POOL AND MEMORY
-            elif line.find("Total memory allocated") == 0 and line.find("in additional pool allocated") > 0:
-                # Total memory allocated 29642194944; in additional pool allocated 0
-                # Total memory allocated by read views 96
-                results['Innodb_mem_total'] = long(row[3])
-                results['Innodb_mem_additional_pool'] = long(row[8])
-            elif line.find('Adaptive hash index ') == 0:
-                #   Adaptive hash index 1538240664     (186998824 + 1351241840)
-                results['Innodb_mem_adaptive_hash'] = long(row[3])
-            elif line.find('Page hash           ') == 0:
-                #   Page hash           11688584
-                results['Innodb_mem_page_hash'] = long(row[2])
-            elif line.find('Dictionary cache    ') == 0:
-                #   Dictionary cache    145525560      (140250984 + 5274576)
-                results['Innodb_mem_dictionary'] = long(row[2])
-            elif line.find('File system         ') == 0:
-                #   File system         313848         (82672 + 231176)
-                results['Innodb_mem_file_system'] = long(row[2])
-            elif line.find('Lock system         ') == 0:
-                #   Lock system         29232616       (29219368 + 13248)
-                results['Innodb_mem_lock_system'] = long(row[2])
-            elif line.find('Recovery system     ') == 0:
-                #   Recovery system     0      (0 + 0)
-                results['Innodb_mem_recovery_system'] = long(row[2])
-            elif line.find('Threads             ') == 0:
-                #   Threads             409336         (406936 + 2400)
-                results['Innodb_mem_thread_hash'] = long(row[1])
-            elif line.find("Buffer pool size ") == 0:
-                # The " " after size is necessary to avoid matching the wrong line:
-                # Buffer pool size        1769471
-                # Buffer pool size, bytes 28991012864
-                if buffer_id == -1:
-                    results['Innodb_buffer_pool_pages_total'] = long(row[3])
-            elif line.find("Free buffers") == 0:
-                # Free buffers            0
-                if buffer_id == -1:
-                    results['Innodb_buffer_pool_pages_free'] = long(row[2])
-            elif line.find("Database pages") == 0:
-                # Database pages          1696503
-                if buffer_id == -1:
-                    results['Innodb_buffer_pool_pages_data'] = long(row[2])
-
-            elif line.find("Modified db pages") == 0:
-                # Modified db pages       160602
-                if buffer_id == -1:
-                    results['Innodb_buffer_pool_pages_dirty'] = long(row[3])
-            elif line.find("Pages read ahead") == 0:
-                # Must do this BEFORE the next test, otherwise it'll get fooled by this
-                # line from the new plugin:
-                # Pages read ahead 0.00/s, evicted without access 0.06/s
-                pass
-            elif line.find("Pages read") == 0:
-                # Pages read 15240822, created 1770238, written 21705836
-                if buffer_id == -1:
-                    results['Innodb_pages_read'] = long(row[2])
-                    results['Innodb_pages_created'] = long(row[4])
-                    results['Innodb_pages_written'] = long(row[6])
-
-            # ROW OPERATIONS
-            elif line.find('Number of rows inserted') == 0:
-                # Number of rows inserted 50678311, updated 66425915, deleted
-                # 20605903, read 454561562
-                results['Innodb_rows_inserted'] = long(row[4])
-                results['Innodb_rows_updated'] = long(row[6])
-                results['Innodb_rows_deleted'] = long(row[8])
-                results['Innodb_rows_read'] = long(row[10])
-            elif line.find(" queries inside InnoDB, ") > 0:
-                # 0 queries inside InnoDB, 0 queries in queue
-                results['Innodb_queries_inside'] = long(row[0])
-                results['Innodb_queries_queued'] = long(row[4])
-
-            prev_line = line
+        results = parse_innodb_status(innodb_status_text, collect_transactions)
 
         # We need to calculate this metric separately
         try:
@@ -1274,71 +1111,46 @@ class MySql(AgentCheck):
         enabled = self._collect_string(var, results)
         return enabled and enabled.lower().strip() == 'on'
 
-    def _get_query_exec_time_95th_us(self, db):
-        # Fetches the 95th percentile query execution time and returns the value
-        # in microseconds
-        sql_95th_percentile = """SELECT `avg_us`, `ro` as `percentile` FROM
-            (SELECT `avg_us`, @rownum := @rownum + 1 as `ro` FROM
-                (SELECT ROUND(avg_timer_wait / 1000000) as `avg_us`
-                    FROM performance_schema.events_statements_summary_by_digest
-                    ORDER BY `avg_us` ASC) p,
-                (SELECT @rownum := 0) r) q
-            WHERE q.`ro` > ROUND(.95*@rownum)
-            ORDER BY `percentile` ASC
-            LIMIT 1"""
-
-        try:
-            with closing(db.cursor()) as cursor:
-                cursor.execute(sql_95th_percentile)
-
-                if cursor.rowcount < 1:
-                    self.warning("Failed to fetch records from the perf schema \
-                                 'events_statements_summary_by_digest' table.")
-                    return None
-
-                row = cursor.fetchone()
-                query_exec_time_95th_per = row[0]
-
-                return query_exec_time_95th_per
-        except (pymysql.err.InternalError, pymysql.err.OperationalError) as e:
-            self.warning("95th percentile performance metrics unavailable at this time: %s" % str(e))
-            return None
-
-    def _query_exec_time_per_schema(self, db):
-        # Fetches the avg query execution time per schema and returns the
-        # value in microseconds
+    def _get_digest_deltas(self, db, max_digests):
+        # Snapshots the statements summary by digest and returns what ran since
+        # the previous snapshot, see `DigestCollector`
+        sql_digests = """\
+            SELECT schema_name, digest, count_star, sum_timer_wait
+            FROM performance_schema.events_statements_summary_by_digest"""
 
-        sql_avg_query_run_time = """\
-            SELECT schema_name, ROUND((SUM(sum_timer_wait) / SUM(count_star)) / 1000000) AS avg_us
-            FROM performance_schema.events_statements_summary_by_digest
-            WHERE schema_name IS NOT NULL
-            GROUP BY schema_name"""
+        host_key = self._get_host_key()
+        collector = self._digest_collectors.get(host_key)
+        if collector is None or collector.max_digests != max_digests:
+            collector = self._digest_collectors[host_key] = DigestCollector(max_digests)
 
         try:
             with closing(db.cursor()) as cursor:
-                cursor.execute(sql_avg_query_run_time)
+                cursor.execute(sql_digests)
 
                 if cursor.rowcount < 1:
                     self.warning("Failed to fetch records from the perf schema \
                                  'events_statements_summary_by_digest' table.")
-                    return None
+                    return []
 
-                schema_query_avg_run_time = {}
-                for row in cursor.fetchall():
-                    schema_name = str(row[0])
-                    avg_us = long(row[1])
+                return collector.update(cursor.fetchall())
+        except (pymysql.err.InternalError, pymysql.err.OperationalError) as e:
+            self.warning("Digest performance metrics unavailable at this time: %s" % str(e))
+            return []
 
-                    # set the tag as the dictionary key
-                    schema_query_avg_run_time["schema:{0}".format(schema_name)] = avg_us
+    def _get_schema_size(self, db, interval):
+        # The sizes of the schemas are only queried every `interval` seconds,
+        # the cached result is reported in between
+        host_key = self._get_host_key()
+        timestamp, schema_size = self._schema_size_cache.get(host_key, (None, None))
+        if timestamp is None or time.time() - timestamp >= interval:
+            with self._timed_query('schema_size'):
+                schema_size = self._query_size_per_schema(db)
+            self._schema_size_cache[host_key] = (time.time(), schema_size)
 
-                return schema_query_avg_run_time
-        except (pymysql.err.InternalError, pymysql.err.OperationalError) as e:
-            self.warning("Avg exec time performance metrics unavailable at this time: %s" % str(e))
-            return None
+        return schema_size
 
     def _query_size_per_schema(self, db):
-        # Fetches the avg query execution time per schema and returns the
-        # value in microseconds
+        # Fetches the size of each schema and returns the value in megabytes
 
         sql_query_schema_size = """
         SELECT   table_schema,
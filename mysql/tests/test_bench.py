@@ -0,0 +1,28 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import os
+
+from datadog_checks.mysql.innodb_status import TRANSACTION_LIST_HEADER, parse_innodb_status
+from . import common
+
+with open(os.path.join(common.HERE, 'fixtures', 'innodb_status', 'mysql-5.7.txt'), 'r') as f:
+    INNODB_STATUS = f.read()
+
+# Make the list of the transactions as long as on a busy server, for the parsing to dominate
+head, transactions = INNODB_STATUS.split(TRANSACTION_LIST_HEADER)
+transactions, tail = transactions.split('--------\nFILE I/O\n--------')
+BUSY_INNODB_STATUS = (head + TRANSACTION_LIST_HEADER + transactions * 2000 +
+                      '--------\nFILE I/O\n--------' + tail)
+
+
+def test_innodb_status(benchmark):
+    benchmark(parse_innodb_status, INNODB_STATUS)
+
+
+def test_innodb_status_busy(benchmark):
+    benchmark(parse_innodb_status, BUSY_INNODB_STATUS)
+
+
+def test_innodb_status_busy_skip_transactions(benchmark):
+    benchmark(parse_innodb_status, BUSY_INNODB_STATUS, False)
@@ -0,0 +1,51 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import pytest
+
+from datadog_checks.mysql.digests import DigestCollector, avg_us_per_schema, avg_us_percentile
+
+
+@pytest.mark.unit
+def test_digest_deltas():
+    collector = DigestCollector()
+
+    assert collector.update([
+        ('testdb', 'a', 10, 10000000),
+        ('testdb', 'b', 5, 5000000),
+        (None, 'c', 1, 1000000),
+    ]) == []
+
+    deltas = collector.update([
+        ('testdb', 'a', 12, 16000000),
+        # nothing ran
+        ('testdb', 'b', 5, 5000000),
+        # reset
+        (None, 'c', 0, 0),
+        # new digest
+        ('mysql', 'd', 3, 3000000),
+    ])
+
+    assert deltas == [('testdb', 2, 6000000)]
+
+
+@pytest.mark.unit
+def test_digest_max_digests():
+    collector = DigestCollector(max_digests=2)
+
+    collector.update([('testdb', str(i), 1, i * 1000000) for i in range(5)])
+    deltas = collector.update([('testdb', str(i), 2, i * 2000000) for i in range(5)])
+
+    assert sorted(deltas) == [('testdb', 1, 3000000), ('testdb', 1, 4000000)]
+
+
+@pytest.mark.unit
+def test_digest_avg_us():
+    deltas = [('testdb', 1, i * 1000000) for i in range(1, 21)] + [('mysql', 4, 2000000), (None, 1, 1000000)]
+
+    assert avg_us_percentile([], 0.95) is None
+    assert avg_us_percentile(deltas, 0.95) == 20
+    assert avg_us_percentile(deltas[:1], 0.95) == 1
+
+    # 10.5 and 0.5 microseconds, rounded half up
+    assert avg_us_per_schema(deltas) == {'schema:testdb': 11, 'schema:mysql': 1}
@@ -0,0 +1,61 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import json
+import os
+
+import mock
+import pytest
+
+from datadog_checks.mysql import MySql
+from datadog_checks.mysql.innodb_status import TRANSACTION_METRICS, parse_innodb_status
+from . import common
+
+FIXTURES_DIR = os.path.join(common.HERE, 'fixtures', 'innodb_status')
+# Outputs of `SHOW ENGINE INNODB STATUS`, each with the results of the line by line parser it replaced
+DUMPS = sorted(f[:-len('.txt')] for f in os.listdir(FIXTURES_DIR) if f.endswith('.txt'))
+
+
+def read_dump(name):
+    with open(os.path.join(FIXTURES_DIR, name + '.txt'), 'r') as f:
+        return f.read()
+
+
+def get_innodb_status_results(text, collect_transactions=True):
+    mysql_check = MySql(common.CHECK_NAME, {}, {})
+    db = mock.MagicMock()
+    cursor = db.cursor.return_value
+    cursor.rowcount = 1
+    cursor.fetchone.return_value = ('InnoDB', '', text)
+
+    return mysql_check._get_stats_from_innodb_status(db, collect_transactions)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('name', DUMPS)
+def test_innodb_status_results(name):
+    with open(os.path.join(FIXTURES_DIR, name + '.json'), 'r') as f:
+        expected = json.load(f)
+
+    assert dict(get_innodb_status_results(read_dump(name))) == expected
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('name', DUMPS)
+def test_innodb_status_skip_transactions(name):
+    """
+    Only the metrics of the list of the transactions are missing when it isn't scanned
+    """
+    text = read_dump(name)
+    expected = {k: v for k, v in get_innodb_status_results(text).items() if k not in TRANSACTION_METRICS}
+
+    assert dict(get_innodb_status_results(text, collect_transactions=False)) == expected
+
+
+@pytest.mark.unit
+def test_innodb_status_unknown_sections():
+    text = read_dump('mysql-5.7').replace('ROW OPERATIONS', 'SOMETHING ELSE')
+    results = parse_innodb_status(text)
+
+    assert 'Innodb_rows_read' not in results
+    assert results['Innodb_history_list_length'] == 1427
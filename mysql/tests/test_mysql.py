@@ -3,10 +3,13 @@
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import copy
 import subprocess
+import time
+from contextlib import closing
 from os import environ
 
 import mock
 import psutil
+import pymysql
 import pytest
 
 from datadog_checks.base.utils.platform import Platform
@@ -34,6 +37,11 @@ def test_minimal_config(aggregator, instance_basic):
 @pytest.mark.usefixtures('dd_environment')
 def test_complex_config(aggregator, instance_complex):
     mysql_check = MySql(common.CHECK_NAME, {}, {}, instances=[instance_complex])
+    # The query run time metrics are computed from the statements run between two runs
+    _run_schema_queries()
+    mysql_check.check(instance_complex)
+    _run_schema_queries()
+    aggregator.reset()
     mysql_check.check(instance_complex)
 
     # Test service check
@@ -107,6 +115,15 @@ def test_complex_config(aggregator, instance_complex):
     aggregator.assert_all_metrics_covered()
 
 
+def _run_schema_queries():
+    passw = common.MARIA_ROOT_PASS if environ.get('MYSQL_FLAVOR') == 'mariadb' else ''
+    for schema, query in (('testdb', 'SELECT * FROM users'), ('mysql', 'SELECT COUNT(*) FROM user')):
+        conn = pymysql.connect(host=common.HOST, port=common.PORT, user='root', password=passw, db=schema)
+        with closing(conn.cursor()) as cursor:
+            cursor.execute(query)
+        conn.close()
+
+
 @pytest.mark.usefixtures('dd_environment')
 def test_connection_failure(aggregator, instance_error):
     """
@@ -233,3 +250,78 @@ def test__get_server_pid():
             # the pid should be none but without errors
             assert mysql_check._get_server_pid(None) is None
             assert mysql_check.log.exception.call_count == 0
+
+
+@pytest.mark.unit
+def test_persistent_connection():
+    """
+    Healthy connections are reused across runs, unhealthy or expired ones are closed and dropped.
+    """
+    mysql_check = MySql(common.CHECK_NAME, {}, {})
+    mysql_check._get_config({'server': common.HOST, 'port': common.PORT})
+    host_key = mysql_check._get_host_key()
+    assert mysql_check._get_persistent_connection(3600) is None
+
+    db = mock.MagicMock()
+    mysql_check._connections[host_key] = (db, time.time())
+    assert mysql_check._get_persistent_connection(3600) is db
+    db.ping.assert_called_once_with(reconnect=False)
+
+    db.ping.side_effect = pymysql.err.OperationalError(2013, 'Lost connection to MySQL server')
+    assert mysql_check._get_persistent_connection(3600) is None
+    db.close.assert_called_once_with()
+    assert mysql_check._connections == {}
+
+    db = mock.MagicMock()
+    mysql_check._connections[host_key] = (db, time.time() - 3600)
+    assert mysql_check._get_persistent_connection(3600) is None
+    db.close.assert_called_once_with()
+    assert db.ping.call_count == 0
+
+
+@pytest.mark.unit
+def test_new_connection_autocommit():
+    """
+    Connections are in autocommit mode, so that a persistent connection doesn't keep a transaction open.
+    """
+    mysql_check = MySql(common.CHECK_NAME, {}, {})
+    with mock.patch('pymysql.connect') as connect:
+        mysql_check._new_connection(common.HOST, common.PORT, '', 'user', 'pass', '', {}, 10)
+        mysql_check._new_connection(common.HOST, 0, '/tmp/mysql.sock', 'user', 'pass', '', {}, 10)
+        mysql_check._new_connection('', 0, '', '', '', '/etc/my.cnf', {}, 10)
+
+    assert [call[1]['autocommit'] for call in connect.call_args_list] == [True, True, True]
+
+
+@pytest.mark.unit
+def test_cancel():
+    """
+    All the persistent connections are closed.
+    """
+    mysql_check = MySql(common.CHECK_NAME, {}, {})
+    connections = [mock.MagicMock(), mock.MagicMock()]
+    connections[1].close.side_effect = pymysql.err.Error('Already closed')
+    mysql_check._connections = {'host1:3306': (connections[0], time.time()), 'host2:3306': (connections[1], 0)}
+
+    mysql_check.cancel()
+
+    for db in connections:
+        db.close.assert_called_once_with()
+    assert mysql_check._connections == {}
+
+
+@pytest.mark.unit
+def test_schema_size_interval():
+    """
+    The size of the schemas is only queried once per interval
+    """
+    mysql_check = MySql(common.CHECK_NAME, {}, {})
+    mysql_check._get_config({'server': common.HOST, 'port': common.PORT})
+    mysql_check._query_size_per_schema = mock.MagicMock(return_value={'schema:testdb': 1})
+
+    assert mysql_check._get_schema_size(None, 600) == {'schema:testdb': 1}
+    assert mysql_check._get_schema_size(None, 600) == {'schema:testdb': 1}
+    assert mysql_check._query_size_per_schema.call_count == 1
+
+    assert mysql_check._get_schema_size(None, 0) == {'schema:testdb': 1}
+    assert mysql_check._query_size_per_schema.call_count == 2
@@ -0,0 +1,130 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import threading
+
+from pyVmomi import vmodl  # pylint: disable=E0611
+
+
+class Inventory:
+    """
+    Keeps the raw inventory of a vCenter instance, i.e. mor --> {property_path: value},
+    in sync with a property filter left open on a dedicated property collector.
+
+    Every update only applies the changes reported by `WaitForUpdatesEx` since the
+    previous version. A full resync, starting over from an empty version, only
+    happens the first time, when the session changed or when vCenter doesn't know
+    about the version anymore.
+    """
+    def __init__(self, get_filter_spec, max_object_updates=None, log=None):
+        """
+        `get_filter_spec` is called with the server instance and returns the filter
+        spec to open on the property collector, its root object must be a view.
+        """
+        self._get_filter_spec = get_filter_spec
+        self._max_object_updates = max_object_updates or None
+        self._log = log
+        self._server_instance = None
+        self._collector = None
+        self._view = None
+        self._version = None
+        self.objects = {}
+        # Held for the whole update, so that only one worker updates the inventory at a time
+        self.lock = threading.Lock()
+
+    def update(self, server_instance):
+        """
+        Apply the pending updates to the inventory and return whether anything changed.
+        """
+        if server_instance is not self._server_instance:
+            self.resync(server_instance)
+
+        try:
+            return self._apply_updates()
+        except (vmodl.query.InvalidCollectorVersion, vmodl.fault.ManagedObjectNotFound) as e:
+            if self._log:
+                self._log.warning("Lost track of the inventory updates, running a full resync: %s", e)
+            self.resync(server_instance)
+            return self._apply_updates()
+
+    def resync(self, server_instance):
+        """
+        Open a new property filter and reset the inventory, the next update returns every object.
+        """
+        self.close()
+        filter_spec = self._get_filter_spec(server_instance)
+        self._view = filter_spec.objectSet[0].obj
+        self._collector = server_instance.content.propertyCollector.CreatePropertyCollector()
+        self._collector.CreateFilter(filter_spec, partialUpdates=False)
+        self._server_instance = server_instance
+        self._version = ''
+        self.objects = {}
+
+    def close(self):
+        """
+        Destroy the property collector, its filter and the view, if any.
+        """
+        for destroy in (
+            self._collector and self._collector.DestroyPropertyCollector,
+            self._view and self._view.DestroyView,
+        ):
+            if not destroy:
+                continue
+            try:
+                destroy()
+            except Exception as e:
+                # The session is likely gone, and the objects with it
+                if self._log:
+                    self._log.debug("Unable to destroy a property collector object: %s", e)
+
+        self._server_instance = None
+        self._collector = None
+        self._view = None
+        self._version = None
+
+    def _apply_updates(self):
+        options = vmodl.query.PropertyCollector.WaitOptions(
+            maxWaitSeconds=0, maxObjectUpdates=self._max_object_updates
+        )
+
+        changed = False
+        while True:
+            # Returns None right away when nothing changed since `version`
+            update_set = self._collector.WaitForUpdatesEx(self._version, options)
+            if update_set is None:
+                break
+
+            self._version = update_set.version
+            for filter_update in update_set.filterSet:
+                for object_update in filter_update.objectSet:
+                    self._apply_object_update(object_update)
+                    changed = True
+
+            # Large updates are split across several calls
+            if not update_set.truncated:
+                break
+
+        return changed
+
+    def _apply_object_update(self, object_update):
+        obj = object_update.obj
+        if object_update.kind == 'leave':
+            self.objects.pop(obj, None)
+            return
+
+        if object_update.kind == 'enter' or obj not in self.objects:
+            self.objects[obj] = {}
+
+        properties = self.objects[obj]
+        for change in object_update.changeSet:
+            # Without partial updates, changes always replace the whole property
+            if change.op in ('remove', 'indirectRemove'):
+                properties.pop(change.name, None)
+            else:
+                properties[change.name] = change.val
+
+        if object_update.missingSet and self._log:
+            for missing in object_update.missingSet:
+                self._log.error(
+                    "Unable to retrieve property {} for object {}: {}".format(missing.path, obj, missing.fault)
+                )
@@ -58,6 +58,16 @@ class MetadataCache:
         with self._lock:
             return self._metric_ids[key]
 
+    def get_instance_metadata(self, key):
+        """
+        Return the whole counter ID --> metadata mapping for the given instance key.
+        The mapping is replaced by `set_metadata`, never modified, so it can be used
+        without locking.
+        If the key is not in the cache, raises a KeyError.
+        """
+        with self._lock:
+            return self._metadata[key]
+
     def get_metadata(self, key, counter_id):
         """
         Return the metadata for the metric identified by `counter_id` for the given instance key.
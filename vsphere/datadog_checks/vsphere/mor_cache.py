@@ -9,10 +9,39 @@ class MorNotFoundError(Exception):
     pass
 
 
+class MorGeneration:
+    """
+    Immutable set of Mor objects for one instance: mor_name --> mor_dict_object.
+    Neither the dict nor the Mor objects it contains are modified once the
+    generation is published, a change builds a new generation instead.
+    """
+    def __init__(self, mors=None):
+        self.mors = mors or {}
+        self.oldest = min(mor['creation_time'] for mor in self.mors.itervalues()) if self.mors else None
+        self._batches = {}
+
+    def batches(self, batch_size):
+        """
+        Return the lists of `(mor_name, mor)` tuples of at most `batch_size`
+        items, sorted by name. Computed once per batch size.
+        """
+        batches = self._batches.get(batch_size)
+        if batches is None:
+            items = sorted(self.mors.iteritems())
+            batches = [items[idx:idx + batch_size] for idx in range(0, len(items), batch_size)]
+            # Concurrent readers may compute the same batches, either one can be kept
+            self._batches[batch_size] = batches
+        return batches
+
+
 class MorCache:
     """
     Implements a thread safe storage for Mor objects.
     For each instance key, the cache maps: mor_name --> mor_dict_object
+
+    Readers don't lock: they get the current generation of the instance, which
+    never changes. Writers build a new generation and publish it by replacing
+    the previous one, they are serialized by a lock.
     """
     def __init__(self):
         self._mor = {}
@@ -25,31 +54,47 @@ class MorCache:
         """
         with self._mor_lock:
             if key not in self._mor:
-                self._mor[key] = {}
+                self._mor[key] = MorGeneration()
 
     def contains(self, key):
         """
         Return whether an instance key is present.
         """
-        with self._mor_lock:
-            return key in self._mor
+        return key in self._mor
 
     def instance_size(self, key):
         """
         Return how many Mor objects are stored for the given instance.
         If the key is not in the cache, raises a KeyError.
         """
-        with self._mor_lock:
-            return len(self._mor[key])
+        return len(self._mor[key].mors)
 
     def set_mor(self, key, name, mor):
         """
         Store a Mor object in the cache with the given name.
         If the key is not in the cache, raises a KeyError.
         """
+        self.set_mors(key, [(name, mor)])
+
+    def set_mors(self, key, mors):
+        """
+        Store the `(name, mor)` Mor objects in the cache, at once.
+        If the key is not in the cache, raises a KeyError.
+        """
+        now = time.time()
         with self._mor_lock:
-            self._mor[key][name] = mor
-            self._mor[key][name]['creation_time'] = time.time()
+            new_mors = dict(self._mor[key].mors)
+            for name, mor in mors:
+                mor['creation_time'] = now
+                new_mors[name] = mor
+            self._mor[key] = MorGeneration(new_mors)
+
+    def get_generation(self, key):
+        """
+        Return the current generation of Mor objects for the given instance key.
+        If the key is not in the cache, raises a KeyError.
+        """
+        return self._mor[key]
 
     def get_mor(self, key, name):
         """
@@ -57,12 +102,11 @@ class MorCache:
         If the key is not in the cache, raises a KeyError.
         If there's no Mor with the given name, raises a MorNotFoundError.
         """
-        with self._mor_lock:
-            mors = self._mor[key]
-            try:
-                return mors[name]
-            except KeyError:
-                raise MorNotFoundError("Mor object '{}' is not in the cache.".format(name))
+        mors = self._mor[key].mors
+        try:
+            return mors[name]
+        except KeyError:
+            raise MorNotFoundError("Mor object '{}' is not in the cache.".format(name))
 
     def set_metrics(self, key, name, metrics):
         """
@@ -71,41 +115,55 @@ class MorCache:
         If the key is not in the cache, raises a KeyError.
         If the Mor object is not in the cache, raises a MorNotFoundError
         """
+        missing = self.set_metrics_batch(key, {name: metrics})
+        if missing:
+            raise MorNotFoundError("Mor object '{}' is not in the cache.".format(name))
+
+    def set_metrics_batch(self, key, metrics_by_name):
+        """
+        Store the lists of metric identifiers of several Mor objects at once,
+        given as a dict mapping Mor object name --> metrics.
+        Return the names of the Mor objects that are not in the cache.
+        If the key is not in the cache, raises a KeyError.
+        """
+        missing = []
         with self._mor_lock:
-            mor = self._mor[key].get(name)
-            if mor is None:
-                raise MorNotFoundError("Mor object '{}' is not in the cache.".format(name))
-            mor['metrics'] = metrics
+            new_mors = dict(self._mor[key].mors)
+            for name, metrics in metrics_by_name.iteritems():
+                mor = new_mors.get(name)
+                if mor is None:
+                    missing.append(name)
+                    continue
+                new_mors[name] = dict(mor, metrics=metrics)
+            self._mor[key] = MorGeneration(new_mors)
+        return missing
 
     def mors(self, key):
         """
         Generator returning all the mors in the cache for the given instance key.
         """
-        with self._mor_lock:
-            for k, v in self._mor.get(key, {}).iteritems():
-                yield k, v
+        generation = self._mor.get(key)
+        if generation is None:
+            return
+        for k, v in generation.mors.iteritems():
+            yield k, v
 
     def mors_batch(self, key, batch_size):
         """
-        Generator returning as many dictionaries containing `batch_size` Mor
-        objects as needed to iterate all the content of the cache. This has
-        to be iterated twice, like:
+        Return as many lists of at most `batch_size` `(name, mor)` tuples as
+        needed to iterate all the content of the cache. This has to be iterated
+        twice, like:
 
             for batch in cache.mors_batch('key', 100):
                 for name, mor in batch:
                     # use the Mor object here
-        """
-        with self._mor_lock:
-            mors_dict = self._mor.get(key)
-            if mors_dict is None:
-                yield {}
 
-            mor_names = mors_dict.keys()
-            mor_names.sort()
-            total = len(mor_names)
-            for idx in range(0, total, batch_size):
-                names_chunk = mor_names[idx:min(idx + batch_size, total)]
-                yield {name: mors_dict[name] for name in names_chunk}
+        The batches are computed once per generation, they must not be modified.
+        """
+        generation = self._mor.get(key)
+        if generation is None:
+            return []
+        return generation.batches(batch_size)
 
     def purge(self, key, ttl):
         """
@@ -113,16 +171,27 @@ class MorCache:
         ttl seconds.
         If the key is not in the cache, raises a KeyError.
         """
-        mors_to_purge = []
         now = time.time()
         with self._mor_lock:
-            # Don't change the dict during iteration!
-            # First collect the names of the Mors to remove...
-            for name, mor in self._mor[key].iteritems():
-                age = now - mor['creation_time']
-                if age > ttl:
-                    mors_to_purge.append(name)
-
-            # ...then actually remove the Mors from the cache.
-            for name in mors_to_purge:
-                del self._mor[key][name]
+            generation = self._mor[key]
+            # Nothing to purge, keep the current generation
+            if generation.oldest is None or now - generation.oldest <= ttl:
+                return
+            self._mor[key] = MorGeneration({
+                name: mor for name, mor in generation.mors.iteritems() if now - mor['creation_time'] <= ttl
+            })
+
+    def purge_missing(self, key, names):
+        """
+        Remove all the items in the cache for the given key whose name is not
+        in `names`.
+        If the key is not in the cache, raises a KeyError.
+        """
+        names = set(names)
+        with self._mor_lock:
+            generation = self._mor[key]
+            if names.issuperset(generation.mors):
+                return
+            self._mor[key] = MorGeneration({
+                name: mor for name, mor in generation.mors.iteritems() if name in names
+            })
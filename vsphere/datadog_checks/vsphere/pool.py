@@ -0,0 +1,308 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import deque
+from itertools import count
+from Queue import Empty
+import logging
+import threading
+import time
+
+from datadog_checks.checks.libs.timer import Timer
+
+# Job priorities, lowest first
+PRIORITY_REALTIME = 0
+PRIORITY_INVENTORY = 1
+PRIORITY_HISTORICAL = 2
+
+# Priority of the items telling a worker to stop, ahead of any job
+_STOP_PRIORITY = -1
+
+# Number of seconds after which a job goes ahead of the jobs of higher priority, so that
+# the historical jobs aren't starved when the realtime jobs keep the workers busy
+DEFAULT_AGING_DELAY = 60
+
+# Weight of the latest job in the moving average of the job latency
+LATENCY_SMOOTHING = 0.2
+# Stop growing, and shrink, when the average job latency got this much worse than before the last growth:
+# the workers are then waiting on vCenter rather than on each other
+LATENCY_DEGRADATION = 1.5
+
+log = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    A function to run in the pool, with its priority and optional deadline.
+    A job that didn't start before its deadline, or that was cancelled, is dropped.
+    """
+    def __init__(self, func, args, priority, deadline):
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.deadline = deadline
+        self.queued = time.time()
+        self.started = False
+        self.cancelled = False
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """
+        Cancel the job if it didn't start yet, return whether it was cancelled.
+        """
+        with self._lock:
+            if not self.started:
+                self.cancelled = True
+            return self.cancelled
+
+    def pending(self):
+        """
+        Return whether the job is waiting to start and will still run.
+        """
+        with self._lock:
+            return not (self.started or self.cancelled or self._expired())
+
+    def start(self):
+        """
+        Mark the job as started, return False if it must be dropped instead.
+        """
+        with self._lock:
+            if self.cancelled or self._expired():
+                return False
+            self.started = True
+            return True
+
+    def _expired(self):
+        return self.deadline is not None and time.time() > self.deadline
+
+
+class AgingQueue:
+    """
+    Queue of items by priority, lowest first, and by order of arrival within a priority.
+
+    An item that waited more than `aging_delay` seconds goes ahead of the items of higher
+    priority, the oldest first, so that a constant flow of items of high priority doesn't
+    starve the others. The items of negative priority always go first.
+    """
+    def __init__(self, aging_delay=DEFAULT_AGING_DELAY):
+        self.aging_delay = aging_delay
+        # priority -> deque of (time of arrival, item)
+        self._queues = {}
+        self._size = 0
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def put(self, priority, item):
+        with self._not_empty:
+            queue = self._queues.get(priority)
+            if queue is None:
+                queue = self._queues[priority] = deque()
+            queue.append((time.time(), item))
+            self._size += 1
+            self._not_empty.notify()
+
+    def get(self):
+        """
+        Remove and return the next item, waiting for one if the queue is empty.
+        """
+        with self._not_empty:
+            while not self._size:
+                self._not_empty.wait()
+            return self._pop()
+
+    def get_nowait(self):
+        """
+        Remove and return the next item, raise `Empty` if the queue is empty.
+        """
+        with self._not_empty:
+            if not self._size:
+                raise Empty
+            return self._pop()
+
+    def qsize(self):
+        with self._not_empty:
+            return self._size
+
+    def count(self, predicate):
+        """
+        Return the number of queued items for which `predicate(item)` is true.
+        """
+        with self._not_empty:
+            return sum(1 for queue in self._queues.values() for _, item in queue if predicate(item))
+
+    def _pop(self):
+        queues = [(priority, queue) for priority, queue in sorted(self._queues.items()) if queue]
+        next_queue = queues[0][1]
+        if queues[0][0] >= 0:
+            aged_before = time.time() - self.aging_delay
+            aged = [queue for _, queue in queues if queue[0][0] < aged_before]
+            if aged:
+                next_queue = min(aged, key=lambda queue: queue[0][0])
+
+        self._size -= 1
+        return next_queue.popleft()[1]
+
+
+class AdaptivePool:
+    """
+    Pool of worker threads processing jobs by priority, whose number of workers
+    varies between `min_workers` and `max_workers`. A job waiting for more than
+    `aging_delay` seconds goes ahead of the jobs of higher priority, see `AgingQueue`.
+
+    `adjust` is meant to be called at a regular interval, e.g. every check run:
+    it adds a worker when jobs are still waiting from the previous interval, unless
+    the average job latency degraded since the last addition, and removes one when a
+    worker stayed idle during the whole interval or when the latency degraded.
+    """
+    def __init__(self, min_workers, max_workers, name="Pool", aging_delay=DEFAULT_AGING_DELAY):
+        self.min_workers = max(min_workers, 1)
+        self.max_workers = max(max_workers, self.min_workers)
+        self.name = name
+        self._queue = AgingQueue(aging_delay)
+        self._lock = threading.Lock()
+        self._workers = []
+        # Number of workers once the pending stop items are processed
+        self._size = 0
+        self._worker_ids = count()
+        self._closed = False
+
+        # Statistics, reset by `get_stats`
+        self._busy = 0
+        self._max_busy = 0
+        self._dropped = 0
+        self._latencies = []
+        self._waits = []
+        # Moving average of the job latency, and its value before the last addition of a worker
+        self.latency = None
+        self._latency_before_growth = None
+
+        for _ in range(self.min_workers):
+            self._add_worker()
+
+    def apply_async(self, func, args=(), priority=PRIORITY_INVENTORY, deadline=None):
+        """
+        Queue `func(*args)` and return its Job. `deadline` is a timestamp after which the
+        job is dropped if it didn't start yet.
+        """
+        assert not self._closed
+        job = Job(func, args, priority, deadline)
+        self._queue.put(priority, job)
+        return job
+
+    def qsize(self):
+        """
+        Return the number of queued jobs that will run, the cancelled or expired ones
+        staying in the queue until a worker drops them.
+        """
+        return self._queue.count(lambda job: job is not None and job.pending())
+
+    def get_nworkers(self):
+        with self._lock:
+            return len(self._workers)
+
+    def adjust(self):
+        """
+        Add or remove a worker depending on the queue depth and the job latency since the
+        previous call, return the number of workers.
+        """
+        with self._lock:
+            nworkers = self._size
+            max_busy, self._max_busy = self._max_busy, self._busy
+            degraded = (
+                self.latency is not None and self._latency_before_growth is not None and
+                self.latency > self._latency_before_growth * LATENCY_DEGRADATION
+            )
+
+        if not self._closed:
+            if self.qsize() and not degraded and nworkers < self.max_workers:
+                self._latency_before_growth = self.latency
+                self._add_worker()
+                nworkers += 1
+            elif (degraded or max_busy < nworkers) and nworkers > self.min_workers:
+                if degraded:
+                    # Don't grow again until the latency gets back to what it was before the growth
+                    self._latency_before_growth = self.latency / LATENCY_DEGRADATION
+                self._remove_worker()
+                nworkers -= 1
+
+        return nworkers
+
+    def get_stats(self):
+        """
+        Return the job latencies and the time the jobs spent in the queue, in seconds, along
+        with the number of dropped jobs since the previous call.
+        """
+        with self._lock:
+            stats = self._latencies, self._waits, self._dropped
+            self._latencies, self._waits, self._dropped = [], [], 0
+        return stats
+
+    def terminate(self):
+        """
+        Drop the queued jobs and stop the workers once they're done with their current job.
+        """
+        self._closed = True
+        try:
+            while True:
+                self._queue.get_nowait()
+        except Empty:
+            pass
+
+        with self._lock:
+            nworkers = self._size
+        for _ in range(nworkers):
+            self._remove_worker()
+
+    def join(self):
+        for worker in list(self._workers):
+            worker.join()
+
+    def _add_worker(self):
+        worker = threading.Thread(target=self._work, name="{}-{}".format(self.name, next(self._worker_ids)))
+        worker.daemon = True
+        with self._lock:
+            self._workers.append(worker)
+            self._size += 1
+        worker.start()
+
+    def _remove_worker(self):
+        with self._lock:
+            self._size -= 1
+        self._queue.put(_STOP_PRIORITY, None)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+
+            if not job.start():
+                with self._lock:
+                    self._dropped += 1
+                job.done.set()
+                continue
+
+            with self._lock:
+                self._busy += 1
+                self._max_busy = max(self._max_busy, self._busy)
+            wait = time.time() - job.queued
+            t = Timer()
+            try:
+                job.func(*job.args)
+            except Exception:
+                # Jobs are expected to handle their errors, don't let the worker die
+                log.exception("Uncaught exception in a job of the pool %s", self.name)
+            latency = t.total()
+            job.done.set()
+
+            with self._lock:
+                self._busy -= 1
+                self._latencies.append(latency)
+                self._waits.append(wait)
+                if self.latency is None:
+                    self.latency = latency
+                else:
+                    self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+        with self._lock:
+            self._workers.remove(threading.current_thread())
@@ -19,7 +19,6 @@ from datadog_checks.config import is_affirmative
 from datadog_checks.checks import AgentCheck
 from datadog_checks.checks.libs.vmware.basic_metrics import BASIC_METRICS
 from datadog_checks.checks.libs.vmware.all_metrics import ALL_METRICS
-from datadog_checks.checks.libs.thread_pool import Pool
 from datadog_checks.checks.libs.timer import Timer
 from datadog_checks.utils.common import ensure_bytes
 from .common import SOURCE_TYPE
@@ -27,8 +26,10 @@ from .event import VSphereEvent
 from .errors import BadConfigError, ConnectionError
 from .cache_config import CacheConfig
 from .objects_queue import ObjectsQueue
+from .inventory import Inventory
+from .pool import AdaptivePool, PRIORITY_HISTORICAL, PRIORITY_INVENTORY, PRIORITY_REALTIME
 from .mor_cache import MorCache, MorNotFoundError
-from .metadata_cache import MetadataCache, MetadataNotFoundError
+from .metadata_cache import MetadataCache
 try:
     # Agent >= 6.0: the check pushes tags invoking `set_external_tags`
     from datadog_agent import set_external_tags
@@ -39,10 +40,14 @@ except ImportError:
 
 # Default vCenter sampling interval
 REAL_TIME_INTERVAL = 20
+# Default interval of the historical metrics, i.e. of the non realtime resources
+HISTORICAL_INTERVAL = 5 * 60
 # Metrics are only collected on vSphere VMs marked by custom field value
 VM_MONITORING_FLAG = 'DatadogMonitored'
-# The size of the ThreadPool used to process the request queue
+# The minimum size of the ThreadPool used to process the request queue
 DEFAULT_SIZE_POOL = 4
+# The size up to which the ThreadPool can grow when jobs pile up
+DEFAULT_MAX_SIZE_POOL = 8
 # The interval in seconds between two refresh of the entities list
 REFRESH_MORLIST_INTERVAL = 3 * 60
 # The interval in seconds between two refresh of metrics metadata (id<->name)
@@ -78,6 +83,20 @@ SHORT_ROLLUP = {
 }
 
 
+def _transform_none(value):
+    return value
+
+
+def _transform_percent(value):
+    return float(value) / 100
+
+
+# Pre-reporting transformation of the values, by vsphere unit of the counter
+UNIT_TRANSFORMS = {
+    "percent": _transform_percent,
+}
+
+
 def trace_method(method):
     """
     Decorator to catch and print the exceptions that happen within async tasks.
@@ -117,6 +136,7 @@ class VSphereCheck(AgentCheck):
                                           self.refresh_morlist_interval)
         self.refresh_metrics_metadata_interval = init_config.get('refresh_metrics_metadata_interval',
                                                                  REFRESH_METRICS_METADATA_INTERVAL)
+        self.incremental_morlist = is_affirmative(init_config.get('incremental_morlist', False))
 
         # Connections open to vCenter instances
         self.server_instances = {}
@@ -137,15 +157,29 @@ class VSphereCheck(AgentCheck):
             # events
             self.event_config[i_key] = instance.get('event_config')
 
+        # Jobs of the latest runs, to avoid running the same discovery twice at the same time
+        # and to drop the metric collection jobs that were superseded by a new run
+        self.inventory_jobs = {}
+        self.collection_jobs = {}
+
         # Queue of raw Mor objects to process
         self.mor_objects_queue = ObjectsQueue()
 
         # Cache of processed Mor objects
         self.mor_cache = MorCache()
 
+        # Query specs compiled from the Mor cache, for each instance keeps:
+        # - mor_name -> (mor, metric_ids, query_spec), to reuse the query spec of the Mors that didn't change
+        # - the batches of query specs of the current Mor cache generation and metric ids
+        self.query_specs = {}
+        self.query_spec_batches = {}
+
         # managed entity raw view
         self.registry = {}
 
+        # Raw inventories kept up to date with the property collector updates, in incremental mode
+        self.inventories = {}
+
         # Metrics metadata, for each instance keeps the mapping: perfCounterKey -> {name, group, description}
         self.metadata_cache = MetadataCache()
         self.latest_event_query = {}
@@ -153,8 +187,9 @@ class VSphereCheck(AgentCheck):
     def start_pool(self):
         self.log.info("Starting Thread Pool")
         self.pool_size = int(self.init_config.get('threads_count', DEFAULT_SIZE_POOL))
+        max_pool_size = int(self.init_config.get('max_threads_count', max(DEFAULT_MAX_SIZE_POOL, self.pool_size)))
 
-        self.pool = Pool(self.pool_size)
+        self.pool = AdaptivePool(self.pool_size, max_pool_size, name="VSphere")
         self.pool_started = True
 
     def stop_pool(self):
@@ -358,16 +393,16 @@ class VSphereCheck(AgentCheck):
 
         return tags
 
-    def _collect_mors_and_attributes(self, server_instance):
+    def _get_filter_spec(self, server_instance):
+        """
+        Return the property filter spec selecting the objects of the infrastructure and
+        the attributes we require, from a new view of the vCenter `rootFolder`.
+        """
         resources = RESOURCE_TYPE_METRICS + RESOURCE_TYPE_NO_METRIC
 
         content = server_instance.content
         view_ref = content.viewManager.CreateContainerView(content.rootFolder, resources, True)
 
-        # Object used to query MORs as well as the attributes we require in one API call
-        # See https://code.vmware.com/apis/358/vsphere#/doc/vmodl.query.PropertyCollector.html
-        collector = content.propertyCollector
-
         # Specify the root object from where we collect the rest of the objects
         obj_spec = vmodl.query.PropertyCollector.ObjectSpec()
         obj_spec.obj = view_ref
@@ -397,6 +432,14 @@ class VSphereCheck(AgentCheck):
         filter_spec.objectSet = [obj_spec]
         filter_spec.propSet = property_specs
 
+        return filter_spec
+
+    def _collect_mors_and_attributes(self, server_instance):
+        # Object used to query MORs as well as the attributes we require in one API call
+        # See https://code.vmware.com/apis/358/vsphere#/doc/vmodl.query.PropertyCollector.html
+        collector = server_instance.content.propertyCollector
+        filter_spec = self._get_filter_spec(server_instance)
+
         retr_opts = vmodl.query.PropertyCollector.RetrieveOptions()
         # To limit the number of objects retrieved per call.
         # If batch_collector_size is 0, collect maximum number of objects.
@@ -432,7 +475,8 @@ class VSphereCheck(AgentCheck):
         regexes=None,
         include_only_marked=False,
         tags=None,
-        use_guest_hostname=False
+        use_guest_hostname=False,
+        all_objects=None
     ):
         """
         Explore vCenter infrastructure to discover hosts, virtual machines, etc.
@@ -455,6 +499,9 @@ class VSphereCheck(AgentCheck):
 
         If it's a node we want to query metric for, it will be enqueued at the
         instance level and will be processed by a subsequent job.
+
+        The objects and their attributes are collected from vCenter, unless
+        given in `all_objects`.
         """
         start = time.time()
         if tags is None:
@@ -462,7 +509,10 @@ class VSphereCheck(AgentCheck):
         obj_list = defaultdict(list)
 
         # Collect objects and their attributes
-        all_objects = self._collect_mors_and_attributes(server_instance)
+        if all_objects is None:
+            all_objects = self._collect_mors_and_attributes(server_instance)
+        else:
+            all_objects = dict(all_objects)
 
         # Add rootFolder since it is not explored by the propertyCollector
         rootFolder = server_instance.content.rootFolder
@@ -545,6 +595,49 @@ class VSphereCheck(AgentCheck):
                                       use_guest_hostname=use_guest_hostname)
         self.mor_objects_queue.fill(i_key, dict(all_objs))
 
+    @trace_method
+    def _cache_morlist_incremental_async(self, instance, inventory, tags, regexes=None, include_only_marked=False):
+        """
+        Apply the inventory updates since the previous run, and fill the queue with the
+        objects that are new or whose hostname or tags changed. Objects gone from the
+        inventory are removed from the Mor cache right away.
+        """
+        # Only one worker at a time applies the updates, the others have nothing to do
+        if not inventory.lock.acquire(False):
+            self.log.debug("The inventory is still being updated by another job, skipping")
+            return
+
+        try:
+            i_key = self._instance_key(instance)
+            server_instance = self._get_server_instance(instance)
+            if not inventory.update(server_instance):
+                self.log.debug(b"No inventory updates for vcenter instance {}".format(i_key))
+                return
+
+            use_guest_hostname = is_affirmative(instance.get("use_guest_hostname", False))
+            all_objs = self._get_all_objs(server_instance, regexes, include_only_marked, tags,
+                                          use_guest_hostname=use_guest_hostname, all_objects=inventory.objects)
+        finally:
+            inventory.lock.release()
+
+        changed_objs = defaultdict(list)
+        mor_names = set()
+        for resource_type, mors in all_objs.iteritems():
+            for mor in mors:
+                mor_name = str(mor['mor'])
+                mor_names.add(mor_name)
+                try:
+                    cached_mor = self.mor_cache.get_mor(i_key, mor_name)
+                except (KeyError, MorNotFoundError):
+                    changed_objs[resource_type].append(mor)
+                    continue
+                if cached_mor['hostname'] != mor['hostname'] or cached_mor['tags'] != mor['tags']:
+                    changed_objs[resource_type].append(mor)
+
+        if self.mor_cache.contains(i_key):
+            self.mor_cache.purge_missing(i_key, mor_names)
+        self.mor_objects_queue.fill(i_key, dict(changed_objs))
+
     @staticmethod
     def _is_excluded(obj, properties, regexes, include_only_marked):
         """
@@ -590,6 +683,12 @@ class VSphereCheck(AgentCheck):
         i_key = self._instance_key(instance)
         self.log.debug(b"Caching the morlist for vcenter instance {}".format(i_key))
 
+        # If the previous discovery didn't complete yet, don't do anything
+        job = self.inventory_jobs.get(i_key)
+        if job is not None and not job.done.is_set():
+            self.log.debug("Skipping morlist collection: the previous one is still running")
+            return
+
         # If the queue is not completely empty, don't do anything
         for resource_type in RESOURCE_TYPE_METRICS:
             if self.mor_objects_queue.contains(i_key) and self.mor_objects_queue.size(i_key, resource_type):
@@ -607,10 +706,20 @@ class VSphereCheck(AgentCheck):
         include_only_marked = is_affirmative(instance.get('include_only_marked', False))
 
         # Discover hosts and virtual machines
-        self.pool.apply_async(
-            self._cache_morlist_raw_async,
-            args=(instance, [instance_tag], regexes, include_only_marked)
-        )
+        if self.incremental_morlist:
+            if i_key not in self.inventories:
+                self.inventories[i_key] = Inventory(self._get_filter_spec, self.batch_collector_size, self.log)
+            self.inventory_jobs[i_key] = self.pool.apply_async(
+                self._cache_morlist_incremental_async,
+                args=(instance, self.inventories[i_key], [instance_tag], regexes, include_only_marked),
+                priority=PRIORITY_INVENTORY
+            )
+        else:
+            self.inventory_jobs[i_key] = self.pool.apply_async(
+                self._cache_morlist_raw_async,
+                args=(instance, [instance_tag], regexes, include_only_marked),
+                priority=PRIORITY_INVENTORY
+            )
 
         self.cache_config.set_last(CacheConfig.Morlist, i_key, time.time())
 
@@ -628,14 +737,15 @@ class VSphereCheck(AgentCheck):
         # For non realtime metrics, we need to specifically ask which counters are available for which entity,
         # so we call perfManager.QueryAvailablePerfMetric for each cluster, datacenter, datastore
         # This should be okay since the number of such entities shouldn't be excessively large
+        metrics_by_name = {}
         for mor in mors:
             mor_name = str(mor['mor'])
             available_metrics = {m.counterId for m in perfManager.QueryAvailablePerfMetric(entity=mor["mor"])}
-            try:
-                self.mor_cache.set_metrics(i_key, mor_name, self._compute_needed_metrics(instance, available_metrics))
-            except MorNotFoundError:
-                self.log.error("Object '{}' is missing from the cache, skipping. ".format(mor_name))
-                continue
+            metrics_by_name[mor_name] = self._compute_needed_metrics(instance, available_metrics)
+
+        # Store the metrics of the whole batch at once
+        for mor_name in self.mor_cache.set_metrics_batch(i_key, metrics_by_name):
+            self.log.error("Object '{}' is missing from the cache, skipping. ".format(mor_name))
 
         # TEST-INSTRUMENTATION
         self.histogram('datadog.agent.vsphere.morlist_process_atomic.time', time.time() - t,
@@ -653,6 +763,12 @@ class VSphereCheck(AgentCheck):
             self.log.debug(b"Objects queue is not initialized yet for instance {}, skipping processing".format(i_key))
             return
 
+        custom_tags = instance.get('tags', [])
+
+        # All the Mors popped from the queue are published in the cache at once,
+        # before the jobs needing them are scheduled
+        new_mors = []
+        batches = []
         for resource_type in RESOURCE_TYPE_METRICS:
             # Batch size can prevent querying large payloads at once if the environment is too large
             # If batch size is set to 0, process everything at once
@@ -667,9 +783,11 @@ class VSphereCheck(AgentCheck):
 
                     mor_name = str(mor['mor'])
                     mor['interval'] = REAL_TIME_INTERVAL if mor['mor_type'] in REALTIME_RESOURCES else None
+                    # Tags of the metrics, but the `instance` one
+                    mor['metric_tags'] = (mor['tags'] if not mor['hostname'] else []) + custom_tags
                     # Always update the cache to account for Mors that might have changed parent
                     # in the meantime (e.g. a migrated VM).
-                    self.mor_cache.set_mor(i_key, mor_name, mor)
+                    new_mors.append((mor_name, mor))
 
                     # Only do this for non real-time resources i.e. datacenter, datastore and cluster
                     # For hosts and VMs, we can rely on a precomputed list of metrics
@@ -677,9 +795,16 @@ class VSphereCheck(AgentCheck):
                     if mor["mor_type"] not in REALTIME_RESOURCES and not realtime_only:
                         mors.append(mor)
 
-                # We will actually schedule jobs for non realtime resources only.
                 if mors:
-                    self.pool.apply_async(self._process_mor_objects_queue_async, args=(instance, mors))
+                    batches.append(mors)
+
+        if new_mors:
+            self.mor_cache.set_mors(i_key, new_mors)
+
+        # We will actually schedule jobs for non realtime resources only.
+        for mors in batches:
+            self.pool.apply_async(self._process_mor_objects_queue_async, args=(instance, mors),
+                                  priority=PRIORITY_HISTORICAL)
 
     def _cache_metrics_metadata(self, instance):
         """
@@ -703,20 +828,15 @@ class VSphereCheck(AgentCheck):
         if self.in_compatibility_mode(instance, log_warning=True):
             for counter in perfManager.perfCounter:
                 metric_name = self.format_metric_name(counter, compatibility=True)
-                new_metadata[counter.key] = {
-                    'name': metric_name,
-                    'unit': counter.unitInfo.key,
-                }
+                new_metadata[counter.key] = self._counter_metadata(metric_name, counter.unitInfo.key)
                 # Build the list of metrics we will want to collect
                 if instance.get("all_metrics") or metric_name in BASIC_METRICS:
                     metric_ids.append(vim.PerformanceManager.MetricId(counterId=counter.key, instance="*"))
         else:
             collection_level = instance.get("collection_level", 1)
             for counter in perfManager.QueryPerfCounterByLevel(collection_level):
-                new_metadata[counter.key] = {
-                    "name": self.format_metric_name(counter),
-                    "unit": counter.unitInfo.key
-                }
+                new_metadata[counter.key] = self._counter_metadata(self.format_metric_name(counter),
+                                                                   counter.unitInfo.key)
                 # Build the list of metrics we will want to collect
                 metric_ids.append(vim.PerformanceManager.MetricId(counterId=counter.key, instance="*"))
 
@@ -731,6 +851,19 @@ class VSphereCheck(AgentCheck):
         self.histogram('datadog.agent.vsphere.metric_metadata_collection.time', t.total(), tags=custom_tags)
         # ## </TEST-INSTRUMENTATION>
 
+    @staticmethod
+    def _counter_metadata(metric_name, unit):
+        """
+        Return the metadata of a counter, along with what is needed to submit its values:
+        the name of the metric to submit and the pre-reporting transformation of the values.
+        """
+        return {
+            "name": metric_name,
+            "unit": unit,
+            "metric_name": "vsphere.{}".format(metric_name),
+            "transform": UNIT_TRANSFORMS.get(unit, _transform_none),
+        }
+
     def format_metric_name(self, counter, compatibility=False):
         if compatibility:
             return "{}.{}".format(counter.groupInfo.key, counter.nameInfo.key)
@@ -752,21 +885,6 @@ class VSphereCheck(AgentCheck):
 
         return False
 
-    def _transform_value(self, instance, counter_id, value):
-        """ Given the counter_id, look up for the metrics metadata to check the vsphere
-        type of the counter and apply pre-reporting transformation if needed.
-        """
-        i_key = self._instance_key(instance)
-        try:
-            metadata = self.metadata_cache.get_metadata(i_key, counter_id)
-            if metadata["unit"] == "percent":
-                return float(value) / 100
-        except MetadataNotFoundError:
-            pass
-
-        # Defaults to return the value without transformation
-        return value
-
     @trace_method
     def _collect_metrics_async(self, instance, query_specs):
         """ Task that collects the metrics listed in the morlist for one MOR
@@ -778,6 +896,8 @@ class VSphereCheck(AgentCheck):
         server_instance = self._get_server_instance(instance)
         perfManager = server_instance.content.perfManager
         custom_tags = instance.get('tags', [])
+        compatibility = self.in_compatibility_mode(instance)
+        metadata_by_counter = self.metadata_cache.get_instance_metadata(i_key)
         results = perfManager.QueryPerf(query_specs)
         if results:
             for mor_perfs in results:
@@ -789,46 +909,91 @@ class VSphereCheck(AgentCheck):
                                    "Consider increasing the parameter `clean_morlist_interval` to avoid that", mor_name)
                     continue
 
+                hostname = mor['hostname']
+                # Final tags, by value of the `instance` tag
+                tags_by_instance = {}
                 for result in mor_perfs.value:
-                    counter_id = result.id.counterId
-                    if not self.metadata_cache.contains(i_key, counter_id):
+                    metadata = metadata_by_counter.get(result.id.counterId)
+                    if metadata is None:
                         self.log.debug(
-                            "Skipping value for counter {}, because there is no metadata about it".format(counter_id)
+                            "Skipping value for counter {}, because there is no metadata about it".format(
+                                result.id.counterId
+                            )
                         )
                         continue
 
-                    # Metric types are absolute, delta, and rate
-                    metric_name = self.metadata_cache.get_metadata(i_key, result.id.counterId).get('name')
-
-                    if self.in_compatibility_mode(instance):
-                        if metric_name not in ALL_METRICS:
-                            self.log.debug("Skipping unknown `{}` metric.".format(metric_name))
-                            continue
+                    if compatibility and metadata['name'] not in ALL_METRICS:
+                        self.log.debug("Skipping unknown `{}` metric.".format(metadata['name']))
+                        continue
 
                     if not result.value:
-                        self.log.debug("Skipping `{}` metric because the value is empty".format(metric_name))
+                        self.log.debug("Skipping `{}` metric because the value is empty".format(metadata['name']))
                         continue
 
                     instance_name = result.id.instance or "none"
-                    value = self._transform_value(instance, result.id.counterId, result.value[0])
-
-                    tags = ['instance:{}'.format(instance_name)]
-                    if not mor['hostname']:  # no host tags available
-                        tags.extend(mor['tags'])
+                    tags = tags_by_instance.get(instance_name)
+                    if tags is None:
+                        tags = tags_by_instance[instance_name] = ['instance:{}'.format(instance_name)] + \
+                            mor['metric_tags']
 
+                    # Metric types are absolute, delta, and rate
                     # vsphere "rates" should be submitted as gauges (rate is
                     # precomputed).
-                    self.gauge(
-                        "vsphere.{}".format(metric_name),
-                        value,
-                        hostname=mor['hostname'],
-                        tags=tags + custom_tags
-                    )
+                    self.gauge(metadata['metric_name'], metadata['transform'](result.value[0]),
+                               hostname=hostname, tags=tags)
 
         # ## <TEST-INSTRUMENTATION>
         self.histogram('datadog.agent.vsphere.metric_colection.time', t.total(), tags=custom_tags)
         # ## </TEST-INSTRUMENTATION>
 
+    def _get_query_spec_batches(self, i_key, batch_size):
+        """
+        Return the batches of query specs to collect the metrics of the realtime and the
+        historical Mor objects in the cache, along with the number of VMs.
+        They are only compiled again when the Mor cache or the metric ids changed,
+        and only the query specs of the Mor objects that changed are built again.
+        """
+        generation = self.mor_cache.get_generation(i_key)
+        metric_ids = self.metadata_cache.get_metric_ids(i_key)
+        cached = self.query_spec_batches.get(i_key)
+        if cached is not None and cached[0] is generation and cached[1] is metric_ids and cached[2] == batch_size:
+            return cached[3]
+
+        previous_query_specs = self.query_specs.get(i_key, {})
+        query_specs_by_name = {}
+        # Realtime and historical Mors are queried separately, to be scheduled with different priorities
+        realtime_query_specs = []
+        historical_query_specs = []
+        vm_count = 0
+        for batch in generation.batches(batch_size):
+            for mor_name, mor in batch:
+                if mor['mor_type'] == 'vm':
+                    vm_count += 1
+                realtime = mor['mor_type'] in REALTIME_RESOURCES
+                if not realtime and ('metrics' not in mor or not mor['metrics']):
+                    continue
+
+                mor_metric_ids = metric_ids if realtime else mor['metrics']
+                previous = previous_query_specs.get(mor_name)
+                if previous is not None and previous[0] is mor and previous[1] is mor_metric_ids:
+                    query_spec = previous[2]
+                else:
+                    query_spec = vim.PerformanceManager.QuerySpec()
+                    query_spec.entity = mor["mor"]
+                    query_spec.intervalId = mor["interval"]
+                    query_spec.maxSample = 1
+                    query_spec.metricId = mor_metric_ids
+                query_specs_by_name[mor_name] = (mor, mor_metric_ids, query_spec)
+                (realtime_query_specs if realtime else historical_query_specs).append(query_spec)
+
+        query_spec_batches = tuple(
+            [query_specs[idx:idx + batch_size] for idx in range(0, len(query_specs), batch_size)]
+            for query_specs in (realtime_query_specs, historical_query_specs)
+        ) + (vm_count,)
+        self.query_specs[i_key] = query_specs_by_name
+        self.query_spec_batches[i_key] = (generation, metric_ids, batch_size, query_spec_batches)
+        return query_spec_batches
+
     def collect_metrics(self, instance):
         """
         Calls asynchronously _collect_metrics_async on all MORs, as the
@@ -851,31 +1016,60 @@ class VSphereCheck(AgentCheck):
 
         self.log.debug("Collecting metrics for {} mors".format(n_mors))
 
+        # The realtime jobs of the previous run that didn't start yet would collect the same values as
+        # the new ones. The historical ones are kept until their deadline instead, their values being
+        # sampled less often: no historical job is queued while some from a previous run are pending.
+        previous_jobs = self.collection_jobs.get(i_key, [])
+        cancelled = sum(job.cancel() for job in previous_jobs if job.priority == PRIORITY_REALTIME)
+        pending_historical_jobs = [
+            job for job in previous_jobs if job.priority == PRIORITY_HISTORICAL and job.pending()
+        ]
+        if cancelled:
+            self.log.debug("Dropping {} metric collection jobs from the previous run".format(cancelled))
+            # ## <TEST-INSTRUMENTATION>
+            self.count('datadog.agent.vsphere.dropped_cycles', 1, tags=custom_tags)
+            # ## </TEST-INSTRUMENTATION>
+
         # Request metrics for several objects at once. We can limit the number of objects with batch_size
         # If batch_size is 0, process everything at once
         batch_size = self.batch_morlist_size or n_mors
-        for batch in self.mor_cache.mors_batch(i_key, batch_size):
-            query_specs = []
-            for _, mor in batch.iteritems():
-                if mor['mor_type'] == 'vm':
-                    vm_count += 1
-                if mor['mor_type'] not in REALTIME_RESOURCES and ('metrics' not in mor or not mor['metrics']):
-                    continue
+        realtime_batches, historical_batches, vm_count = self._get_query_spec_batches(i_key, batch_size)
+
+        # Realtime values are available for a sampling interval only, historical values are
+        # sampled less often: their jobs go after the realtime ones and may wait longer, though
+        # the pool runs them ahead once they waited too long.
+        now = time.time()
+        jobs = []
+        for query_specs in realtime_batches:
+            jobs.append(self.pool.apply_async(self._collect_metrics_async, args=(instance, query_specs),
+                                              priority=PRIORITY_REALTIME, deadline=now + REAL_TIME_INTERVAL))
+        if pending_historical_jobs:
+            self.log.debug("Waiting for {} historical metric collection jobs from a previous run".format(
+                len(pending_historical_jobs)))
+            jobs.extend(pending_historical_jobs)
+        else:
+            for query_specs in historical_batches:
+                jobs.append(self.pool.apply_async(self._collect_metrics_async, args=(instance, query_specs),
+                                                  priority=PRIORITY_HISTORICAL, deadline=now + HISTORICAL_INTERVAL))
+        self.collection_jobs[i_key] = jobs
 
-                query_spec = vim.PerformanceManager.QuerySpec()
-                query_spec.entity = mor["mor"]
-                query_spec.intervalId = mor["interval"]
-                query_spec.maxSample = 1
-                if mor['mor_type'] in REALTIME_RESOURCES:
-                    query_spec.metricId = self.metadata_cache.get_metric_ids(i_key)
-                else:
-                    query_spec.metricId = mor["metrics"]
-                query_specs.append(query_spec)
+        self.gauge('vsphere.vm.count', vm_count, tags=tags)
 
-            if query_specs:
-                self.pool.apply_async(self._collect_metrics_async, args=(instance, query_specs))
+    def _submit_pool_metrics(self, custom_tags):
+        """
+        Adjust the number of workers of the pool and submit its metrics
+        """
+        nworkers = self.pool.adjust()
+        latencies, waits, dropped = self.pool.get_stats()
 
-        self.gauge('vsphere.vm.count', vm_count, tags=tags)
+        # ## <TEST-INSTRUMENTATION>
+        self.gauge('datadog.agent.vsphere.pool.workers', nworkers, tags=custom_tags)
+        for latency in latencies:
+            self.histogram('datadog.agent.vsphere.pool.job_latency', latency, tags=custom_tags)
+        for wait in waits:
+            self.histogram('datadog.agent.vsphere.pool.job_wait', wait, tags=custom_tags)
+        self.count('datadog.agent.vsphere.pool.dropped_jobs', dropped, tags=custom_tags)
+        # ## </TEST-INSTRUMENTATION>
 
     def check(self, instance):
         if not self.pool_started:
@@ -884,28 +1078,29 @@ class VSphereCheck(AgentCheck):
         custom_tags = instance.get('tags', [])
 
         # ## <TEST-INSTRUMENTATION>
-        self.gauge('datadog.agent.vsphere.queue_size', self.pool._workq.qsize(), tags=['instant:initial'] + custom_tags)
+        self.gauge('datadog.agent.vsphere.queue_size', self.pool.qsize(), tags=['instant:initial'] + custom_tags)
         # ## </TEST-INSTRUMENTATION>
 
-        # Only schedule more jobs on the queue if the jobs from the previous check runs are finished
-        # It's no good to keep piling up jobs
-        if self.pool._workq.qsize() == 0:
-            # First part: make sure our object repository is neat & clean
-            if self._should_cache(instance, CacheConfig.Metadata):
-                self._cache_metrics_metadata(instance)
+        # Grow the pool if the jobs from the previous runs are not finished yet
+        self._submit_pool_metrics(custom_tags)
 
-            if self._should_cache(instance, CacheConfig.Morlist):
-                self._cache_morlist_raw(instance)
+        # First part: make sure our object repository is neat & clean
+        if self._should_cache(instance, CacheConfig.Metadata):
+            self._cache_metrics_metadata(instance)
 
-            self._process_mor_objects_queue(instance)
+        # Applying the inventory updates is cheap enough to be done every run
+        if self.incremental_morlist or self._should_cache(instance, CacheConfig.Morlist):
+            self._cache_morlist_raw(instance)
 
-            # Remove old objects that might be gone from the Mor cache
+        self._process_mor_objects_queue(instance)
+
+        # Remove old objects that might be gone from the Mor cache,
+        # in incremental mode they are removed as soon as they leave the inventory
+        if not self.incremental_morlist:
             self.mor_cache.purge(self._instance_key(instance), self.clean_morlist_interval)
 
-            # Second part: do the job
-            self.collect_metrics(instance)
-        else:
-            self.log.debug("Thread pool is still processing jobs from previous run. Not scheduling anything.")
+        # Second part: do the job, the jobs of the previous run that are still queued are dropped
+        self.collect_metrics(instance)
 
         self._query_event(instance)
 
@@ -925,5 +1120,5 @@ class VSphereCheck(AgentCheck):
             set_external_tags(self.get_external_host_tags())
 
         # ## <TEST-INSTRUMENTATION>
-        self.gauge('datadog.agent.vsphere.queue_size', self.pool._workq.qsize(), tags=['instant:final'] + custom_tags)
+        self.gauge('datadog.agent.vsphere.queue_size', self.pool.qsize(), tags=['instant:final'] + custom_tags)
         # ## </TEST-INSTRUMENTATION>
@@ -0,0 +1,90 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import pytest
+from mock import MagicMock
+from pyVmomi import vmodl
+
+from datadog_checks.vsphere.inventory import Inventory
+
+
+def _update_set(version, object_updates, truncated=False):
+    return MagicMock(version=version, truncated=truncated, filterSet=[MagicMock(objectSet=object_updates)])
+
+
+def _object_update(kind, obj, **changes):
+    change_set = []
+    for name, val in changes.items():
+        change = MagicMock(op='remove' if val is None else 'assign', val=val)
+        change.name = name
+        change_set.append(change)
+    return MagicMock(kind=kind, obj=obj, changeSet=change_set, missingSet=[])
+
+
+@pytest.fixture
+def server_instance():
+    return MagicMock()
+
+
+@pytest.fixture
+def collector(server_instance):
+    return server_instance.content.propertyCollector.CreatePropertyCollector.return_value
+
+
+@pytest.fixture
+def inventory():
+    return Inventory(MagicMock(), max_object_updates=100)
+
+
+def test_update(inventory, server_instance, collector):
+    collector.WaitForUpdatesEx.side_effect = [
+        _update_set('1', [_object_update('enter', 'vm1', name='vm1'), _object_update('enter', 'vm2', name='vm2')]),
+    ]
+    assert inventory.update(server_instance) is True
+    assert inventory.objects == {'vm1': {'name': 'vm1'}, 'vm2': {'name': 'vm2'}}
+    collector.CreateFilter.assert_called_once_with(
+        inventory._get_filter_spec.return_value, partialUpdates=False
+    )
+    assert collector.WaitForUpdatesEx.call_args[0][0] == ''
+    assert collector.WaitForUpdatesEx.call_args[0][1].maxWaitSeconds == 0
+    assert collector.WaitForUpdatesEx.call_args[0][1].maxObjectUpdates == 100
+
+    # Nothing changed
+    collector.WaitForUpdatesEx.side_effect = [None]
+    assert inventory.update(server_instance) is False
+    assert collector.WaitForUpdatesEx.call_args[0][0] == '1'
+
+    # Truncated updates are fetched until the end
+    collector.WaitForUpdatesEx.side_effect = [
+        _update_set('2', [_object_update('modify', 'vm1', name='vm1_renamed', parent='folder')], truncated=True),
+        _update_set('3', [_object_update('leave', 'vm2'), _object_update('modify', 'vm1', parent=None)]),
+    ]
+    assert inventory.update(server_instance) is True
+    assert inventory.objects == {'vm1': {'name': 'vm1_renamed'}}
+    assert collector.WaitForUpdatesEx.call_args[0][0] == '2'
+    # The filter is kept open
+    assert collector.CreateFilter.call_count == 1
+
+
+def test_resync(inventory, server_instance, collector):
+    collector.WaitForUpdatesEx.side_effect = [_update_set('1', [_object_update('enter', 'vm1', name='vm1')])]
+    inventory.update(server_instance)
+
+    # vCenter lost track of the version: start over with a new filter
+    collector.WaitForUpdatesEx.side_effect = [
+        vmodl.query.InvalidCollectorVersion(),
+        _update_set('1', [_object_update('enter', 'vm2', name='vm2')]),
+    ]
+    assert inventory.update(server_instance) is True
+    assert inventory.objects == {'vm2': {'name': 'vm2'}}
+    collector.DestroyPropertyCollector.assert_called_once_with()
+    assert collector.CreateFilter.call_count == 2
+    assert collector.WaitForUpdatesEx.call_args[0][0] == ''
+
+    # New session: the collector has to be created again
+    new_server_instance = MagicMock()
+    new_collector = new_server_instance.content.propertyCollector.CreatePropertyCollector.return_value
+    new_collector.WaitForUpdatesEx.side_effect = [_update_set('1', [_object_update('enter', 'vm3', name='vm3')])]
+    assert inventory.update(new_server_instance) is True
+    assert inventory.objects == {'vm3': {'name': 'vm3'}}
+    new_collector.CreateFilter.assert_called_once()
@@ -53,3 +53,13 @@ def test_get_metrics(cache):
     cache._metric_ids["foo_instance"] = ["foo"]
 
     assert cache.get_metric_ids("foo_instance") == ["foo"]
+
+
+def test_get_instance_metadata(cache):
+    with pytest.raises(KeyError):
+        cache.get_instance_metadata("instance")
+
+    metadata = {"foo_id": {"name": "metric_name"}}
+    cache.set_metadata("foo_instance", metadata)
+
+    assert cache.get_instance_metadata("foo_instance") is metadata
@@ -4,7 +4,7 @@
 import pytest
 import time
 
-from datadog_checks.vsphere.mor_cache import MorCache, MorNotFoundError
+from datadog_checks.vsphere.mor_cache import MorCache, MorGeneration, MorNotFoundError
 
 
 @pytest.fixture
@@ -12,43 +12,61 @@ def cache():
     return MorCache()
 
 
+def _mor(creation_time=None):
+    return {'creation_time': time.time() if creation_time is None else creation_time}
+
+
 def test_contains(cache):
-    cache._mor['foo_instance'] = {}
+    cache.init_instance('foo_instance')
     assert cache.contains('foo_instance') is True
     assert cache.contains('foo') is False
 
 
 def test_instance_size(cache):
-    cache._mor['foo_instance'] = {}
+    cache.init_instance('foo_instance')
     assert cache.instance_size('foo_instance') == 0
-    cache._mor['foo_instance']['my_mor_name'] = None
+    cache._mor['foo_instance'] = MorGeneration({'my_mor_name': _mor()})
     assert cache.instance_size('foo_instance') == 1
     with pytest.raises(KeyError):
         cache.instance_size('foo')
 
 
 def test_set_mor(cache):
-    cache._mor['foo_instance'] = {}
+    cache.init_instance('foo_instance')
     cache.set_mor('foo_instance', 'mor_name', {'foo': 'bar'})
-    assert 'foo' in cache._mor['foo_instance']['mor_name']
+    assert 'foo' in cache._mor['foo_instance'].mors['mor_name']
     # check the timestamp is set
-    creation_time = cache._mor['foo_instance']['mor_name']['creation_time']
+    creation_time = cache._mor['foo_instance'].mors['mor_name']['creation_time']
     assert creation_time > 0
-    cache.set_mor('foo_instance', 'mor_name', {})
     time.sleep(.1)  # be sure timestamp is different
-    assert cache._mor['foo_instance']['mor_name']['creation_time'] > creation_time
+    cache.set_mor('foo_instance', 'mor_name', {})
+    assert cache._mor['foo_instance'].mors['mor_name']['creation_time'] > creation_time
 
     with pytest.raises(KeyError):
         cache.set_mor('foo', 'mor', {})
 
 
+def test_set_mors(cache):
+    cache.init_instance('foo_instance')
+    cache.set_mor('foo_instance', 'hero', {})
+    generation = cache._mor['foo_instance']
+
+    cache.set_mors('foo_instance', [('foo', {}), ('bar', {})])
+    assert sorted(cache._mor['foo_instance'].mors) == ['bar', 'foo', 'hero']
+    # The previous generation is left untouched
+    assert list(generation.mors) == ['hero']
+
+    with pytest.raises(KeyError):
+        cache.set_mors('foo', [])
+
+
 def test_get_mor(cache):
     with pytest.raises(KeyError):
         cache.get_mor('instance', 'mor_name')
 
-    cache._mor['foo_instance'] = {
-        'my_mor_name': {'foo': 'bar'}
-    }
+    cache._mor['foo_instance'] = MorGeneration({
+        'my_mor_name': dict(_mor(), foo='bar')
+    })
 
     assert cache.get_mor('foo_instance', 'my_mor_name')['foo'] == 'bar'
 
@@ -60,32 +78,40 @@ def test_set_metrics(cache):
     with pytest.raises(KeyError):
         cache.set_metrics('instance', 'mor_name', [])
 
-    cache._mor['foo_instance'] = {
-        'my_mor_name': {}
-    }
+    cache._mor['foo_instance'] = MorGeneration({
+        'my_mor_name': _mor()
+    })
+    mor = cache.get_mor('foo_instance', 'my_mor_name')
 
     cache.set_metrics('foo_instance', 'my_mor_name', range(3))
-    assert len(cache._mor['foo_instance']['my_mor_name']['metrics']) == 3
+    assert len(cache._mor['foo_instance'].mors['my_mor_name']['metrics']) == 3
+    # Published Mor objects are not modified
+    assert 'metrics' not in mor
 
     with pytest.raises(MorNotFoundError):
         cache.set_metrics('foo_instance', 'foo', [])
 
 
+def test_set_metrics_batch(cache):
+    cache._mor['foo_instance'] = MorGeneration({'foo': _mor(), 'bar': _mor()})
+
+    missing = cache.set_metrics_batch('foo_instance', {'foo': range(3), 'bar': range(2), 'unknown': []})
+    assert missing == ['unknown']
+    assert len(cache._mor['foo_instance'].mors['foo']['metrics']) == 3
+    assert len(cache._mor['foo_instance'].mors['bar']['metrics']) == 2
+
+
 def test_mors(cache):
-    cache._mor['foo_instance'] = {}
-    for i in xrange(9):
-        # For the sake of this test, Mor name is `i` and Mor object is `None`
-        cache._mor['foo_instance'][i] = None
+    # For the sake of this test, Mor name is `i`
+    cache._mor['foo_instance'] = MorGeneration({i: _mor() for i in xrange(9)})
 
     assert len(dict(cache.mors('foo_instance'))) == 9
     assert len(dict(cache.mors('foo'))) == 0
 
 
 def test_mors_batch(cache):
-    cache._mor['foo_instance'] = {}
-    for i in xrange(9):
-        # For the sake of this test, Mor name is `i` and Mor object is `None`
-        cache._mor['foo_instance'][i] = None
+    # For the sake of this test, Mor name is `i`
+    cache._mor['foo_instance'] = MorGeneration({i: _mor() for i in xrange(9)})
 
     # input size is multiple of batch size
     steps = 0
@@ -99,6 +125,7 @@ def test_mors_batch(cache):
     assert len(out) == 2
     assert len(out[0]) == 5
     assert len(out[1]) == 4
+    assert [name for name, _ in out[0] + out[1]] == range(9)
 
     # batch size is the same as the input size
     out = list(cache.mors_batch('foo_instance', 9))
@@ -110,15 +137,37 @@ def test_mors_batch(cache):
     assert len(out) == 1
     assert len(out[0]) == 9
 
+    # batches are computed once per generation
+    assert cache.mors_batch('foo_instance', 5) is cache.mors_batch('foo_instance', 5)
+    cache.set_mor('foo_instance', 9, {})
+    assert len(cache.mors_batch('foo_instance', 5)[1]) == 5
+
+    assert list(cache.mors_batch('foo', 5)) == []
+
 
 def test_purge(cache):
-    cache._mor['foo_instance'] = {}
+    mors = {}
     for i in xrange(3):
         # set last access to 0, these will be purged
-        cache._mor['foo_instance'][i] = {'creation_time': 0}
+        mors[i] = _mor(0)
     # this entry should stay
-    cache._mor['foo_instance']['hero'] = {'creation_time': time.time()}
+    mors['hero'] = _mor()
+    cache._mor['foo_instance'] = MorGeneration(mors)
     # purge items older than 60 seconds
     cache.purge('foo_instance', 60)
-    assert len(cache._mor['foo_instance']) == 1
-    assert 'hero' in cache._mor['foo_instance']
+    assert len(cache._mor['foo_instance'].mors) == 1
+    assert 'hero' in cache._mor['foo_instance'].mors
+
+    # nothing to purge, the generation is kept
+    generation = cache._mor['foo_instance']
+    cache.purge('foo_instance', 60)
+    assert cache._mor['foo_instance'] is generation
+
+
+def test_purge_missing(cache):
+    cache._mor['foo_instance'] = MorGeneration({'foo': _mor(), 'bar': _mor(), 'hero': _mor()})
+    cache.purge_missing('foo_instance', ['hero', 'unknown'])
+    assert list(cache._mor['foo_instance'].mors) == ['hero']
+
+    with pytest.raises(KeyError):
+        cache.purge_missing('foo', [])
@@ -0,0 +1,159 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import threading
+import time
+
+import pytest
+
+from datadog_checks.vsphere.pool import AdaptivePool, PRIORITY_HISTORICAL, PRIORITY_REALTIME
+
+
+@pytest.fixture
+def pool():
+    pool = AdaptivePool(1, 3, name="test")
+    yield pool
+    pool.terminate()
+    pool.join()
+
+
+def _block(pool):
+    """
+    Keep the workers of the pool busy until the returned event is set
+    """
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def wait():
+        started.release()
+        # Don't block the teardown if the test failed
+        release.wait(5)
+
+    jobs = [pool.apply_async(wait) for _ in range(pool.get_nworkers())]
+    for _ in jobs:
+        started.acquire()
+    return release, jobs
+
+
+def _unblock(release, jobs):
+    release.set()
+    for job in jobs:
+        job.done.wait(1)
+
+
+def test_priorities(pool):
+    release, _ = _block(pool)
+    done = []
+    pool.apply_async(done.append, args=("historical",), priority=PRIORITY_HISTORICAL)
+    pool.apply_async(done.append, args=("realtime",), priority=PRIORITY_REALTIME)
+    last = pool.apply_async(done.append, args=("realtime_2",), priority=PRIORITY_REALTIME)
+    job = pool.apply_async(done.append, args=("last",), priority=PRIORITY_HISTORICAL)
+    release.set()
+    job.done.wait(1)
+
+    assert last.done.is_set()
+    assert done == ["realtime", "realtime_2", "historical", "last"]
+
+
+def test_aging():
+    """
+    Historical jobs still run when realtime jobs keep the workers busy
+    """
+    pool = AdaptivePool(1, 1, name="test", aging_delay=0.05)
+    stop = threading.Event()
+
+    def realtime():
+        # Every realtime job queues another one: there's always one waiting
+        if not stop.is_set():
+            pool.apply_async(realtime, priority=PRIORITY_REALTIME)
+        time.sleep(0.005)
+
+    try:
+        for _ in range(2):
+            pool.apply_async(realtime, priority=PRIORITY_REALTIME)
+        historical = pool.apply_async(lambda: None, priority=PRIORITY_HISTORICAL, deadline=time.time() + 60)
+        assert historical.done.wait(2)
+        assert pool.qsize() > 0
+        latencies, waits, dropped = pool.get_stats()
+        assert dropped == 0
+    finally:
+        stop.set()
+        pool.terminate()
+        pool.join()
+
+
+def test_dropped_jobs(pool):
+    release, _ = _block(pool)
+    done = []
+    expired = pool.apply_async(done.append, args=("expired",), deadline=time.time() - 1)
+    cancelled = pool.apply_async(done.append, args=("cancelled",))
+    job = pool.apply_async(done.append, args=("ok",), deadline=time.time() + 60)
+    assert cancelled.cancel() is True
+    release.set()
+    job.done.wait(1)
+
+    assert expired.done.is_set() and cancelled.done.is_set()
+    assert done == ["ok"]
+    # A job that already ran can't be cancelled
+    assert job.cancel() is False
+    latencies, waits, dropped = pool.get_stats()
+    assert dropped == 2
+    assert len(latencies) == len(waits) == 2
+    assert pool.get_stats() == ([], [], 0)
+
+
+def test_adjust(pool):
+    # Jobs are waiting: grow
+    blocked = _block(pool)
+    pool.apply_async(lambda: None)
+    assert pool.adjust() == 2
+    assert pool.get_nworkers() == 2
+    _unblock(*blocked)
+
+    # Up to the max
+    blocked = _block(pool)
+    job = pool.apply_async(lambda: None)
+    assert pool.adjust() == 3
+    # The new worker was busy too
+    job.done.wait(1)
+    assert pool.adjust() == 3
+    _unblock(*blocked)
+
+    # The latency got much worse since the last growth: shrink
+    pool._latency_before_growth, pool.latency = 1.0, 2.0
+    assert pool.adjust() == 2
+
+    # A worker stayed idle since the previous call: shrink, down to the min
+    assert pool.adjust() == 1
+    assert pool.adjust() == 1
+    for _ in range(100):
+        if pool.get_nworkers() == 1:
+            break
+        time.sleep(.01)
+    assert pool.get_nworkers() == 1
+
+
+def test_adjust_dropped_jobs(pool):
+    # Only cancelled and expired jobs are waiting: don't grow
+    blocked = _block(pool)
+    for _ in range(3):
+        pool.apply_async(lambda: None, priority=PRIORITY_REALTIME).cancel()
+    pool.apply_async(lambda: None, priority=PRIORITY_REALTIME, deadline=time.time() - 1)
+
+    assert pool.qsize() == 0
+    assert pool.adjust() == 1
+    assert pool.get_nworkers() == 1
+    _unblock(*blocked)
+
+
+def test_terminate():
+    pool = AdaptivePool(2, 2)
+    blocked = _block(pool)
+    done = []
+    pool.apply_async(done.append, args=("dropped",))
+    pool.terminate()
+    _unblock(*blocked)
+    pool.join()
+
+    assert pool.get_nworkers() == 0
+    assert done == []
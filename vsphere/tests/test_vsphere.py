@@ -13,11 +13,14 @@ from datadog_checks.vsphere import VSphereCheck
 from datadog_checks.vsphere.errors import BadConfigError, ConnectionError
 from datadog_checks.vsphere.cache_config import CacheConfig
 from datadog_checks.vsphere.common import SOURCE_TYPE
+from datadog_checks.vsphere.inventory import Inventory
+from datadog_checks.vsphere.mor_cache import MorNotFoundError
+from datadog_checks.vsphere.pool import PRIORITY_HISTORICAL, PRIORITY_REALTIME
 from datadog_checks.vsphere.vsphere import (
     REFRESH_MORLIST_INTERVAL, REFRESH_METRICS_METADATA_INTERVAL, RESOURCE_TYPE_METRICS, SHORT_ROLLUP
 )
 from .utils import assertMOR, MockedMOR
-from .utils import disable_thread_pool, get_mocked_server
+from .utils import disable_thread_pool, get_mocked_server, wait_for_updates_mock
 
 SERVICE_CHECK_TAGS = ["vcenter_server:vsphere_mock", "vcenter_host:None", "foo:bar"]
 
@@ -265,6 +268,47 @@ def test_use_guest_hostname(vsphere, instance):
         assertMOR(vsphere, instance, name="vm4_guest", spec="vm", subset=True)
 
 
+def test__cache_morlist_incremental_async(vsphere, instance):
+    """
+    Only the objects that changed since the previous run are queued, the ones that left are
+    removed from the cache.
+    """
+    server_instance = vsphere._get_server_instance(instance)
+    all_mors = [r.obj for r in server_instance.content.propertyCollector.RetrievePropertiesEx.return_value.objects]
+    collector = server_instance.content.propertyCollector.CreatePropertyCollector.return_value
+    inventory = Inventory(vsphere._get_filter_spec)
+
+    with mock.patch('datadog_checks.vsphere.vsphere.vmodl'):
+        # The first update returns the whole inventory
+        collector.WaitForUpdatesEx.side_effect = [wait_for_updates_mock(all_mors)]
+        vsphere._cache_morlist_incremental_async(instance, inventory, [])
+        assertMOR(vsphere, instance, spec="vm", count=3)
+        assertMOR(vsphere, instance, spec="host", count=3)
+        vsphere._process_mor_objects_queue(instance)
+        assert vsphere.mor_cache.instance_size("vsphere_mock") == 11
+        server_instance.content.propertyCollector.RetrievePropertiesEx.assert_not_called()
+
+        # Nothing changed
+        collector.WaitForUpdatesEx.side_effect = [None]
+        with mock.patch.object(vsphere.mor_objects_queue, "fill") as fill:
+            vsphere._cache_morlist_incremental_async(instance, inventory, [])
+            fill.assert_not_called()
+
+        # A host is renamed and a VM is removed
+        host1 = next(mor for mor in all_mors if mor.name == "host1")
+        vm1 = next(mor for mor in all_mors if mor.name == "vm1")
+        update_set = wait_for_updates_mock([host1], kind="modify")
+        update_set.filterSet[0].objectSet[0].changeSet[0].val = "host1_renamed"
+        update_set.filterSet[0].objectSet.append(MagicMock(kind="leave", obj=vm1))
+        collector.WaitForUpdatesEx.side_effect = [update_set]
+        vsphere._cache_morlist_incremental_async(instance, inventory, [])
+        assertMOR(vsphere, instance, count=1)
+        assertMOR(vsphere, instance, name="host1_renamed", spec="host")
+        assert vsphere.mor_cache.instance_size("vsphere_mock") == 10
+        with pytest.raises(MorNotFoundError):
+            vsphere.mor_cache.get_mor("vsphere_mock", str(vm1))
+
+
 def test__process_mor_objects_queue(vsphere, instance):
     vsphere.log = MagicMock()
     vsphere._process_mor_objects_queue_async = MagicMock()
@@ -406,10 +450,12 @@ def test_collect_metrics(vsphere, instance):
 
 def test__collect_metrics_async_compatibility(vsphere, instance):
     server_instance = vsphere._get_server_instance(instance)
-    server_instance.content.perfManager.QueryPerf.return_value = [MagicMock(value=[MagicMock()])]
+    result = MagicMock()
+    result.id.counterId = 1
+    server_instance.content.perfManager.QueryPerf.return_value = [MagicMock(value=[result])]
     vsphere.mor_cache = MagicMock()
     vsphere.metadata_cache = MagicMock()
-    vsphere.metadata_cache.get_metadata.return_value = {"name": "unknown"}
+    vsphere.metadata_cache.get_instance_metadata.return_value = {1: VSphereCheck._counter_metadata("unknown", "")}
     vsphere.in_compatibility_mode = MagicMock()
     vsphere.log = MagicMock()
 
@@ -423,6 +469,102 @@ def test__collect_metrics_async_compatibility(vsphere, instance):
     vsphere.log.debug.assert_not_called()
 
 
+def test__collect_metrics_async(vsphere, instance, aggregator):
+    """
+    The values are submitted with the precomputed metric names, transformations and tags
+    """
+    percent, number = MagicMock(value=[4200]), MagicMock(value=[42])
+    percent.id.counterId, percent.id.instance = 1, ""
+    number.id.counterId, number.id.instance = 2, "disk1"
+    server_instance = vsphere._get_server_instance(instance)
+    server_instance.content.perfManager.QueryPerf.return_value = [MagicMock(entity="vm1", value=[percent, number])]
+    vsphere.mor_cache.init_instance("vsphere_mock")
+    vsphere.mor_cache.set_mor("vsphere_mock", "vm1", {"hostname": None, "metric_tags": ["vsphere_type:vm", "foo:bar"]})
+    vsphere.metadata_cache.init_instance("vsphere_mock")
+    vsphere.metadata_cache.set_metadata("vsphere_mock", {
+        1: VSphereCheck._counter_metadata("cpu.usage.avg", "percent"),
+        2: VSphereCheck._counter_metadata("disk.read.avg", "kiloBytesPerSecond"),
+    })
+
+    vsphere._collect_metrics_async(instance, [])
+    aggregator.assert_metric("vsphere.cpu.usage.avg", value=42.0, tags=["instance:none", "vsphere_type:vm", "foo:bar"])
+    aggregator.assert_metric("vsphere.disk.read.avg", value=42, tags=["instance:disk1", "vsphere_type:vm", "foo:bar"])
+
+
+def test__get_query_spec_batches(vsphere, instance):
+    """
+    The query specs are only built again for the Mors that changed
+    """
+    with mock.patch('datadog_checks.vsphere.vsphere.vmodl'):
+        vsphere._cache_metrics_metadata(instance)
+        vsphere._cache_morlist_raw(instance)
+        vsphere._process_mor_objects_queue(instance)
+
+    query_spec_batches, historical_batches, vm_count = vsphere._get_query_spec_batches("vsphere_mock", 2)
+    assert vm_count == 3
+    # One query spec per VM/host, datacenters are not collected
+    assert [len(query_specs) for query_specs in query_spec_batches] == [2, 2, 2]
+    assert historical_batches == []
+    assert vsphere._get_query_spec_batches("vsphere_mock", 2)[0] is query_spec_batches
+
+    # A new Mor in the cache
+    mor = MockedMOR(spec="VirtualMachine", name="vm5")
+    vsphere.mor_cache.set_mor("vsphere_mock", str(mor), {"mor": mor, "mor_type": "vm", "interval": 20})
+    new_query_spec_batches, _, vm_count = vsphere._get_query_spec_batches("vsphere_mock", 100)
+    assert vm_count == 4
+    assert len(new_query_spec_batches[0]) == 7
+    # The other query specs are reused
+    assert set(new_query_spec_batches[0]) > {spec for query_specs in query_spec_batches for spec in query_specs}
+
+    # New metric ids
+    vsphere.metadata_cache.set_metric_ids("vsphere_mock", [])
+    assert not set(vsphere._get_query_spec_batches("vsphere_mock", 100)[0][0]) & set(new_query_spec_batches[0])
+
+    # Historical Mors are batched separately
+    datastore = MockedMOR(spec="Datastore", name="datastore2")
+    vsphere.mor_cache.set_mor("vsphere_mock", str(datastore), {
+        "mor": datastore, "mor_type": "datastore", "interval": None,
+        "metrics": [vim.PerformanceManager.MetricId(counterId=1, instance="*")]
+    })
+    query_spec_batches, historical_batches, _ = vsphere._get_query_spec_batches("vsphere_mock", 100)
+    assert len(query_spec_batches[0]) == 7
+    assert [query_spec.entity for query_spec in historical_batches[0]] == [datastore]
+
+
+def test_collect_metrics_priorities(vsphere, instance):
+    """
+    Realtime Mors are collected first, the realtime jobs of the previous run that didn't start are dropped
+    and the historical ones are kept until their deadline
+    """
+    vsphere.pool = MagicMock()
+    vsphere.pool.apply_async.side_effect = lambda *args, **kwargs: MagicMock(priority=kwargs['priority'])
+    vsphere.mor_cache.init_instance("vsphere_mock")
+    vsphere.mor_cache.set_mor("vsphere_mock", "vm1", {})
+    vsphere._get_query_spec_batches = MagicMock(return_value=([["vm1"]], [["datastore1"]], 1))
+
+    vsphere.collect_metrics(instance)
+    calls = vsphere.pool.apply_async.call_args_list
+    assert [c[1]["priority"] for c in calls] == [PRIORITY_REALTIME, PRIORITY_HISTORICAL]
+    assert [c[1]["args"][1] for c in calls] == [["vm1"], ["datastore1"]]
+    assert calls[0][1]["deadline"] < calls[1][1]["deadline"]
+
+    realtime_job, historical_job = vsphere.collection_jobs["vsphere_mock"]
+    historical_job.pending.return_value = True
+    vsphere.pool.apply_async.reset_mock()
+    vsphere.collect_metrics(instance)
+    realtime_job.cancel.assert_called_once_with()
+    historical_job.cancel.assert_not_called()
+    # No historical job is queued while the previous one is pending
+    assert [c[1]["priority"] for c in vsphere.pool.apply_async.call_args_list] == [PRIORITY_REALTIME]
+    assert vsphere.collection_jobs["vsphere_mock"][1] is historical_job
+
+    historical_job.pending.return_value = False
+    vsphere.pool.apply_async.reset_mock()
+    vsphere.collect_metrics(instance)
+    calls = vsphere.pool.apply_async.call_args_list
+    assert [c[1]["priority"] for c in calls] == [PRIORITY_REALTIME, PRIORITY_HISTORICAL]
+
+
 def test_check(vsphere, instance):
     """
     Test the check() method
@@ -80,6 +80,21 @@ def retrieve_properties_mock(all_mors):
     return properties_res
 
 
+def wait_for_updates_mock(all_mors, kind="enter"):
+    """
+    Return the update set reporting the given objects and their properties, as
+    returned by `WaitForUpdatesEx`.
+    """
+    object_updates = []
+    for obj in retrieve_properties_mock(all_mors).objects:
+        change_set = [MagicMock(op="assign", val=prop.val) for prop in obj.propSet]
+        for change, prop in zip(change_set, obj.propSet):
+            change.name = prop.name
+        object_updates.append(MagicMock(kind=kind, obj=obj.obj, changeSet=change_set, missingSet=[]))
+
+    return MagicMock(version="1", truncated=False, filterSet=[MagicMock(objectSet=object_updates)])
+
+
 def assertMOR(check, instance, name=None, spec=None, tags=None, count=None, subset=False):
     """
     Helper, assertion on vCenter Manage Object References.
@@ -116,8 +131,17 @@ def disable_thread_pool(check):
     """
     Disable the thread pool on the check instance
     """
-    check.pool = MagicMock(apply_async=lambda func, args: func(*args))
-    check.pool._workq.qsize.return_value = 0
+    def apply_async(func, args, **kwargs):
+        func(*args)
+        job = MagicMock()
+        job.done.is_set.return_value = True
+        job.cancel.return_value = False
+        return job
+
+    check.pool = MagicMock(apply_async=apply_async)
+    check.pool.qsize.return_value = 0
+    check.pool.adjust.return_value = 4
+    check.pool.get_stats.return_value = ([], [], 0)
     check.pool_started = True  # otherwise the mock will be overwritten
     return check
 